@@ -142,6 +142,7 @@ async def handle_summarize(capability: str, input_data: dict, envelope) -> dict:
 
 async def main():
     registry_proc = None
+    registry_client = client = None
 
     try:
         banner("AIP + LangChain Integration")
@@ -219,6 +220,9 @@ async def main():
         await server.stop()
 
     finally:
+        for session_owner in (client, registry_client):
+            if session_owner:
+                await session_owner.close()
         if registry_proc:
             registry_proc.terminate()
             registry_proc.wait()
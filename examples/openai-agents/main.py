@@ -167,6 +167,7 @@ async def handle_analyze(capability: str, input_data: dict, envelope) -> dict:
 
 async def main():
     registry_proc = None
+    reg = client = None
 
     try:
         banner("AIP + OpenAI Agents SDK Integration")
@@ -244,6 +245,9 @@ async def main():
         await server.stop()
 
     finally:
+        for session_owner in (client, reg):
+            if session_owner:
+                await session_owner.close()
         if registry_proc:
             registry_proc.terminate()
             registry_proc.wait()
@@ -2,6 +2,23 @@
 from .types import *
 from .manifest import ManifestBuilder
 from .envelope import create_envelope, canonical_payload, validate_envelope
-from .client import AIPClient
+from .client import AIPClient, BatchItem, BatchOutcome
 from .server import AIPServer
 from .registry import RegistryClient
+from .session import SessionPool
+from .transport import StreamConnection, StdioConnection
+from .tasks import TaskStore, TaskRecord
+from .registry_server import RegistryServer, RegistryIndex
+from .cache import DiscoveryCache
+from .trust import KeyCache, SignaturePolicy
+from .middleware import Middleware, SamplingProfiler
+from .memo import ResultCache
+from .dedup import ReplayWindow
+from .execution import Executors
+from .attachments import Attachment, BodyLimits
+from .compression import Compressor
+from .balancer import Balancer, NoProviderAvailable
+from .registry_store import RegistryStore
+from .liveness import HealthProber, Liveness
+from .federation import Federation, FederatedResults
+from .reputation import TrustEngine
@@ -0,0 +1,54 @@
+"""Per-key call coalescing shared by the result, replay and discovery caches"""
+from __future__ import annotations
+import asyncio
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class SingleFlight(Generic[K, V]):
+    """Runs at most one call per key; concurrent callers share its outcome.
+
+    A caller that finds its key running waits for that call (counted in
+    ``joined``) instead of starting another, and gets its result or
+    exception. If the caller running it is cancelled, one waiter takes over
+    and runs its own ``call``.
+    """
+
+    def __init__(self) -> None:
+        self.joined = 0
+        self._inflight: dict[K, asyncio.Future[V]] = {}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._inflight
+
+    async def run(self, key: K, call: Callable[[], Awaitable[V]]) -> V:
+        while (pending := self._inflight.get(key)) is not None:
+            self.joined += 1
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # the caller running it was cancelled; take over
+
+        fut: asyncio.Future[V] = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            value = await call()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        else:
+            fut.set_result(value)
+        finally:
+            del self._inflight[key]
+        return value
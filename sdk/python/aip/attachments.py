@@ -0,0 +1,195 @@
+"""Binary attachments: content-addressed parts streamed alongside an envelope
+
+Over HTTP, an envelope with attachments travels as ``multipart/form-data``.
+The first part, named ``envelope``, is the JSON envelope. Each later part
+carries one attachment, named by its id (``sha256:<hex>``). The payload
+refers to attachments with ``{"$attachment": id, "size": n, "contentType": t}``.
+To send one, put an ``Attachment`` object anywhere in a payload: it is
+replaced by its reference during encoding. Received attachments are spooled
+to memory, or to a temporary file past ``BodyLimits.spool`` bytes, and
+verified against their id. They are then exposed as ``env.attachments``.
+"""
+from __future__ import annotations
+import hashlib
+import io
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import IO, Any, AsyncIterator, Callable, Iterable
+import aiohttp
+from aiohttp import payload as aio_payload
+from .codec import JSON_CONTENT_TYPE
+from .types import Envelope
+
+REF_KEY = "$attachment"
+ENVELOPE_PART = "envelope"
+DEFAULT_CONTENT_TYPE = "application/octet-stream"
+CHUNK_SIZE = 64 * 1024
+
+
+class AttachmentError(ValueError):
+    """Raised for malformed multipart bodies and attachments that fail verification."""
+
+
+class BodyTooLarge(AttachmentError):
+    """Raised when a body or attachment exceeds its ``BodyLimits``."""
+
+
+@dataclass
+class BodyLimits:
+    """Size limits for incoming bodies, in bytes."""
+    envelope: int = 1024 * 1024        # the JSON envelope itself
+    attachment: int = 256 * 1024 * 1024
+    total: int = 1024 * 1024 * 1024    # all attachments of one message
+    spool: int = 1024 * 1024           # kept in memory up to this, then on disk
+
+
+class Attachment:
+    """An immutable binary blob identified by its SHA-256 digest."""
+
+    __slots__ = ("id", "size", "content_type", "_file", "_path")
+
+    def __init__(
+        self, id: str, size: int, content_type: str = DEFAULT_CONTENT_TYPE, *,
+        file: IO[bytes] | None = None, path: str = "",
+    ) -> None:
+        self.id = id
+        self.size = size
+        self.content_type = content_type
+        self._file = file
+        self._path = path
+
+    def __repr__(self) -> str:
+        return f"Attachment({self.id!r}, size={self.size}, content_type={self.content_type!r})"
+
+    @classmethod
+    def from_bytes(cls, data: bytes, content_type: str = DEFAULT_CONTENT_TYPE) -> Attachment:
+        return cls(_digest(hashlib.sha256(data)), len(data), content_type, file=io.BytesIO(data))
+
+    @classmethod
+    def from_path(cls, path: str, content_type: str = DEFAULT_CONTENT_TYPE) -> Attachment:
+        """Reference a file on disk; it is hashed now and streamed from disk when sent."""
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                h.update(chunk)
+        return cls(_digest(h), os.path.getsize(path), content_type, path=path)
+
+    @classmethod
+    async def receive(cls, part: aiohttp.BodyPartReader, *, limit: int, spool: int) -> Attachment:
+        """Stream one multipart part into a spool, checking its size and digest as it arrives."""
+        h = hashlib.sha256()
+        size = 0
+        buf: IO[bytes] = io.BytesIO()
+        while chunk := await part.read_chunk(CHUNK_SIZE):
+            size += len(chunk)
+            if size > limit:
+                raise BodyTooLarge(f"Attachment {part.name} exceeds {limit} bytes")
+            h.update(chunk)
+            if size > spool and isinstance(buf, io.BytesIO):
+                spilled = tempfile.TemporaryFile()
+                spilled.write(buf.getbuffer())
+                buf = spilled
+            buf.write(chunk)
+        digest = _digest(h)
+        if part.name != digest:
+            raise AttachmentError(f"Attachment {part.name} does not match its content ({digest})")
+        return cls(digest, size, part.headers.get("Content-Type", DEFAULT_CONTENT_TYPE), file=buf)
+
+    def ref(self) -> dict[str, Any]:
+        return {REF_KEY: self.id, "size": self.size, "contentType": self.content_type}
+
+    def view(self) -> memoryview:
+        """Zero-copy access: the in-memory buffer, or a read-only mmap of the spooled file."""
+        if isinstance(self._file, io.BytesIO):
+            return self._file.getbuffer().toreadonly()
+        if self.size == 0:
+            return memoryview(b"")
+        if self._file is not None:
+            self._file.flush()
+            return memoryview(mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ))
+        with open(self._path, "rb") as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    async def chunks(self, size: int = CHUNK_SIZE) -> AsyncIterator[bytes]:
+        view = self.view()
+        for start in range(0, len(view), size):
+            yield bytes(view[start:start + size])
+
+    async def read(self) -> bytes:
+        return bytes(self.view())
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+
+
+def _digest(h: Any) -> str:
+    return "sha256:" + h.hexdigest()
+
+
+def resolve(env: Envelope, ref: dict[str, Any]) -> Attachment:
+    """The attachment a payload reference points at."""
+    att = (env.attachments or {}).get(ref.get(REF_KEY, "") if isinstance(ref, dict) else "")
+    if att is None:
+        raise AttachmentError(f"Missing attachment: {ref!r}")
+    return att
+
+
+def json_default(obj: Any) -> Any:
+    """``default`` hook for JSON encoders: attachments encode as their reference."""
+    if isinstance(obj, Attachment):
+        return obj.ref()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def collector(found: list[Attachment]) -> Callable[[Any], Any]:
+    """Like ``json_default``, also recording each attachment encountered in ``found``."""
+    def default(obj: Any) -> Any:
+        if isinstance(obj, Attachment):
+            found.append(obj)
+            return obj.ref()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+    return default
+
+
+def multipart_body(envelope: bytes, attachments: Iterable[Attachment]) -> aiohttp.MultipartWriter:
+    writer = aiohttp.MultipartWriter("form-data")
+    part = writer.append(envelope, {"Content-Type": JSON_CONTENT_TYPE})
+    part.set_content_disposition("form-data", name=ENVELOPE_PART)
+    seen: set[str] = set()
+    for att in attachments:
+        if att.id in seen:
+            continue
+        seen.add(att.id)
+        part = aio_payload.AsyncIterablePayload(att.chunks(), content_type=att.content_type)
+        part.set_content_disposition("form-data", name=att.id)
+        writer.append_payload(part)
+    return writer
+
+
+async def read_multipart(
+    reader: aiohttp.MultipartReader, limits: BodyLimits,
+) -> tuple[bytes, dict[str, Attachment]]:
+    """The envelope bytes and the verified attachments of a multipart body."""
+    part = await reader.next()
+    if not isinstance(part, aiohttp.BodyPartReader) or part.name != ENVELOPE_PART:
+        raise AttachmentError(f"First part must be named {ENVELOPE_PART!r}")
+    body = bytearray()
+    while chunk := await part.read_chunk(CHUNK_SIZE):
+        body += chunk
+        if len(body) > limits.envelope:
+            raise BodyTooLarge(f"Envelope exceeds {limits.envelope} bytes")
+
+    attachments: dict[str, Attachment] = {}
+    total = 0
+    while (part := await reader.next()) is not None:
+        if not isinstance(part, aiohttp.BodyPartReader) or not part.name:
+            raise AttachmentError("Attachment parts must be named by their id")
+        att = await Attachment.receive(
+            part, limit=min(limits.attachment, limits.total - total), spool=limits.spool,
+        )
+        total += att.size
+        attachments[att.id] = att
+    return bytes(body), attachments
@@ -0,0 +1,199 @@
+"""Client-side load balancing and circuit breaking across providers"""
+from __future__ import annotations
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Collection
+import aiohttp
+from .types import Envelope, SearchResult
+
+if TYPE_CHECKING:
+    from .client import AIPClient
+
+LEAST_OUTSTANDING = "least-outstanding"
+EWMA = "ewma"
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+# errors that say the endpoint, not the task, is broken
+TRANSPORT_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, OSError)
+
+
+def endpoint_failed(exc: BaseException) -> bool:
+    """True for errors that count against the endpoint's circuit (4xx responses don't)."""
+    if isinstance(exc, aiohttp.ClientResponseError):
+        return exc.status >= 500
+    return isinstance(exc, TRANSPORT_ERRORS)
+
+
+class NoProviderAvailable(RuntimeError):
+    """Every provider of the capability is missing or behind an open circuit."""
+
+
+@dataclass
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; after
+    ``reset_timeout`` seconds one probe decides whether it closes again."""
+    failure_threshold: int = 5
+    reset_timeout: float = 10.0
+    state: str = CLOSED
+    failures: int = 0
+    opened_at: float = 0.0
+
+    def record_success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+
+    def record_failure(self, now: float) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = now
+
+    def probe_due(self, now: float) -> bool:
+        return self.state == OPEN and now - self.opened_at >= self.reset_timeout
+
+
+@dataclass
+class EndpointState:
+    breaker: CircuitBreaker
+    outstanding: int = 0
+    ewma_ms: float = 0.0
+    requests: int = 0
+    failures: int = 0
+    probe: asyncio.Task | None = field(default=None, repr=False)
+
+
+class Balancer:
+    """Spreads ``send_task`` calls over every provider ``discover`` returns.
+
+    Picks the better of two random candidates (power of two choices) by
+    outstanding requests, or by EWMA latency times outstanding requests with
+    ``strategy="ewma"``, divided by a weight derived from ``trust_score``.
+    Transport failures feed a per-endpoint circuit breaker; open endpoints
+    are skipped, and once ``reset_timeout`` passes they are probed in the
+    background with ``ping`` rather than with real traffic.
+    """
+
+    def __init__(
+        self, client: AIPClient, *, strategy: str = LEAST_OUTSTANDING,
+        failure_threshold: int = 5, reset_timeout: float = 10.0,
+        ewma_alpha: float = 0.3, probe_timeout: float = 2.0, rng: random.Random | None = None,
+    ) -> None:
+        if strategy not in (LEAST_OUTSTANDING, EWMA):
+            raise ValueError(f"Unknown strategy: {strategy}")
+        self.client = client
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.ewma_alpha = ewma_alpha
+        self.probe_timeout = probe_timeout
+        self._rng = rng or random.Random()
+        self._endpoints: dict[str, EndpointState] = {}
+
+    def state(self, endpoint: str) -> EndpointState:
+        st = self._endpoints.get(endpoint)
+        if st is None:
+            st = self._endpoints[endpoint] = EndpointState(CircuitBreaker(self.failure_threshold, self.reset_timeout))
+        return st
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        return {
+            ep: {
+                "state": st.breaker.state, "outstanding": st.outstanding, "ewmaMs": st.ewma_ms,
+                "requests": st.requests, "failures": st.failures,
+            }
+            for ep, st in self._endpoints.items()
+        }
+
+    def pick(self, providers: list[SearchResult], exclude: Collection[str] = ()) -> SearchResult:
+        now = time.monotonic()
+        usable = []
+        for p in providers:
+            if p.endpoint in exclude:
+                continue
+            st = self.state(p.endpoint)
+            if st.breaker.state == CLOSED:
+                usable.append(p)
+            elif st.breaker.probe_due(now) and st.probe is None:
+                st.breaker.state = HALF_OPEN
+                st.probe = asyncio.create_task(self._probe(p))
+        if not usable:
+            raise NoProviderAvailable("No healthy provider available")
+        if len(usable) == 1:
+            return usable[0]
+        a, b = self._rng.sample(usable, 2)
+        return a if self._score(a) <= self._score(b) else b
+
+    def _score(self, p: SearchResult) -> float:
+        st = self._endpoints[p.endpoint]
+        load = st.outstanding + 1
+        if self.strategy == EWMA:
+            load *= st.ewma_ms or 1.0
+        return load / (0.1 + max(p.trust_score, 0.0))
+
+    async def send_task(
+        self, capability: str, input: dict[str, Any], constraints: dict[str, Any] | None = None, *,
+        providers: list[SearchResult] | None = None, attempts: int = 2, **discover_kw: Any,
+    ) -> Envelope:
+        """Send to the best provider, moving on to another after a transport failure.
+
+        ``providers`` defaults to ``client.discover(capability, **discover_kw)``.
+        """
+        if providers is None:
+            providers = await self.client.discover(capability, **discover_kw)
+        tried: set[str] = set()
+        for attempt in range(attempts):
+            p = self.pick(providers, tried)
+            tried.add(p.endpoint)
+            try:
+                return await self._send(p, capability, input, constraints)
+            except TRANSPORT_ERRORS as e:
+                last = attempt == attempts - 1 or len(tried) == len({x.endpoint for x in providers})
+                if last or not endpoint_failed(e):
+                    raise
+        raise AssertionError("unreachable")
+
+    async def _send(
+        self, p: SearchResult, capability: str, input: dict[str, Any], constraints: dict[str, Any] | None,
+    ) -> Envelope:
+        st = self.state(p.endpoint)
+        st.outstanding += 1
+        st.requests += 1
+        t0 = time.monotonic()
+        try:
+            resp = await self.client.send_task(p.agent_id, p.endpoint, capability, input, constraints)
+        except TRANSPORT_ERRORS as e:
+            if endpoint_failed(e):
+                st.failures += 1
+                st.breaker.record_failure(time.monotonic())
+            raise
+        finally:
+            st.outstanding -= 1
+        ms = (time.monotonic() - t0) * 1e3
+        st.ewma_ms = ms if not st.ewma_ms else self.ewma_alpha * ms + (1 - self.ewma_alpha) * st.ewma_ms
+        st.breaker.record_success()
+        return resp
+
+    async def _probe(self, p: SearchResult) -> None:
+        st = self.state(p.endpoint)
+        try:
+            pong = await asyncio.wait_for(self.client.ping(p.agent_id, p.endpoint), self.probe_timeout)
+            ok = pong.type == "pong"
+        except (*TRANSPORT_ERRORS, ValueError):
+            ok = False
+        finally:
+            st.probe = None
+        if ok:
+            st.breaker.record_success()
+        else:
+            st.breaker.record_failure(time.monotonic())
+
+    async def close(self) -> None:
+        probes = [st.probe for st in self._endpoints.values() if st.probe is not None]
+        for task in probes:
+            task.cancel()
+        await asyncio.gather(*probes, return_exceptions=True)
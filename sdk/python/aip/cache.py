@@ -0,0 +1,103 @@
+"""Client-side discovery result cache"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Hashable
+from ._singleflight import SingleFlight
+from .types import SearchResult
+
+Fetch = Callable[[], Awaitable[list[SearchResult]]]
+
+
+@dataclass
+class _Entry:
+    results: list[SearchResult]
+    fetched_at: float
+
+
+class DiscoveryCache:
+    """Bounded LRU of registry search results with stale-while-revalidate.
+
+    Entries younger than ``ttl`` are served directly. Up to ``stale_ttl``
+    seconds after that they are still served, but a background refresh is
+    started. Older entries are refetched inline. Concurrent misses for the
+    same key share one registry call.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 30.0, stale_ttl: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self._entries: OrderedDict[Hashable, _Entry] = OrderedDict()
+        self._flights: SingleFlight[Hashable, list[SearchResult]] = SingleFlight()
+        self._refreshing: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries), "hits": self.hits, "staleHits": self.stale_hits,
+            "misses": self.misses, "refreshes": self.refreshes,
+        }
+
+    async def get(self, key: Hashable, fetch: Fetch) -> list[SearchResult]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            age = time.monotonic() - entry.fetched_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry.results
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                if key not in self._flights:
+                    task = asyncio.create_task(self._refresh(key, fetch))
+                    self._refreshing.add(task)
+                    task.add_done_callback(self._refreshing.discard)
+                return entry.results
+        self.misses += 1
+        return await self._fetch(key, fetch)
+
+    def invalidate(self, key: Hashable | None = None, *, endpoint: str = "") -> int:
+        """Drop one key, every entry listing ``endpoint``, or (with no arguments) everything."""
+        if key is not None:
+            return 1 if self._entries.pop(key, None) else 0
+        if not endpoint:
+            n = len(self._entries)
+            self._entries.clear()
+            return n
+        stale = [k for k, e in self._entries.items() if any(r.endpoint == endpoint for r in e.results)]
+        for k in stale:
+            del self._entries[k]
+        return len(stale)
+
+    async def close(self) -> None:
+        for task in self._refreshing:
+            task.cancel()
+        await asyncio.gather(*self._refreshing, return_exceptions=True)
+
+    async def _refresh(self, key: Hashable, fetch: Fetch) -> None:
+        self.refreshes += 1
+        try:
+            await self._fetch(key, fetch)
+        except Exception:
+            pass  # keep serving the stale entry; the next expiry retries
+
+    async def _fetch(self, key: Hashable, fetch: Fetch) -> list[SearchResult]:
+        async def store() -> list[SearchResult]:
+            results = await fetch()
+            self._entries[key] = _Entry(results, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            return results
+
+        return await self._flights.run(key, store)
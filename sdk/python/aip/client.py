@@ -1,20 +1,98 @@
 """AIP Client — discover agents and send task requests"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Iterable
 import aiohttp
-from typing import Any
-from .types import Envelope
-from .envelope import create_envelope, validate_envelope
+from yarl import URL
+from .types import Envelope, SearchResult
+from .envelope import create_envelope
+from .codec import JSON_CONTENT_TYPE, CodecError, decode_envelope, dumps
+from .compression import Compressor
+from .attachments import Attachment, BodyLimits, collector, multipart_body, read_multipart
 from .registry import RegistryClient
+from .cache import DiscoveryCache
+from .trust import Ed25519PrivateKey, sign_envelope
+from .session import SessionPool
+from .transport import StreamConnection, StdioConnection, ProgressCallback
+
+FINAL_TASK_TYPES = frozenset({"task.result", "task.error"})
+
+
+@dataclass
+class BatchItem:
+    to_agent_id: str
+    endpoint: str
+    capability: str
+    input: dict[str, Any]
+    constraints: dict[str, Any] | None = None
+
+
+@dataclass
+class BatchOutcome:
+    index: int
+    item: BatchItem
+    response: Envelope | None = None
+    error: BaseException | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.response is not None and self.response.type == "task.result"
 
 
 class AIPClient:
-    def __init__(self, agent_id: str, registry_url: str = "") -> None:
+    def __init__(
+        self, agent_id: str, registry_url: str = "", *,
+        pool: SessionPool | None = None, discovery_cache: DiscoveryCache | None = None,
+        signing_key: Ed25519PrivateKey | None = None, limits: BodyLimits | None = None,
+        compression: Compressor | bool = True,
+    ) -> None:
         self.agent_id = agent_id
-        self.registry = RegistryClient(registry_url) if registry_url else None
+        self.signing_key = signing_key
+        self.limits = limits or BodyLimits()
+        self.compression: Compressor | None = None
+        if compression:
+            self.compression = compression if isinstance(compression, Compressor) else Compressor()
+        # request coding per endpoint, learned from the Accept-Encoding its responses carry
+        self._request_codings: dict[str, str] = {}
+        self._owns_pool = pool is None
+        self.pool = pool or SessionPool()
+        self.registry = RegistryClient(registry_url, pool=self.pool) if registry_url else None
+        self.discovery_cache = discovery_cache if discovery_cache is not None else DiscoveryCache()
+
+    async def close(self) -> None:
+        await self.discovery_cache.close()
+        if self._owns_pool:
+            await self.pool.close()
+
+    async def __aenter__(self) -> AIPClient:
+        return self
 
-    async def discover(self, capability: str = "", tags: list[str] | None = None):
-        if not self.registry:
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
+
+    async def discover(
+        self, capability: str = "", tags: list[str] | None = None, *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        available: bool = False, refresh: bool = False,
+    ) -> list[SearchResult]:
+        """Search the registry through ``discovery_cache``; ``refresh`` forces a registry call."""
+        registry = self.registry
+        if not registry:
             raise RuntimeError("No registry configured")
-        return await self.registry.search(capability=capability, tags=tags)
+        key = (capability, tuple(sorted(tags or ())), max_price, min_trust, operator, available)
+        if refresh:
+            self.discovery_cache.invalidate(key)
+
+        def fetch():
+            return registry.search(
+                capability=capability, tags=tags, max_price=max_price, min_trust=min_trust, operator=operator,
+                available=available,
+            )
+
+        return await self.discovery_cache.get(key, fetch)
 
     async def send_task(
         self, to_agent_id: str, endpoint: str,
@@ -24,18 +102,158 @@ class AIPClient:
         payload = {"capability": capability, "input": input_data}
         if constraints: payload["constraints"] = constraints
         env = create_envelope("task.request", self.agent_id, to_agent_id, payload)
+        return await self._post(endpoint, env)
+
+    async def send_many(
+        self, items: Iterable[BatchItem | tuple[str, str, str, dict[str, Any]]], *,
+        concurrency: int = 64, per_endpoint: int = 8,
+        deadline: float | None = None, timeout: float | None = None,
+    ) -> AsyncIterator[BatchOutcome]:
+        """Fan tasks out concurrently, yielding each outcome as it completes.
+
+        At most ``concurrency`` requests run at once, and at most ``per_endpoint``
+        against any one endpoint. Failures are captured per item rather than
+        raised. ``deadline`` bounds the whole batch in seconds; items still
+        running when it passes are cancelled and reported with a TimeoutError.
+        """
+        batch = [x if isinstance(x, BatchItem) else BatchItem(*x) for x in items]
+        slots = asyncio.Semaphore(concurrency)
+        endpoint_slots: defaultdict[str, asyncio.Semaphore] = defaultdict(lambda: asyncio.Semaphore(per_endpoint))
+        done: asyncio.Queue[BatchOutcome] = asyncio.Queue()
+
+        async def run(index: int, item: BatchItem) -> None:
+            outcome = BatchOutcome(index, item)
+            try:
+                async with endpoint_slots[item.endpoint], slots:
+                    outcome.response = await asyncio.wait_for(
+                        self.send_task(item.to_agent_id, item.endpoint, item.capability, item.input, item.constraints),
+                        timeout,
+                    )
+            except asyncio.CancelledError:
+                outcome.error = asyncio.TimeoutError("Batch deadline exceeded")
+            except Exception as e:
+                outcome.error = e
+            done.put_nowait(outcome)
+
+        tasks = [asyncio.create_task(run(i, item)) for i, item in enumerate(batch)]
+        expires = None if deadline is None else asyncio.get_running_loop().time() + deadline
+        try:
+            for _ in tasks:
+                if expires is None:
+                    yield await done.get()
+                    continue
+                try:
+                    yield await asyncio.wait_for(done.get(), max(0.0, expires - asyncio.get_running_loop().time()))
+                except asyncio.TimeoutError:
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    while not done.empty():
+                        yield done.get_nowait()
+                    return
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def map(
+        self, to_agent_id: str, endpoint: str, capability: str,
+        inputs: Iterable[dict[str, Any]], **kwargs: Any,
+    ) -> AsyncIterator[BatchOutcome]:
+        """``send_many`` for one capability on one agent; ``index`` follows ``inputs`` order."""
+        return self.send_many(((to_agent_id, endpoint, capability, x) for x in inputs), **kwargs)
+
+    async def submit_task(
+        self, to_agent_id: str, endpoint: str,
+        capability: str, input_data: dict[str, Any],
+        constraints: dict[str, Any] | None = None,
+    ) -> Envelope:
+        """Start a task asynchronously; returns task.accept (or an immediate result/error)."""
+        payload = {"capability": capability, "input": input_data}
+        if constraints: payload["constraints"] = constraints
+        env = create_envelope("task.request", self.agent_id, to_agent_id, payload)
+        return await self._post(endpoint, env, headers={"Prefer": "respond-async"})
 
-        async with aiohttp.ClientSession() as s:
-            async with s.post(endpoint, json=env.to_dict()) as r:
+    async def await_result(
+        self, endpoint: str, accepted: Envelope, *,
+        timeout: float | None = None, poll_wait: float = 30.0,
+        on_progress: ProgressCallback | None = None,
+    ) -> Envelope:
+        """Long-poll an accepted task until it produces task.result or task.error."""
+        if accepted.type != "task.accept":
+            return accepted
+        url = URL(endpoint).join(URL(accepted.payload["statusUrl"]))
+        deadline = None if timeout is None else time.monotonic() + timeout
+        since = accepted.id
+        while True:
+            wait = poll_wait
+            if deadline is not None:
+                wait = min(wait, deadline - time.monotonic())
+                if wait <= 0:
+                    raise asyncio.TimeoutError(f"Task {accepted.payload['taskId']} still running")
+            params = {"wait": f"{wait:.3f}", "since": since}
+            async with self.pool.session().get(url, params=params) as r:
+                r.raise_for_status()
+                latest = await self._read_envelope(r)
+            if latest.type in FINAL_TASK_TYPES:
+                return latest
+            if latest.id != since and on_progress and latest.type == "task.progress":
+                on_progress(latest)
+            since = latest.id
+
+    async def cancel_task(self, to_agent_id: str, endpoint: str, task_id: str) -> Envelope:
+        env = create_envelope("task.cancel", self.agent_id, to_agent_id, {"taskId": task_id})
+        return await self._post(endpoint, env)
+
+    async def _post(self, endpoint: str, env: Envelope, headers: dict[str, str] | None = None) -> Envelope:
+        if self.signing_key and not env.signature:
+            env.signature = sign_envelope(env, self.signing_key)
+        found: list[Attachment] = []
+        body = dumps(env.to_dict(), collector(found))
+        data: Any = body
+        c = self.compression
+        if found:
+            data = multipart_body(body, found)
+        else:
+            headers = {"Content-Type": JSON_CONTENT_TYPE, **(headers or {})}
+            if c is not None:
+                data, coding = c.maybe_compress(body, self._request_codings.get(endpoint, ""))
+                if coding:
+                    headers["Content-Encoding"] = coding
+        try:
+            async with self.pool.session().post(endpoint, data=data, headers=headers) as r:
+                if c is not None and endpoint not in self._request_codings:
+                    self._request_codings[endpoint] = c.choose(r.headers.get("Accept-Encoding", ""))
                 r.raise_for_status()
-                data = await r.json()
-                if not validate_envelope(data):
-                    raise ValueError("Invalid response envelope")
-                return Envelope.from_dict(data)
+                return await self._read_envelope(r)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # the provider may have moved or died; don't keep routing to it from cache
+            self.discovery_cache.invalidate(endpoint=endpoint)
+            raise
+
+    async def _read_envelope(self, r: aiohttp.ClientResponse) -> Envelope:
+        attachments = None
+        if r.content_type.startswith("multipart/"):
+            body, attachments = await read_multipart(aiohttp.MultipartReader.from_response(r), self.limits)
+        else:
+            body = await r.read()
+        try:
+            env = decode_envelope(body)
+        except CodecError:
+            raise ValueError("Invalid response envelope") from None
+        env.attachments = attachments
+        return env
 
     async def ping(self, to_agent_id: str, endpoint: str) -> Envelope:
         env = create_envelope("ping", self.agent_id, to_agent_id, {})
-        async with aiohttp.ClientSession() as s:
-            async with s.post(endpoint, json=env.to_dict()) as r:
-                r.raise_for_status()
-                return Envelope.from_dict(await r.json())
+        return await self._post(endpoint, env)
+
+    async def connect(self, to_agent_id: str, endpoint: str) -> StreamConnection:
+        """Open a persistent WebSocket stream; ``endpoint`` may be the agent's HTTP AIP URL."""
+        return await StreamConnection.connect(
+            self.pool.session(), endpoint, self.agent_id, to_agent_id, signing_key=self.signing_key,
+        )
+
+    async def spawn(self, to_agent_id: str, cmd: list[str], **kwargs: Any) -> StdioConnection:
+        """Launch a local agent subprocess and talk to it over the stdio binding."""
+        kwargs.setdefault("signing_key", self.signing_key)
+        return await StdioConnection.spawn(cmd, self.agent_id, to_agent_id, **kwargs)
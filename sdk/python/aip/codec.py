@@ -0,0 +1,98 @@
+"""Envelope wire codec — bytes in, bytes out
+
+Uses orjson when it is installed and falls back to the stdlib ``json``
+module otherwise. ``BACKEND`` names the one in use.
+"""
+from __future__ import annotations
+import json
+from typing import Any, Callable, Mapping
+from aiohttp import web
+from .types import Envelope
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
+
+JSON_CONTENT_TYPE = "application/json"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+class CodecError(ValueError):
+    """Raised for bytes that are not a JSON AIP envelope."""
+
+
+def _std_dumps(obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=default).encode()
+
+
+def _std_canonical(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, sort_keys=True).encode()
+
+
+if orjson is not None:
+    BACKEND = "orjson"
+    _OPTS = orjson.OPT_NON_STR_KEYS
+
+    def dumps(obj: Any, default: Callable[[Any], Any] | None = None) -> bytes:
+        try:
+            return orjson.dumps(obj, default, option=_OPTS)
+        except TypeError:
+            return _std_dumps(obj, default)  # e.g. integers wider than 64 bits
+
+    def canonical(obj: Any) -> bytes:
+        try:
+            return orjson.dumps(obj, option=_OPTS | orjson.OPT_SORT_KEYS)
+        except TypeError:
+            return _std_canonical(obj)
+
+    def loads(data: bytes | str) -> Any:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError as e:
+            raise CodecError(str(e)) from None
+else:
+    BACKEND = "json"
+    dumps = _std_dumps
+    canonical = _std_canonical
+
+    def loads(data: bytes | str) -> Any:
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise CodecError(str(e)) from None
+
+
+def encode_envelope(env: Envelope) -> bytes:
+    return dumps(env.to_dict())
+
+
+def decode_envelope(data: bytes | str) -> Envelope:
+    """Parse and validate in one pass; raises ``CodecError`` for anything that isn't an envelope."""
+    return envelope_from_obj(loads(data))
+
+
+def envelope_from_obj(d: Any) -> Envelope:
+    if not isinstance(d, dict):
+        raise CodecError("Envelope must be a JSON object")
+    try:
+        env = Envelope(
+            d["aip"], d["id"], d["type"], d["from"], d["to"], d["timestamp"], d["payload"],
+            d.get("signature", ""), d.get("replyTo", ""), d.get("correlationId", ""),
+        )
+    except KeyError as e:
+        raise CodecError(f"Missing envelope field: {e.args[0]}") from None
+    for name in _STRING_FIELDS:
+        if not isinstance(d.get(name, ""), str):
+            raise CodecError(f"Envelope field must be a string: {name}")
+    if not isinstance(env.payload, dict):
+        raise CodecError("Envelope payload must be a JSON object")
+    return env
+
+
+_STRING_FIELDS = ("aip", "id", "type", "from", "to", "timestamp", "signature", "replyTo", "correlationId")
+
+
+def json_response(obj: Any, *, status: int = 200, headers: Mapping[str, str] | None = None) -> web.Response:
+    """``web.json_response`` through the fast encoder."""
+    return web.Response(body=dumps(obj), status=status, headers=headers, content_type=JSON_CONTENT_TYPE)
@@ -0,0 +1,131 @@
+"""Negotiated HTTP body compression: gzip always, zstd when installed
+
+Responses are compressed with the best coding in the request's
+``Accept-Encoding``. Servers list the codings they accept for requests in an
+``Accept-Encoding`` response header (RFC 7694), which clients remember per
+endpoint before compressing what they send there. aiohttp decompresses
+incoming bodies on both sides, and ``client_max_size`` applies to the
+decompressed size.
+"""
+from __future__ import annotations
+import sys
+import time
+import zlib
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+try:
+    if sys.version_info >= (3, 14):
+        from compression import zstd as _zstd
+    else:
+        from backports import zstd as _zstd
+    from aiohttp.compression_utils import HAS_ZSTD as _AIOHTTP_ZSTD
+except ImportError:  # pragma: no cover - depends on environment
+    _zstd = None
+    _AIOHTTP_ZSTD = False
+
+GZIP = "gzip"
+ZSTD = "zstd"
+# best first; zstd only when aiohttp can also decode it
+AVAILABLE: tuple[str, ...] = (ZSTD, GZIP) if _zstd is not None and _AIOHTTP_ZSTD else (GZIP,)
+DEFAULT_THRESHOLD = 1024
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Coding -> q-value for an ``Accept-Encoding`` header."""
+    accepted: dict[str, float] = {}
+    for item in header.split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    return accepted
+
+
+@dataclass
+class _Stats:
+    count: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+    seconds: float = 0.0
+
+
+class Compressor:
+    """Compression policy plus counters for weighing CPU time against bytes saved.
+
+    Bodies shorter than ``threshold`` bytes are sent as they are.
+    """
+
+    def __init__(
+        self, *, threshold: int = DEFAULT_THRESHOLD, encodings: Iterable[str] = AVAILABLE,
+        gzip_level: int = 6, zstd_level: int = 3,
+    ) -> None:
+        self.threshold = threshold
+        self.encodings = tuple(e for e in encodings if e in AVAILABLE)
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+        self._stats: dict[str, _Stats] = {}
+        self._choices: dict[str, str] = {}  # peers send few distinct headers
+
+    @property
+    def accept_encoding(self) -> str:
+        return ", ".join(self.encodings)
+
+    def manifest_extension(self) -> dict[str, Any]:
+        return {"encodings": list(self.encodings), "threshold": self.threshold}
+
+    def choose(self, accept_encoding: str) -> str:
+        """Our most preferred coding that the peer accepts, or ""."""
+        if not accept_encoding:
+            return ""
+        choice = self._choices.get(accept_encoding)
+        if choice is None:
+            accepted = parse_accept_encoding(accept_encoding)
+            wildcard = accepted.get("*", 0.0)
+            choice = next((e for e in self.encodings if accepted.get(e, wildcard) > 0), "")
+            if len(self._choices) >= 64:
+                self._choices.clear()
+            self._choices[accept_encoding] = choice
+        return choice
+
+    def compress(self, data: bytes, encoding: str) -> bytes:
+        t0 = time.perf_counter()
+        if encoding == GZIP:
+            c = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+            out = c.compress(data) + c.flush()
+        elif encoding == ZSTD and _zstd is not None:
+            out = _zstd.compress(data, level=self.zstd_level)
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+        s = self._stats.get(encoding)
+        if s is None:
+            s = self._stats[encoding] = _Stats()
+        s.count += 1
+        s.bytes_in += len(data)
+        s.bytes_out += len(out)
+        s.seconds += time.perf_counter() - t0
+        return out
+
+    def maybe_compress(self, data: bytes, encoding: str) -> tuple[bytes, str]:
+        """``(body, coding)``: compressed if ``encoding`` is set and the body is big enough."""
+        if not encoding or len(data) < self.threshold:
+            return data, ""
+        return self.compress(data, encoding), encoding
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            enc: {
+                "count": s.count, "bytesIn": s.bytes_in, "bytesOut": s.bytes_out,
+                "ratio": s.bytes_out / s.bytes_in if s.bytes_in else 1.0, "seconds": s.seconds,
+                "mbPerSecond": s.bytes_in / s.seconds / 1e6 if s.seconds else 0.0,
+            }
+            for enc, s in self._stats.items()
+        }
@@ -0,0 +1,111 @@
+"""Envelope-id replay window: answer retries without re-executing them"""
+from __future__ import annotations
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Hashable
+from ._singleflight import SingleFlight
+from .codec import dumps
+from .types import Envelope
+
+Execute = Callable[[Envelope], Awaitable[Envelope]]
+
+
+class ReplayWindow:
+    """Remembers the response to each envelope id for ``window`` seconds.
+
+    A request whose id was answered inside the window gets the same response
+    again; one whose first copy is still running waits for it. Ids are keyed
+    with the sender unless ``per_sender=False``. ``task.error`` responses
+    are not kept, so a retried failure runs again.
+
+    Answered ids live in time buckets ``granularity`` seconds wide (a tenth
+    of the window by default); whole buckets expire at once, so upkeep is
+    O(1) per request. If more than ``max_entries`` ids are held, or the
+    stored responses encode to more than ``max_bytes``, the oldest bucket is
+    dropped early; a response bigger than ``max_bytes`` on its own is not
+    kept. Memory is therefore about ``max_bytes`` of responses plus a
+    fixed overhead for each of at most ``max_entries`` ids.
+    """
+
+    def __init__(
+        self, window: float = 300.0, *, max_entries: int = 1_000_000, max_bytes: int = 64 * 1024 * 1024,
+        per_sender: bool = True, granularity: float | None = None,
+    ) -> None:
+        self.window = window
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.per_sender = per_sender
+        self.granularity = granularity or window / 10
+        self.duplicates = 0
+        self._done: dict[Hashable, tuple[Envelope, int]] = {}
+        self._buckets: deque[tuple[float, list[Hashable]]] = deque()
+        self._flights: SingleFlight[Hashable, Envelope] = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    @property
+    def attached(self) -> int:
+        return self._flights.joined
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._done), "bytes": self.bytes,
+            "inFlight": len(self._flights), "buckets": len(self._buckets),
+            "duplicates": self.duplicates, "attached": self.attached,
+        }
+
+    def key(self, env: Envelope) -> Hashable:
+        return (env.from_agent, env.id) if self.per_sender else env.id
+
+    def recall(self, env: Envelope) -> Envelope | None:
+        """The response already sent for ``env``'s id, if it is inside the window."""
+        self._expire(time.monotonic())
+        entry = self._done.get(self.key(env))
+        if entry is None:
+            return None
+        self.duplicates += 1
+        return entry[0]
+
+    def remember(self, env: Envelope, resp: Envelope) -> None:
+        if resp.type == "task.error":
+            return
+        key = self.key(env)
+        if key in self._done:
+            return
+        try:
+            size = len(dumps(resp.to_dict()))
+        except TypeError:
+            return  # e.g. holds attachments
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        start = now - now % self.granularity
+        if not self._buckets or self._buckets[-1][0] != start:
+            self._buckets.append((start, []))
+        self._buckets[-1][1].append(key)
+        self._done[key] = (resp, size)
+        self.bytes += size
+        self._expire(now)
+
+    async def run(self, env: Envelope, execute: Execute) -> Envelope:
+        """``execute(env)`` unless ``env`` is a replay of a recent or running request."""
+        resp = self.recall(env)
+        if resp is not None:
+            return resp
+        async def first() -> Envelope:
+            resp = await execute(env)
+            self.remember(env, resp)
+            return resp
+
+        return await self._flights.run(self.key(env), first)
+
+    def _expire(self, now: float) -> None:
+        horizon = now - self.window - self.granularity
+        while self._buckets and (
+            self._buckets[0][0] < horizon or len(self._done) > self.max_entries or self.bytes > self.max_bytes
+        ):
+            _, keys = self._buckets.popleft()
+            for key in keys:
+                self.bytes -= self._done.pop(key)[1]
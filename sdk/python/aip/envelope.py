@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from uuid import uuid4
 from typing import Any
 from .types import Envelope, MessageType
+from .attachments import json_default
 
 
 def create_envelope(
@@ -23,7 +24,7 @@ def canonical_payload(env: Envelope) -> str:
     return json.dumps({
         "id": env.id, "type": env.type, "from": env.from_agent,
         "to": env.to_agent, "timestamp": env.timestamp, "payload": env.payload,
-    }, separators=(",", ":"), sort_keys=False)
+    }, separators=(",", ":"), sort_keys=False, default=json_default)
 
 
 def validate_envelope(data: dict[str, Any]) -> bool:
@@ -0,0 +1,103 @@
+"""Where task handlers run: on the event loop, a thread pool or a process pool"""
+from __future__ import annotations
+import asyncio
+import functools
+import inspect
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+from .types import Envelope
+
+INLINE = "inline"
+THREAD = "thread"
+PROCESS = "process"
+MODES = (INLINE, THREAD, PROCESS)
+
+SyncHandler = Callable[[str, dict[str, Any], Envelope], dict[str, Any]]
+AsyncHandler = Callable[[str, dict[str, Any], Envelope], Awaitable[dict[str, Any]]]
+
+
+class Executors:
+    """The pools shared by a server's offloaded handlers, created on first use.
+
+    Pass your own executors to control sizing; ones created here are shut
+    down by ``shutdown``.
+    """
+
+    def __init__(
+        self, *, threads: Executor | int | None = None, processes: Executor | int | None = None,
+    ) -> None:
+        self._threads = threads if isinstance(threads, Executor) else None
+        self._processes = processes if isinstance(processes, Executor) else None
+        self._thread_workers = threads if isinstance(threads, int) else None
+        self._process_workers = processes if isinstance(processes, int) else None
+        self._owned: list[Executor] = []
+
+    def get(self, mode: str) -> Executor:
+        if mode == THREAD:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(self._thread_workers, thread_name_prefix="aip-handler")
+                self._owned.append(self._threads)
+            return self._threads
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(self._process_workers)
+            self._owned.append(self._processes)
+        return self._processes
+
+    def shutdown(self) -> None:
+        for pool in self._owned:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._owned.clear()
+        self._threads = self._processes = None
+
+
+def offload(
+    handler: SyncHandler | AsyncHandler, executors: Executors, *, mode: str = "", max_concurrency: int = 0,
+) -> AsyncHandler:
+    """Wrap ``handler`` as an async handler that runs according to ``mode``.
+
+    Coroutine functions (also behind ``functools.partial`` or an async
+    ``__call__``) default to ``inline`` and may only run inline. Other
+    callables default to ``thread``; if one turns out to return an awaitable,
+    such as a lambda around a coroutine function, that is awaited on the
+    loop. ``process`` needs picklable handlers (defined at module level), and
+    ships the arguments with one pickle per call. ``max_concurrency`` caps
+    how many calls run at once, queueing the rest on the event loop.
+    """
+    is_async = _is_async(handler)
+    mode = mode or (INLINE if is_async else THREAD)
+    if mode not in MODES:
+        raise ValueError(f"Unknown execution mode: {mode}")
+    if is_async and mode != INLINE:
+        raise ValueError(f"{mode} execution needs a synchronous handler")
+
+    if is_async:
+        run: AsyncHandler = handler  # type: ignore[assignment]
+    elif mode == INLINE:
+        async def run(capability: str, input_data: dict[str, Any], env: Envelope) -> dict[str, Any]:
+            result = handler(capability, input_data, env)
+            return await result if inspect.isawaitable(result) else result  # type: ignore[return-value]
+    else:
+        async def run(capability: str, input_data: dict[str, Any], env: Envelope) -> dict[str, Any]:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(executors.get(mode), handler, capability, input_data, env)
+            # the call only built the coroutine; running it belongs on the loop
+            return await result if inspect.isawaitable(result) else result
+
+    if max_concurrency <= 0:
+        return run
+    slots = asyncio.Semaphore(max_concurrency)
+
+    @functools.wraps(handler)
+    async def limited(capability: str, input_data: dict[str, Any], env: Envelope) -> dict[str, Any]:
+        async with slots:
+            return await run(capability, input_data, env)
+    return limited
+
+
+def _is_async(handler: Callable[..., Any]) -> bool:
+    while isinstance(handler, functools.partial):
+        handler = handler.func
+    if inspect.iscoroutinefunction(handler):
+        return True
+    call = getattr(handler, "__call__", None)
+    return not inspect.isfunction(handler) and inspect.iscoroutinefunction(call)
@@ -0,0 +1,128 @@
+"""Federated discovery across several registries"""
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+from .cache import DiscoveryCache
+from .registry import RegistryClient
+from .session import SessionPool
+from .types import SearchResult
+
+
+@dataclass
+class FederatedResults:
+    results: list[SearchResult]
+    answered: list[str] = field(default_factory=list)
+    timed_out: list[str] = field(default_factory=list)
+    failed: dict[str, str] = field(default_factory=dict)  # peer -> error
+
+    @property
+    def complete(self) -> bool:
+        return not self.timed_out and not self.failed
+
+
+def merge(pages: Iterable[list[SearchResult]]) -> list[SearchResult]:
+    """One result per (agent, capability), highest ``trust_score`` first.
+
+    When peers disagree about the same listing, the higher trust score wins,
+    then the more recent ``last_seen``.
+    """
+    best: dict[tuple[str, str], SearchResult] = {}
+    for results in pages:
+        for r in results:
+            key = (r.agent_id, r.capability)
+            seen = best.get(key)
+            if seen is None or (r.trust_score, r.last_seen) > (seen.trust_score, seen.last_seen):
+                best[key] = r
+    return sorted(best.values(), key=lambda r: r.trust_score, reverse=True)
+
+
+class Federation:
+    """Queries every peer registry at once and merges what arrives within ``deadline``.
+
+    Peers that miss the deadline are reported in ``timed_out`` and left to
+    finish in the background, so their answer is cached for the next query.
+    Peer responses are cached for ``cache_ttl`` seconds. ``search`` matches
+    ``RegistryClient.search``, so a Federation can stand in as
+    ``AIPClient.registry``.
+    """
+
+    def __init__(
+        self, peers: Iterable[str], *, deadline: float = 2.0, cache_ttl: float = 10.0,
+        pool: SessionPool | None = None,
+    ) -> None:
+        self._owns_pool = pool is None
+        self.pool = pool or SessionPool()
+        self.peers = {url.rstrip("/"): RegistryClient(url, pool=self.pool) for url in peers}
+        self.deadline = deadline
+        self.cache = DiscoveryCache(ttl=cache_ttl, stale_ttl=0.0)
+        self._late: set[asyncio.Task] = set()
+
+    async def close(self) -> None:
+        for task in self._late:
+            task.cancel()
+        await asyncio.gather(*self._late, return_exceptions=True)
+        await self.cache.close()
+        if self._owns_pool:
+            await self.pool.close()
+
+    async def __aenter__(self) -> Federation:
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
+
+    async def search(
+        self, capability: str = "", tags: list[str] | None = None, *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        available: bool = False,
+    ) -> list[SearchResult]:
+        found = await self.gather(
+            capability, tags, max_price=max_price, min_trust=min_trust, operator=operator, available=available,
+        )
+        return found.results
+
+    async def gather(
+        self, capability: str = "", tags: list[str] | None = None, *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        available: bool = False, deadline: float | None = None,
+    ) -> FederatedResults:
+        """Merged results from every peer that answered in time, plus who didn't."""
+        query = (capability, tuple(sorted(tags or ())), max_price, min_trust, operator, available)
+        kw: dict[str, Any] = {
+            "max_price": max_price, "min_trust": min_trust, "operator": operator, "available": available,
+        }
+        tasks = {
+            asyncio.create_task(
+                self.cache.get((url, query), lambda c=client: c.search(capability, tags, **kw)),
+            ): url
+            for url, client in self.peers.items()
+        }
+        if not tasks:
+            return FederatedResults([])
+        try:
+            _, pending = await asyncio.wait(tasks, timeout=self.deadline if deadline is None else deadline)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        out = FederatedResults([])
+        pages = []
+        for task, url in tasks.items():
+            if task in pending:
+                out.timed_out.append(url)
+                self._late.add(task)
+                task.add_done_callback(self._late_done)
+            elif (exc := task.exception()) is not None:
+                out.failed[url] = str(exc) or type(exc).__name__
+            else:
+                out.answered.append(url)
+                pages.append(task.result())
+        out.results = merge(pages)
+        return out
+
+    def _late_done(self, task: asyncio.Task) -> None:
+        self._late.discard(task)
+        if not task.cancelled():
+            task.exception()  # mark retrieved; failures aren't cached, so the next query retries
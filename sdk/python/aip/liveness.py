@@ -0,0 +1,118 @@
+"""Agent liveness for the registry: heartbeat expiry and health probing"""
+from __future__ import annotations
+import asyncio
+import heapq
+import time
+from typing import TYPE_CHECKING, Callable
+import aiohttp
+from .session import SessionPool
+
+if TYPE_CHECKING:
+    from .registry_server import RegistryIndex
+
+
+class Liveness:
+    """Which agents have been heard from within the last ``ttl`` seconds.
+
+    Deadlines sit in a min-heap; a beat pushes a new deadline and leaves the
+    old one to be skipped when it surfaces. ``expire`` pops only what is
+    already due, so keeping ``alive`` current costs nothing per query beyond
+    the agents that actually lapsed.
+    """
+
+    def __init__(self, ttl: float = 90.0, *, clock: Callable[[], float] = time.monotonic) -> None:
+        self.ttl = ttl
+        self.clock = clock
+        self.alive: set[str] = set()
+        self._deadlines: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self.alive)
+
+    def beat(self, agent_id: str) -> None:
+        deadline = self.clock() + self.ttl
+        self._deadlines[agent_id] = deadline
+        self.alive.add(agent_id)
+        heapq.heappush(self._heap, (deadline, agent_id))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            # mostly superseded deadlines; rebuild from the live ones
+            self._heap = [(d, a) for a, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def forget(self, agent_id: str) -> None:
+        self._deadlines.pop(agent_id, None)
+        self.alive.discard(agent_id)
+
+    def expire(self) -> int:
+        """Mark every agent whose deadline has passed as unavailable."""
+        now = self.clock()
+        n = 0
+        while self._heap and self._heap[0][0] <= now:
+            deadline, agent_id = heapq.heappop(self._heap)
+            if self._deadlines.get(agent_id) == deadline:
+                del self._deadlines[agent_id]
+                self.alive.discard(agent_id)
+                n += 1
+        return n
+
+    def is_alive(self, agent_id: str) -> bool:
+        self.expire()
+        return agent_id in self.alive
+
+
+class HealthProber:
+    """Periodically GETs each agent's ``endpoints.health`` and counts a 2xx as a beat.
+
+    At most ``concurrency`` probes are in flight; agents without a health
+    endpoint are left to heartbeat on their own.
+    """
+
+    def __init__(
+        self, *, interval: float = 30.0, concurrency: int = 32, timeout: float = 5.0,
+        pool: SessionPool | None = None,
+    ) -> None:
+        self.interval = interval
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self._owns_pool = pool is None
+        self.pool = pool or SessionPool()
+        self._task: asyncio.Task | None = None
+
+    def start(self, index: RegistryIndex, on_beat: Callable[[str], None]) -> None:
+        self._task = asyncio.create_task(self._run(index, on_beat))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._owns_pool:
+            await self.pool.close()
+
+    async def _run(self, index: RegistryIndex, on_beat: Callable[[str], None]) -> None:
+        while True:
+            await self.probe(index, on_beat)
+            await asyncio.sleep(self.interval)
+
+    async def probe(self, index: RegistryIndex, on_beat: Callable[[str], None]) -> int:
+        """Probe every agent once; returns how many answered."""
+        targets = [
+            (agent_id, url) for agent_id, e in index.agents.items()
+            if (url := (e.manifest.get("endpoints") or {}).get("health"))
+        ]
+        sem = asyncio.Semaphore(self.concurrency)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+
+        async def check(agent_id: str, url: str) -> bool:
+            async with sem:
+                try:
+                    async with self.pool.session().get(url, timeout=timeout) as r:
+                        ok = r.status < 300
+                except (aiohttp.ClientError, asyncio.TimeoutError, OSError):
+                    return False
+            if ok and agent_id in index.agents:
+                on_beat(agent_id)
+            return ok
+
+        return sum(await asyncio.gather(*(check(a, u) for a, u in targets)))
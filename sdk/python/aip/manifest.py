@@ -1,4 +1,5 @@
 """Manifest builder for AIP agents"""
+from typing import Any
 from uuid import uuid4
 from .types import Manifest, AgentInfo, Capability, Endpoints, TrustConfig
 
@@ -10,6 +11,7 @@ class ManifestBuilder:
         self._endpoints = Endpoints(aip="")
         self._auth: list[str] = []
         self._trust: TrustConfig | None = None
+        self._extensions: dict[str, Any] = {}
 
     def agent(self, name: str, **kwargs: str) -> "ManifestBuilder":
         self._agent.name = name
@@ -33,6 +35,11 @@ class ManifestBuilder:
         self._trust = trust
         return self
 
+    def extension(self, name: str, value: Any) -> "ManifestBuilder":
+        assert name.startswith("x-"), "Extension names start with x-"
+        self._extensions[name] = value
+        return self
+
     def build(self) -> Manifest:
         assert self._agent.name, "Agent name required"
         assert self._endpoints.aip, "AIP endpoint required"
@@ -40,4 +47,5 @@ class ManifestBuilder:
         return Manifest(
             aip="0.1", agent=self._agent, capabilities=self._capabilities,
             endpoints=self._endpoints, auth_schemes=self._auth, trust=self._trust,
+            extensions=self._extensions,
         )
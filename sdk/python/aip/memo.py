@@ -0,0 +1,109 @@
+"""Server-side result memoization for pure capabilities"""
+from __future__ import annotations
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable
+from ._singleflight import SingleFlight
+from .codec import canonical, dumps
+
+Compute = Callable[[], Awaitable[dict[str, Any]]]
+
+
+def result_key(capability: str, input_data: Any) -> str:
+    """Hash of (capability, input) that ignores object key order."""
+    return hashlib.blake2b(canonical([capability, input_data]), digest_size=16).hexdigest()
+
+
+@dataclass
+class _Entry:
+    result: dict[str, Any]
+    size: int
+    stored_at: float
+
+
+class ResultCache:
+    """LRU of handler results bounded by entry count, total bytes and age.
+
+    Only ``{"status": "completed"}`` results are stored. Concurrent calls for
+    a key that is already being computed wait for that computation instead
+    of starting another. Callers get a shallow copy of the cached result.
+    """
+
+    def __init__(self, max_entries: int = 4096, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._flights: SingleFlight[str, dict[str, Any]] = SingleFlight()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def coalesced(self) -> int:
+        return self._flights.joined
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries), "bytes": self.bytes, "hits": self.hits,
+            "misses": self.misses, "coalesced": self.coalesced, "evictions": self.evictions,
+        }
+
+    def lookup(self, key: str) -> dict[str, Any] | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry.stored_at >= self.ttl:
+            self._drop(key)
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return dict(entry.result)
+
+    async def run(self, key: str, compute: Compute) -> dict[str, Any]:
+        """Run ``compute`` for a ``lookup`` miss, sharing it with concurrent callers."""
+        async def miss() -> dict[str, Any]:
+            self.misses += 1
+            result = await compute()
+            if isinstance(result, dict) and result.get("status") == "completed":
+                self._store(key, result)
+            return result
+
+        return dict(await self._flights.run(key, miss))
+
+    def invalidate(self, key: str | None = None) -> int:
+        """Drop one key, or (with no arguments) everything."""
+        if key is not None:
+            return 1 if self._drop(key) else 0
+        n = len(self._entries)
+        self._entries.clear()
+        self.bytes = 0
+        return n
+
+    def _store(self, key: str, result: dict[str, Any]) -> None:
+        try:
+            size = len(dumps(result))
+        except TypeError:
+            return  # e.g. holds attachments
+        if size > self.max_bytes:
+            return
+        self._drop(key)
+        self._entries[key] = _Entry(result, size, time.monotonic())
+        self.bytes += size
+        while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self.bytes -= old.size
+            self.evictions += 1
+
+    def _drop(self, key: str) -> bool:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self.bytes -= entry.size
+        return True
@@ -0,0 +1,157 @@
+"""Low-overhead counters, gauges and histograms with Prometheus text output"""
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Iterable, TypeVar
+from .types import MESSAGE_TYPES
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return str(int(v)) if float(v).is_integer() else repr(float(v))
+
+
+class _Metric(ABC):
+    type = ""
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+
+    @abstractmethod
+    def samples(self) -> list[str]:
+        """Exposition lines for this metric, without the HELP/TYPE header."""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labels: Iterable[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self.values.get(labels, 0.0)
+
+    def samples(self) -> list[str]:
+        return [f"{self.name}{_labels(self.label_names, k)} {_num(v)}" for k, v in self.values.items()]
+
+
+class Gauge(Counter):
+    """A value that can go down; ``fn`` makes it read a live value at render time."""
+    type = "gauge"
+
+    def __init__(
+        self, name: str, help: str, labels: Iterable[str] = (), fn: Callable[[], float] | None = None,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def set(self, value: float, *labels: str) -> None:
+        self.values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1.0) -> None:
+        self.values[labels] = self.values.get(labels, 0.0) - amount
+
+    def samples(self) -> list[str]:
+        if self.fn is not None:
+            return [f"{self.name} {_num(self.fn())}"]
+        return super().samples()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(
+        self, name: str, help: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (+Inf last)], sum
+        self.counts: dict[tuple[str, ...], list[int]] = {}
+        self.sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        counts = self.counts.get(labels)
+        if counts is None:
+            counts = self.counts[labels] = [0] * (len(self.buckets) + 1)
+            self.sums[labels] = 0.0
+        counts[bisect_left(self.buckets, value)] += 1
+        self.sums[labels] += value
+
+    def count(self, *labels: str) -> int:
+        return sum(self.counts.get(labels, ()))
+
+    def samples(self) -> list[str]:
+        out = []
+        for key, counts in self.counts.items():
+            running = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                running += n
+                le = 'le="' + _num(bound) + '"'
+                out.append(f"{self.name}_bucket{_labels(self.label_names, key, le)} {running}")
+            out.append(f"{self.name}_sum{_labels(self.label_names, key)} {_num(self.sums[key])}")
+            out.append(f"{self.name}_count{_labels(self.label_names, key)} {running}")
+        return out
+
+
+M = TypeVar("M", bound=_Metric)
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self.metrics: list[_Metric] = []
+
+    def register(self, metric: M) -> M:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(m.render() for m in self.metrics) + "\n"
+
+
+class ServerMetrics(MetricsRegistry):
+    """The metric set ``AIPServer`` records when metrics are enabled."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.requests = self.register(Counter("aip_requests_total", "Envelopes received", ["type"]))
+        self.tasks = self.register(Counter("aip_tasks_total", "Task requests by capability and outcome", ["capability", "outcome"]))
+        self.errors = self.register(Counter("aip_errors_total", "task.error responses by error code", ["code"]))
+        self.in_flight = self.register(Gauge("aip_tasks_in_flight", "Handlers currently running", ["capability"]))
+        self.handler_seconds = self.register(Histogram(
+            "aip_handler_duration_seconds", "Time spent in task handlers", ["capability"]))
+        self.stage_seconds = self.register(Histogram(
+            "aip_stage_duration_seconds", "Time per request stage outside the handler", ["stage"]))
+        self.payload_bytes = self.register(Histogram(
+            "aip_payload_bytes", "HTTP body sizes", ["direction"], buckets=SIZE_BUCKETS))
+
+    def count_request(self, message_type: str) -> None:
+        """Count one received envelope; types outside ``MessageType`` share the "other" label."""
+        self.requests.inc(message_type if message_type in MESSAGE_TYPES else "other")
@@ -0,0 +1,116 @@
+"""Server middleware hooks and a sampling profiler built on them"""
+from __future__ import annotations
+import cProfile
+import io
+import pstats
+import threading
+from typing import Any
+from .types import Envelope
+
+State = dict[str, Any]
+
+
+class Middleware:
+    """Base class for ``AIPServer.use``; override only the stages you need.
+
+    ``before_*`` hooks run in registration order and ``after_dispatch`` in
+    reverse, so the first middleware wraps all the others. ``after_dispatch``
+    sees every task response, including errors and short-circuits. ``state``
+    is a fresh dict per task request, shared by that request's hooks.
+    """
+
+    async def before_decode(self, raw: bytes | str) -> None:
+        """Sees the raw bytes of every incoming envelope, before parsing."""
+
+    async def before_dispatch(self, env: Envelope, state: State) -> Envelope | None:
+        """Runs before the handler; returning an envelope answers the request without calling it."""
+        return None
+
+    async def after_dispatch(self, env: Envelope, resp: Envelope, state: State) -> Envelope | None:
+        """Runs after the response is built; returning an envelope replaces it."""
+        return None
+
+    async def on_error(self, env: Envelope, exc: BaseException, state: State) -> Envelope | None:
+        """Runs when the handler raises; returning an envelope replaces the INTERNAL_ERROR response.
+
+        Also called with ``CancelledError`` when the handler is cancelled; the
+        return value is ignored then and no response is sent.
+        """
+        return None
+
+
+def overrides(mw: Middleware, stage: str) -> bool:
+    return getattr(type(mw), stage) is not getattr(Middleware, stage)
+
+
+class SamplingProfiler(Middleware):
+    """Profiles one in every ``every`` task requests and aggregates the samples.
+
+    Only one request is profiled at a time; a sample that comes due while
+    another is running is skipped. The profiler runs on the event loop's
+    thread, so a sample also captures whatever other coroutines ran while the
+    profiled handler was suspended.
+    """
+
+    def __init__(self, every: int = 100) -> None:
+        self.every = every
+        self.seen = 0
+        self.sampled = 0
+        self._active: cProfile.Profile | None = None
+        self._stats: pstats.Stats | None = None
+        self._lock = threading.Lock()
+
+    async def before_dispatch(self, env: Envelope, state: State) -> Envelope | None:
+        self.seen += 1
+        if self.seen % self.every or self._active is not None:
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            return None  # another profiler owns the interpreter
+        self._active = prof
+        state["profiler"] = prof
+        return None
+
+    async def after_dispatch(self, env: Envelope, resp: Envelope, state: State) -> Envelope | None:
+        self._finish(state)
+        return None
+
+    async def on_error(self, env: Envelope, exc: BaseException, state: State) -> Envelope | None:
+        self._finish(state)  # cancelled handlers never reach after_dispatch
+        return None
+
+    def _finish(self, state: State) -> None:
+        prof = state.pop("profiler", None)
+        if prof is None:
+            return
+        prof.disable()
+        self._active = None
+        with self._lock:
+            self.sampled += 1
+            if self._stats is None:
+                self._stats = pstats.Stats(prof)
+            else:
+                self._stats.add(prof)
+
+    def report(self, sort: str = "cumulative", limit: int = 30) -> str:
+        """Aggregated stats as text, in ``pstats`` format."""
+        with self._lock:
+            if self._stats is None:
+                return "no samples yet\n"
+            out = io.StringIO()
+            self._stats.stream = out
+            self._stats.sort_stats(sort).print_stats(limit)
+            return out.getvalue()
+
+    def dump(self, path: str) -> None:
+        """Write aggregated stats for ``python -m pstats`` or snakeviz."""
+        with self._lock:
+            if self._stats is not None:
+                self._stats.dump_stats(path)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats = None
+            self.sampled = 0
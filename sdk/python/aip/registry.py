@@ -1,43 +1,180 @@
 """Registry client"""
-import aiohttp
-from typing import Any
-from .types import Manifest, SearchResult
+from __future__ import annotations
+import asyncio
+from typing import Any, AsyncIterator
+from .types import Manifest, SearchPage, SearchResult, CapabilityPricing
+from .session import SessionPool
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from .codec import NDJSON_CONTENT_TYPE, loads
+from .envelope import create_envelope
+from .trust import sign_envelope
 
 
 class RegistryClient:
-    def __init__(self, base_url: str) -> None:
+    def __init__(self, base_url: str, *, pool: SessionPool | None = None) -> None:
         self.base_url = base_url.rstrip("/")
+        self._owns_pool = pool is None
+        self.pool = pool or SessionPool()
+
+    async def close(self) -> None:
+        if self._owns_pool:
+            await self.pool.close()
+
+    async def __aenter__(self) -> RegistryClient:
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
 
     async def register(self, manifest: Manifest) -> dict[str, Any]:
-        async with aiohttp.ClientSession() as s:
-            async with s.post(f"{self.base_url}/v1/agents", json=manifest.to_dict()) as r:
+        async with self.pool.session().post(f"{self.base_url}/v1/agents", json=manifest.to_dict()) as r:
+            r.raise_for_status()
+            return await r.json(loads=loads)
+
+    async def search(
+        self, capability: str = "", tags: list[str] | None = None, *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        available: bool = False,
+    ) -> list[SearchResult]:
+        params = _search_params(capability, tags, max_price, min_trust, operator, available)
+        async with self.pool.session().get(f"{self.base_url}/v1/agents/search", params=params) as r:
+            r.raise_for_status()
+            data = await r.json(loads=loads)
+            return [_search_result(x) for x in data.get("results", [])]
+
+    async def search_page(
+        self, capability: str = "", tags: list[str] | None = None, *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        available: bool = False, limit: int = 100, cursor: str = "", ndjson: bool = False,
+    ) -> SearchPage:
+        """One page of results; pass its ``next_cursor`` back for the next one.
+
+        Only the first page (no ``cursor``) reports ``total``.
+        """
+        params = _search_params(capability, tags, max_price, min_trust, operator, available)
+        return await self._page(params, limit, cursor, ndjson)
+
+    async def search_iter(
+        self, capability: str = "", tags: list[str] | None = None, *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        available: bool = False, page_size: int = 100, ndjson: bool = False,
+    ) -> AsyncIterator[SearchResult]:
+        """Yield every match, fetching the next page while this one is consumed.
+
+        With ``ndjson`` each page is read line by line rather than as one
+        JSON document; ``page_size=0`` then streams the whole result set in
+        a single response.
+        """
+        params = _search_params(capability, tags, max_price, min_trust, operator, available)
+        if ndjson and not page_size:
+            async with self.pool.session().get(
+                f"{self.base_url}/v1/agents/search", params=params, headers={"Accept": NDJSON_CONTENT_TYPE},
+            ) as r:
                 r.raise_for_status()
-                return await r.json()
-
-    async def search(self, capability: str = "", tags: list[str] | None = None) -> list[SearchResult]:
-        params: dict[str, str] = {}
-        if capability: params["capability"] = capability
-        if tags: params["tags"] = ",".join(tags)
-        async with aiohttp.ClientSession() as s:
-            async with s.get(f"{self.base_url}/v1/agents/search", params=params) as r:
+                async for line in r.content:
+                    if line.strip():
+                        yield _search_result(loads(line))
+            return
+
+        page = await self._page(params, page_size, "", ndjson)
+        while True:
+            prefetch = (
+                asyncio.create_task(self._page(params, page_size, page.next_cursor, ndjson))
+                if page.next_cursor else None
+            )
+            try:
+                for result in page.results:
+                    yield result
+            except BaseException:  # the caller stopped early (GeneratorExit) or failed
+                if prefetch is not None:
+                    prefetch.cancel()
+                raise
+            if prefetch is None:
+                return
+            page = await prefetch
+
+    async def _page(self, params: dict[str, str], limit: int, cursor: str, ndjson: bool) -> SearchPage:
+        params = {**params, "limit": str(limit)}
+        if cursor:
+            params["cursor"] = cursor
+        url = f"{self.base_url}/v1/agents/search"
+        if ndjson:
+            async with self.pool.session().get(url, params=params, headers={"Accept": NDJSON_CONTENT_TYPE}) as r:
                 r.raise_for_status()
-                data = await r.json()
-                return [
-                    SearchResult(
-                        agent_id=x["agent"]["id"], agent_name=x["agent"]["name"],
-                        capability=x.get("capability", ""), endpoint=x.get("endpoint", ""),
-                        trust_score=x.get("trustScore", 0),
-                    )
-                    for x in data.get("results", [])
-                ]
+                results = [_search_result(loads(line)) async for line in r.content if line.strip()]
+                total = r.headers.get("X-Total-Count")
+                return SearchPage(results, None if total is None else int(total), r.headers.get("X-Next-Cursor", ""))
+        async with self.pool.session().get(url, params=params) as r:
+            r.raise_for_status()
+            data = await r.json(loads=loads)
+        return SearchPage(
+            [_search_result(x) for x in data.get("results", [])], data.get("total"), data.get("nextCursor", ""),
+        )
 
     async def get(self, agent_id: str) -> dict[str, Any]:
-        async with aiohttp.ClientSession() as s:
-            async with s.get(f"{self.base_url}/v1/agents/{agent_id}") as r:
-                r.raise_for_status()
-                return await r.json()
+        async with self.pool.session().get(f"{self.base_url}/v1/agents/{agent_id}") as r:
+            r.raise_for_status()
+            return await r.json(loads=loads)
+
+    async def heartbeat(self, agent_id: str) -> dict[str, Any]:
+        """Keep ``agent_id`` available; send again well within the returned ``ttl``."""
+        async with self.pool.session().post(f"{self.base_url}/v1/agents/{agent_id}/heartbeat") as r:
+            r.raise_for_status()
+            return await r.json(loads=loads)
+
+    async def report_outcome(
+        self, agent_id: str, outcome: str, *, reporter: str, private_key: Ed25519PrivateKey,
+        latency_ms: float | None = None, rating: float | None = None,
+    ) -> float:
+        """Report a task outcome (completed, failed or unreachable); returns the trust score.
+
+        The report is signed as ``reporter``, whose registered manifest must
+        carry the matching ``trust.publicKey``.
+        """
+        report: dict[str, Any] = {"outcome": outcome}
+        if latency_ms is not None: report["latencyMs"] = latency_ms
+        if rating is not None: report["rating"] = rating
+        env = create_envelope("task.result", reporter, agent_id, report)
+        env.signature = sign_envelope(env, private_key)
+        url = f"{self.base_url}/v1/agents/{agent_id}/outcomes"
+        async with self.pool.session().post(url, json=env.to_dict()) as r:
+            r.raise_for_status()
+            return (await r.json(loads=loads))["trustScore"]
+
+    async def trust(self, agent_id: str) -> dict[str, Any]:
+        """``{"trustScore": ..., "metrics": {...}}`` for ``agent_id``."""
+        async with self.pool.session().get(f"{self.base_url}/v1/agents/{agent_id}/trust") as r:
+            r.raise_for_status()
+            return await r.json(loads=loads)
 
     async def deregister(self, agent_id: str) -> None:
-        async with aiohttp.ClientSession() as s:
-            async with s.delete(f"{self.base_url}/v1/agents/{agent_id}") as r:
-                r.raise_for_status()
+        async with self.pool.session().delete(f"{self.base_url}/v1/agents/{agent_id}") as r:
+            r.raise_for_status()
+
+
+def _search_params(
+    capability: str, tags: list[str] | None, max_price: float | None, min_trust: float | None,
+    operator: str, available: bool,
+) -> dict[str, str]:
+    params: dict[str, str] = {}
+    if capability: params["capability"] = capability
+    if tags: params["tags"] = ",".join(tags)
+    if max_price is not None: params["maxPrice"] = str(max_price)
+    if min_trust is not None: params["minTrust"] = str(min_trust)
+    if operator: params["operator"] = operator
+    if available: params["available"] = "true"
+    return params
+
+
+def _search_result(x: dict[str, Any]) -> SearchResult:
+    pricing = x.get("pricing")
+    return SearchResult(
+        agent_id=x["agent"]["id"], agent_name=x["agent"]["name"],
+        capability=x.get("capability", ""), endpoint=x.get("endpoint", ""),
+        trust_score=x.get("trustScore", 0),
+        pricing=CapabilityPricing(
+            model=pricing.get("model", "free"), amount=pricing.get("amount", ""),
+            currency=pricing.get("currency", ""),
+        ) if pricing else None,
+        last_seen=x.get("lastSeen", ""),
+    )
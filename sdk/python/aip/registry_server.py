@@ -0,0 +1,563 @@
+"""Python registry server with indexed capability search"""
+from __future__ import annotations
+import re
+from bisect import bisect_left, bisect_right, insort
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Callable, Collection, Iterable, Iterator
+from aiohttp import web
+from .codec import NDJSON_CONTENT_TYPE, CodecError, dumps, envelope_from_obj, json_response, loads
+from .dedup import ReplayWindow
+from .liveness import HealthProber, Liveness
+from .reputation import OUTCOMES, TrustEngine
+from .trust import KeyCache, SignaturePolicy
+
+if TYPE_CHECKING:
+    from .registry_store import RegistryStore
+
+DEFAULT_TRUST = 0.5
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _price(cap: dict[str, Any]) -> float:
+    try:
+        return float((cap.get("pricing") or {}).get("amount") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def manifest_error(manifest: Any) -> str:
+    """Why ``manifest`` can't be indexed, or "" if it can."""
+    agent = manifest.get("agent") if isinstance(manifest, dict) else None
+    if not isinstance(agent, dict) or not agent.get("id") or not agent.get("name") or not manifest.get("capabilities"):
+        return "need agent.id, agent.name, and capabilities"
+    if not isinstance(agent["id"], str) or not isinstance(agent["name"], str):
+        return "agent.id and agent.name must be strings"
+    if not isinstance(agent.get("operator", ""), str):
+        return "agent.operator must be a string"
+    if not isinstance(manifest.get("endpoints") or {}, dict):
+        return "endpoints must be an object"
+    caps = manifest["capabilities"]
+    if not isinstance(caps, list):
+        return "capabilities must be a list"
+    for i, cap in enumerate(caps):
+        if not isinstance(cap, dict) or not isinstance(cap.get("id"), str) or not cap["id"]:
+            return f"capabilities[{i}] needs a string id"
+        if not isinstance(cap.get("name", ""), str):
+            return f"capabilities[{i}].name must be a string"
+        tags = cap.get("tags", [])
+        if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+            return f"capabilities[{i}].tags must be a list of strings"
+        if not isinstance(cap.get("pricing") or {}, dict):
+            return f"capabilities[{i}].pricing must be an object"
+    return ""
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+@dataclass
+class Listing:
+    """One (agent, capability) pair — the unit search returns."""
+    seq: int
+    agent_id: str
+    agent_name: str
+    capability: str
+    endpoint: str
+    pricing: dict[str, Any] | None
+    price: float
+    trust: float
+    tokens: frozenset[str]
+    tags: frozenset[str]
+    operator: str
+
+
+@dataclass
+class AgentEntry:
+    manifest: dict[str, Any]
+    registered_at: str
+    last_seen: str
+    listings: list[int] = field(default_factory=list)
+
+
+class RegistryIndex:
+    """In-memory agent store with inverted and sorted indexes.
+
+    Capability text, tags and operator are served from inverted indexes;
+    ``maxPrice``, ``minTrust`` and ``agents`` are checked per listing. Results
+    come in ``seq`` order, found one of two ways: by sorting the most
+    selective candidate set, or, when it is large next to the page wanted, by
+    walking the seq-ordered listings from the cursor and testing each one
+    against the candidate sets. Either way a page stops at ``limit``.
+
+    Capability queries match by token prefix: ``summ`` finds ``summarize``
+    and ``text-summarize``; every query token must match.
+    """
+
+    def __init__(self) -> None:
+        self.agents: dict[str, AgentEntry] = {}
+        self._listings: dict[int, Listing] = {}
+        self._seq = 0
+        self._by_token: dict[str, set[int]] = {}
+        self._vocab: list[str] = []
+        self._by_tag: dict[str, set[int]] = {}
+        self._by_operator: dict[str, set[int]] = {}
+        self._order: list[int] = []  # live seqs, ascending
+
+    def __len__(self) -> int:
+        return len(self.agents)
+
+    def register(self, manifest: dict[str, Any]) -> AgentEntry:
+        """Add or replace an agent; ``manifest`` must pass ``manifest_error``."""
+        agent = manifest["agent"]
+        previous = self.agents.get(agent["id"])
+        trust = self.trust(agent["id"]) if previous else DEFAULT_TRUST
+        # build every listing before touching the indexes so a bad manifest can't leave them half-updated
+        listings = []
+        for cap in manifest["capabilities"]:
+            self._seq += 1
+            listings.append(Listing(
+                seq=self._seq, agent_id=agent["id"], agent_name=agent["name"],
+                capability=cap["id"], endpoint=(manifest.get("endpoints") or {}).get("aip", ""),
+                pricing=cap.get("pricing"), price=_price(cap), trust=trust,
+                tokens=frozenset(tokenize(cap["id"]) + tokenize(cap.get("name", ""))),
+                tags=frozenset(t.lower() for t in cap.get("tags", [])),
+                operator=agent.get("operator", ""),
+            ))
+        if previous:
+            self._remove_listings(previous)
+        now = _now()
+        entry = AgentEntry(manifest, previous.registered_at if previous else now, now)
+        for listing in listings:
+            self._add_listing(listing)
+            entry.listings.append(listing.seq)
+        self.agents[agent["id"]] = entry
+        return entry
+
+    def deregister(self, agent_id: str) -> bool:
+        entry = self.agents.pop(agent_id, None)
+        if not entry:
+            return False
+        self._remove_listings(entry)
+        return True
+
+    def get(self, agent_id: str) -> AgentEntry | None:
+        return self.agents.get(agent_id)
+
+    def trust(self, agent_id: str) -> float:
+        entry = self.agents.get(agent_id)
+        if not entry or not entry.listings:
+            return DEFAULT_TRUST
+        return self._listings[entry.listings[0]].trust
+
+    def set_trust(self, agent_id: str, score: float) -> None:
+        entry = self.agents.get(agent_id)
+        if not entry:
+            return
+        for seq in entry.listings:
+            self._listings[seq].trust = score
+
+    def search(
+        self, capability: str = "", tags: Iterable[str] = (), *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        agents: Collection[str] | None = None, after: int | None = None, limit: int | None = None,
+    ) -> list[Listing]:
+        """Return up to ``limit`` matching listings with ``seq > after``, in registration order.
+
+        Re-registering moves an agent's listings to the end; the ``seq`` of
+        a listing never changes otherwise, which makes it a stable cursor.
+        ``agents`` restricts results to those agent ids (e.g. the live ones).
+        """
+        sets, keep = self._plan(capability, tags, max_price, min_trust, operator, agents)
+        out: list[Listing] = []
+        if limit == 0 or any(not alternatives for alternatives in sets):
+            return out
+        for seq in self._walk(sets, after, limit):
+            if all(any(seq in p for p in alternatives) for alternatives in sets) and (
+                keep is None or keep(self._listings[seq])
+            ):
+                out.append(self._listings[seq])
+                if len(out) == limit:
+                    break
+        return out
+
+    def count(
+        self, capability: str = "", tags: Iterable[str] = (), *,
+        max_price: float | None = None, min_trust: float | None = None, operator: str = "",
+        agents: Collection[str] | None = None,
+    ) -> int:
+        """How many listings ``search`` would return without a cursor or limit.
+
+        Costs one membership test per listing in the most selective candidate
+        set; nothing is sorted or copied.
+        """
+        sets, keep = self._plan(capability, tags, max_price, min_trust, operator, agents)
+        if any(not alternatives for alternatives in sets):
+            return 0
+        if not sets:
+            return len(self._listings) if keep is None else sum(map(keep, self._listings.values()))
+        sets.sort(key=_size)
+        drive, rest = sets[0], sets[1:]
+        if keep is None and not rest and len(drive) == 1:
+            return len(drive[0])
+        seqs: Iterable[int] = drive[0] if len(drive) == 1 else set().union(*drive)
+        return sum(
+            1 for seq in seqs
+            if all(any(seq in p for p in alternatives) for alternatives in rest)
+            and (keep is None or keep(self._listings[seq]))
+        )
+
+    def _plan(
+        self, capability: str, tags: Iterable[str], max_price: float | None, min_trust: float | None,
+        operator: str, agents: Collection[str] | None,
+    ) -> tuple[list[list[set[int]]], Callable[[Listing], bool] | None]:
+        """The candidate sets a match must hit (one of each inner list) and a per-listing check, if any."""
+        sets: list[list[set[int]]] = [self._prefix_match(token) for token in tokenize(capability)]
+        tag_list = [t.lower() for t in tags]
+        if tag_list:
+            sets.append([self._by_tag[t] for t in tag_list if t in self._by_tag])
+        if operator:
+            sets.append([self._by_operator[operator]] if operator in self._by_operator else [])
+
+        def keep(listing: Listing) -> bool:
+            return (
+                (max_price is None or listing.price <= max_price)
+                and (min_trust is None or listing.trust >= min_trust)
+                and (agents is None or listing.agent_id in agents)
+            )
+        unfiltered = max_price is None and min_trust is None and agents is None
+        return sets, None if unfiltered else keep
+
+    def _walk(self, sets: list[list[set[int]]], after: int | None, limit: int | None) -> Iterator[int]:
+        """Candidate seqs above ``after`` in ascending order.
+
+        Sorting the smallest candidate set costs about its size; scanning
+        ``_order`` costs about ``limit * len(_order) / size`` to fill a page.
+        The cheaper of the two is used.
+        """
+        start = 0 if after is None else after
+        smallest = min(sets, key=_size) if sets else None
+        size = _size(smallest) if smallest is not None else 0
+        if smallest is not None and (limit is None or size * size <= (limit + 1) * len(self._order)):
+            seqs = sorted(smallest[0] if len(smallest) == 1 else set().union(*smallest))
+            for i in range(bisect_right(seqs, start), len(seqs)):
+                yield seqs[i]
+            return
+        order = self._order
+        for i in range(bisect_right(order, start), len(order)):
+            yield order[i]
+
+    def _prefix_match(self, prefix: str) -> list[set[int]]:
+        out: list[set[int]] = []
+        i = bisect_left(self._vocab, prefix)
+        while i < len(self._vocab) and self._vocab[i].startswith(prefix):
+            out.append(self._by_token[self._vocab[i]])
+            i += 1
+        return out
+
+    def _add_listing(self, listing: Listing) -> None:
+        seq = listing.seq
+        self._listings[seq] = listing
+        for token in listing.tokens:
+            if token not in self._by_token:
+                self._by_token[token] = set()
+                insort(self._vocab, token)
+            self._by_token[token].add(seq)
+        for tag in listing.tags:
+            self._by_tag.setdefault(tag, set()).add(seq)
+        if listing.operator:
+            self._by_operator.setdefault(listing.operator, set()).add(seq)
+        insort(self._order, seq)
+
+    def _remove_listings(self, entry: AgentEntry) -> None:
+        for seq in entry.listings:
+            listing = self._listings.pop(seq)
+            for token in listing.tokens:
+                postings = self._by_token[token]
+                postings.discard(seq)
+                if not postings:
+                    del self._by_token[token]
+                    del self._vocab[bisect_left(self._vocab, token)]
+            for tag in listing.tags:
+                _discard(self._by_tag, tag, seq)
+            if listing.operator:
+                _discard(self._by_operator, listing.operator, seq)
+            del self._order[bisect_left(self._order, seq)]
+        entry.listings = []
+
+
+def _size(alternatives: list[set[int]]) -> int:
+    return sum(map(len, alternatives))
+
+
+def _discard(index: dict[str, set[int]], key: str, seq: int) -> None:
+    postings = index.get(key)
+    if postings is not None:
+        postings.discard(seq)
+        if not postings:
+            del index[key]
+
+
+class RegistryServer:
+    """REST registry compatible with ``registry/server.js`` and ``RegistryClient``.
+
+    With a ``store``, registrations survive restarts: the index is loaded from
+    it here, and each mutation is on disk before it is acknowledged.
+
+    Registering and heartbeats keep an agent available for ``liveness.ttl``
+    seconds; a ``prober`` also counts answers from ``endpoints.health``.
+    Agents already in the index start out available for one ttl.
+
+    Outcome reports feed ``trust``; search sees a new score once it has
+    moved by ``trust.min_change``. A report is a ``task.result`` envelope from
+    another registered agent, signed with the ``trust.publicKey`` of its manifest
+    (checked by ``reporters``) and addressed to the agent it rates. Reports
+    older than ``reports.window`` are refused and replays inside it are not
+    counted again.
+    """
+
+    def __init__(
+        self, index: RegistryIndex | None = None, *, store: RegistryStore | None = None,
+        liveness: Liveness | None = None, prober: HealthProber | None = None,
+        trust: TrustEngine | None = None, reporters: SignaturePolicy | None = None,
+        reports: ReplayWindow | None = None,
+    ) -> None:
+        self.index = index if index is not None else RegistryIndex()
+        self.store = store
+        if store is not None:
+            store.load(self.index)
+        self.liveness = liveness if liveness is not None else Liveness()
+        self.prober = prober
+        self.trust = trust if trust is not None else TrustEngine(prior=DEFAULT_TRUST)
+        if reporters is None:
+            reporters = SignaturePolicy(KeyCache(self._public_key), require=True)
+        self.reporters = reporters
+        self.reports = reports if reports is not None else ReplayWindow(window=300.0)
+        for agent_id in self.index.agents:
+            self.liveness.beat(agent_id)
+            self.trust.seed(agent_id, self.index.trust(agent_id))
+        self.app = web.Application()
+        self.app.router.add_get("/health", self._health)
+        self.app.router.add_post("/v1/agents", self._register)
+        self.app.router.add_get("/v1/agents/search", self._search)
+        self.app.router.add_get("/v1/agents/{agent_id}", self._get)
+        self.app.router.add_delete("/v1/agents/{agent_id}", self._deregister)
+        self.app.router.add_post("/v1/agents/{agent_id}/heartbeat", self._heartbeat)
+        self.app.router.add_post("/v1/agents/{agent_id}/outcomes", self._outcomes)
+        self.app.router.add_get("/v1/agents/{agent_id}/trust", self._trust)
+        self._runner: web.AppRunner | None = None
+
+    async def start(self, port: int, host: str = "0.0.0.0") -> None:
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        if self.prober is not None:
+            self.prober.start(self.index, self._seen)
+
+    async def stop(self) -> None:
+        if self.prober is not None:
+            await self.prober.stop()
+        if self._runner:
+            await self._runner.cleanup()
+        if self.store is not None:
+            await self.store.close()
+
+    async def _health(self, _: web.Request) -> web.Response:
+        self.liveness.expire()
+        return json_response({"status": "ok", "agents": len(self.index), "available": len(self.liveness)})
+
+    async def _public_key(self, agent_id: str) -> str | None:
+        entry = self.index.get(agent_id)
+        return (entry.manifest.get("trust") or {}).get("publicKey") or None if entry else None
+
+    def _seen(self, agent_id: str) -> None:
+        self.liveness.beat(agent_id)
+        self.index.agents[agent_id].last_seen = _now()
+
+    async def _register(self, req: web.Request) -> web.Response:
+        try:
+            manifest = loads(await req.read())
+        except CodecError:
+            manifest = None
+        if error := manifest_error(manifest):
+            return json_response({"error": f"Invalid manifest: {error}"}, status=400)
+        agent = manifest["agent"]
+        entry = self.index.register(manifest)
+        self.reporters.keys.invalidate(agent["id"])
+        self.liveness.beat(agent["id"])
+        if self.store is not None:
+            await self.store.put(manifest, entry.last_seen)
+        return json_response({"id": agent["id"], "status": "registered"}, status=201)
+
+    async def _search(self, req: web.Request) -> web.StreamResponse:
+        """Search, paged by ``limit`` plus either ``cursor`` or ``page``.
+
+        ``cursor`` is the ``nextCursor`` of the previous page: the seq of its
+        last listing, so pages don't shift when agents register meanwhile.
+        A cursor page costs about ``limit`` listings and carries no ``total``;
+        counting every match is left to the first request.
+        With ``Accept: application/x-ndjson`` the page is streamed one
+        result per line instead of as one JSON document.
+        """
+        q = req.query
+        try:
+            max_price = float(q["maxPrice"]) if q.get("maxPrice") else None
+            min_trust = float(q["minTrust"]) if q.get("minTrust") else None
+            page = max(1, int(q.get("page", 1)))
+            limit = int(q["limit"]) if q.get("limit") else None
+            after = int(q["cursor"]) if q.get("cursor") else None
+        except ValueError:
+            return json_response({"error": "Invalid search parameters"}, status=400)
+        if limit is not None and limit < 1:
+            return json_response({"error": "Invalid search parameters"}, status=400)
+        tags = [t.strip() for t in q.get("tags", "").split(",") if t.strip()]
+        available = None
+        if q.get("available") == "true":
+            self.liveness.expire()
+            available = self.liveness.alive
+        query = dict(
+            capability=q.get("capability", ""), tags=tags,
+            max_price=max_price, min_trust=min_trust, operator=q.get("operator", ""), agents=available,
+        )
+        skip = (page - 1) * limit if limit is not None and after is None else 0
+        matches = self.index.search(**query, after=after, limit=None if limit is None else skip + limit + 1)
+        window = matches[skip:] if limit is None else matches[skip:skip + limit]
+        next_cursor = str(window[-1].seq) if window and len(matches) > skip + len(window) else ""
+        total = self.index.count(**query) if after is None else None
+
+        if NDJSON_CONTENT_TYPE in req.headers.get("Accept", ""):
+            return await self._stream_results(req, window, total, next_cursor)
+        body: dict[str, Any] = {"results": [self._result(x) for x in window], "page": page, "nextCursor": next_cursor}
+        if total is not None:
+            body["total"] = total
+        return json_response(body)
+
+    async def _stream_results(
+        self, req: web.Request, window: list[Listing], total: int | None, next_cursor: str,
+    ) -> web.StreamResponse:
+        headers = {"Content-Type": NDJSON_CONTENT_TYPE, "X-Next-Cursor": next_cursor}
+        if total is not None:
+            headers["X-Total-Count"] = str(total)
+        resp = web.StreamResponse(headers=headers)
+        await resp.prepare(req)
+        batch: list[bytes] = []
+        for listing in window:
+            batch.append(dumps(self._result(listing)) + b"\n")
+            if len(batch) == 256:
+                await resp.write(b"".join(batch))
+                batch = []
+        if batch:
+            await resp.write(b"".join(batch))
+        await resp.write_eof()
+        return resp
+
+    def _result(self, listing: Listing) -> dict[str, Any]:
+        return {
+            "agent": {"id": listing.agent_id, "name": listing.agent_name},
+            "capability": listing.capability,
+            "trustScore": listing.trust,
+            "pricing": listing.pricing,
+            "endpoint": listing.endpoint,
+            "lastSeen": self.index.agents[listing.agent_id].last_seen,
+        }
+
+    async def _get(self, req: web.Request) -> web.Response:
+        entry = self.index.get(req.match_info["agent_id"])
+        if not entry:
+            return json_response({"error": "Agent not found"}, status=404)
+        return json_response(entry.manifest)
+
+    async def _deregister(self, req: web.Request) -> web.Response:
+        agent_id = req.match_info["agent_id"]
+        if not self.index.deregister(agent_id):
+            return json_response({"error": "Agent not found"}, status=404)
+        self.liveness.forget(agent_id)
+        self.trust.forget(agent_id)
+        self.reporters.keys.invalidate(agent_id)
+        if self.store is not None:
+            await self.store.delete(agent_id)
+        return json_response({"status": "deregistered"})
+
+    async def _heartbeat(self, req: web.Request) -> web.Response:
+        agent_id = req.match_info["agent_id"]
+        if agent_id not in self.index.agents:
+            return json_response({"error": "Agent not found"}, status=404)
+        self._seen(agent_id)
+        return json_response({"status": "ok", "ttl": self.liveness.ttl})
+
+    async def _outcomes(self, req: web.Request) -> web.Response:
+        """Record a signed envelope whose payload is ``{"outcome", "latencyMs"?, "rating"?}``,
+        or a batch of them under ``reports``."""
+        agent_id = req.match_info["agent_id"]
+        if agent_id not in self.index.agents:
+            return json_response({"error": "Agent not found"}, status=404)
+        try:
+            env = envelope_from_obj(loads(await req.read()))
+        except CodecError:
+            return json_response({"error": "Outcome reports must be AIP envelopes"}, status=400)
+        if env.type != "task.result" or env.to_agent != agent_id:
+            return json_response(
+                {"error": "Reports are task.result envelopes addressed to the rated agent"}, status=400,
+            )
+        if env.from_agent == agent_id:
+            return json_response({"error": "Agents cannot report on themselves"}, status=403)
+        if reason := await self.reporters.check(env):
+            return json_response({"error": reason}, status=401)
+        if not _fresh(env.timestamp, self.reports.window):
+            return json_response({"error": "Report timestamp outside the replay window"}, status=401)
+        if self.reports.recall(env) is not None:
+            return json_response({"trustScore": self.index.trust(agent_id), "recorded": 0})
+        try:
+            reports = env.payload.get("reports", [env.payload])
+            parsed = [(r["outcome"], _number(r.get("latencyMs")), _number(r.get("rating"))) for r in reports]
+        except (AttributeError, KeyError, TypeError, ValueError):
+            parsed = None
+        if not parsed or any(outcome not in OUTCOMES for outcome, _, _ in parsed):
+            return json_response(
+                {"error": f"Invalid outcome report: outcome must be one of {list(OUTCOMES)}"}, status=400,
+            )
+        published = None
+        for outcome, latency_ms, rating in parsed:
+            score = self.trust.record(agent_id, outcome, latency_ms=latency_ms, rating=rating)
+            if score is not None:
+                published = score
+        self.reports.remember(env, env)
+        if published is not None:
+            self.index.set_trust(agent_id, published)
+            if self.store is not None:
+                await self.store.set_trust(agent_id, published)
+        return json_response({"trustScore": self.index.trust(agent_id), "recorded": len(parsed)})
+
+    async def _trust(self, req: web.Request) -> web.Response:
+        agent_id = req.match_info["agent_id"]
+        entry = self.index.get(agent_id)
+        if not entry:
+            return json_response({"error": "Agent not found"}, status=404)
+        metrics = self.trust.metrics(agent_id)
+        metrics["firstSeen"] = entry.registered_at
+        return json_response({"trustScore": self.index.trust(agent_id), "metrics": metrics})
+
+
+def _fresh(timestamp: str, window: float) -> bool:
+    try:
+        sent = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    except ValueError:
+        return False
+    if sent.tzinfo is None:
+        return False
+    return abs((datetime.now(timezone.utc) - sent).total_seconds()) <= window
+
+
+def _number(value: Any) -> float | None:
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise TypeError("expected a number")
+    return float(value)
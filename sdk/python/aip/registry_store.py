@@ -0,0 +1,181 @@
+"""Durable storage for RegistryIndex: append-only log plus compacted snapshots
+
+The directory holds ``snapshot.ndjson`` (one agent per line) and
+``log.ndjson`` (one mutation per line since that snapshot). State is the
+snapshot with the log replayed over it. Every record is idempotent, so a
+crash between writing a snapshot and truncating the log only replays some
+records twice.
+"""
+from __future__ import annotations
+import asyncio
+import mmap
+import os
+from typing import IO, Any, Iterator
+from .codec import CodecError, dumps, loads
+from .registry_server import RegistryIndex
+
+SNAPSHOT = "snapshot.ndjson"
+LOG = "log.ndjson"
+
+
+def _lines(path: str) -> Iterator[tuple[int, bytes]]:
+    """(end offset, line) for each line of ``path``, read through mmap."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for line in iter(mm.readline, b""):
+            yield mm.tell(), line
+
+
+class RegistryStore:
+    """Persists registry mutations with group-committed fsyncs.
+
+    ``append`` returns once its record is on disk. Records that arrive within
+    ``fsync_interval`` seconds of each other share one write and one fsync,
+    done off the event loop. After ``compact_after`` records the current index
+    is written out as a new snapshot and the log starts over.
+    """
+
+    def __init__(self, directory: str, *, fsync_interval: float = 0.005, compact_after: int = 10_000) -> None:
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.compact_after = compact_after
+        self.index: RegistryIndex | None = None
+        self.records_since_snapshot = 0
+        self.fsyncs = 0
+        self._log: IO[bytes] | None = None
+        self._pending: list[bytes] = []
+        self._waiters: list[asyncio.Future[None]] = []
+        self._flusher: asyncio.Task | None = None
+        self._io = asyncio.Lock()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def load(self, index: RegistryIndex) -> int:
+        """Fill ``index`` from disk and open the log for appending; returns the agent count."""
+        os.makedirs(self.directory, exist_ok=True)
+        self.index = index
+        for _, line in _lines(self._path(SNAPSHOT)):
+            rec = loads(line)
+            entry = index.register(rec["manifest"])
+            entry.registered_at = rec["registeredAt"]
+            entry.last_seen = rec["lastSeen"]
+            index.set_trust(entry.manifest["agent"]["id"], rec["trust"])
+
+        log_path = self._path(LOG)
+        good = 0
+        for end, line in _lines(log_path):
+            # a record counts only once its newline is down; anything after is a torn write
+            if not line.endswith(b"\n"):
+                break
+            try:
+                rec = loads(line)
+            except CodecError:
+                break
+            self._apply(rec)
+            good = end
+            self.records_since_snapshot += 1
+        self._log = open(log_path, "ab")
+        self._log.truncate(good)
+        return len(index)
+
+    def _apply(self, rec: dict[str, Any]) -> None:
+        assert self.index is not None
+        op = rec["op"]
+        if op == "put":
+            known = rec["manifest"]["agent"]["id"] in self.index.agents
+            entry = self.index.register(rec["manifest"])
+            entry.last_seen = rec["at"]
+            if not known:
+                entry.registered_at = rec["at"]
+        elif op == "del":
+            self.index.deregister(rec["id"])
+        elif op == "trust":
+            self.index.set_trust(rec["id"], rec["score"])
+
+    async def put(self, manifest: dict[str, Any], at: str) -> None:
+        await self.append({"op": "put", "manifest": manifest, "at": at})
+
+    async def delete(self, agent_id: str) -> None:
+        await self.append({"op": "del", "id": agent_id})
+
+    async def set_trust(self, agent_id: str, score: float) -> None:
+        await self.append({"op": "trust", "id": agent_id, "score": score})
+
+    async def append(self, record: dict[str, Any]) -> None:
+        if self._log is None:
+            raise RuntimeError("RegistryStore.load() must be called first")
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._pending.append(dumps(record) + b"\n")
+        self._waiters.append(fut)
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        await fut
+
+    async def _flush_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            if self.fsync_interval:
+                await asyncio.sleep(self.fsync_interval)
+            data, waiters = b"".join(self._pending), self._waiters
+            self._pending, self._waiters = [], []
+            try:
+                async with self._io:
+                    await loop.run_in_executor(None, self._write, data)
+            except Exception as e:
+                for w in waiters:
+                    if not w.done():
+                        w.set_exception(e)
+                continue
+            self.records_since_snapshot += len(waiters)
+            for w in waiters:
+                if not w.done():
+                    w.set_result(None)
+            if self.compact_after and self.records_since_snapshot >= self.compact_after:
+                await self.compact()
+
+    def _write(self, data: bytes) -> None:
+        assert self._log is not None
+        self._log.write(data)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self.fsyncs += 1
+
+    async def compact(self) -> None:
+        """Snapshot the index and start an empty log."""
+        assert self.index is not None and self._log is not None
+        # serialized on the loop so the snapshot is a consistent cut; only the I/O is offloaded
+        data = b"".join(
+            dumps({
+                "manifest": e.manifest, "registeredAt": e.registered_at, "lastSeen": e.last_seen,
+                "trust": self.index.trust(agent_id),
+            }) + b"\n"
+            for agent_id, e in self.index.agents.items()
+        )
+        async with self._io:
+            await asyncio.get_running_loop().run_in_executor(None, self._replace_snapshot, data)
+        self.records_since_snapshot = 0
+
+    def _replace_snapshot(self, data: bytes) -> None:
+        tmp = self._path(SNAPSHOT + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(SNAPSHOT))
+        assert self._log is not None
+        self._log.truncate(0)
+        self._log.seek(0)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    async def close(self) -> None:
+        if self._flusher is not None:
+            await self._flusher
+        if self._log is not None:
+            self._log.close()
+            self._log = None
@@ -0,0 +1,175 @@
+"""Incremental trust scores computed from reported task outcomes
+
+Each report updates its agent's statistics in O(1):
+
+* completed, failed and unreachable counts decay exponentially with
+  ``half_life``, so recent behaviour dominates;
+* response time is an EWMA plus a log-bucketed sketch for percentiles;
+* ratings, when given, are an EWMA.
+
+The trust score is the decayed success rate, pulled toward a prior by
+``prior_weight`` pseudo-reports so a few early outcomes can't swing it to
+0 or 1. The prior is ``prior``, or the agent's last known score when it is
+``seed``-ed. Unreachable reports count as failures. ``uptime`` is the decayed
+share of reports where the agent was reachable.
+"""
+from __future__ import annotations
+import math
+import time
+from typing import Any, Callable
+
+COMPLETED = "completed"
+FAILED = "failed"
+UNREACHABLE = "unreachable"
+OUTCOMES = (COMPLETED, FAILED, UNREACHABLE)
+
+
+class LatencySketch:
+    """Quantiles within ``accuracy`` relative error from geometric buckets."""
+
+    __slots__ = ("_gamma", "_log_gamma", "_buckets", "count")
+
+    def __init__(self, accuracy: float = 0.02) -> None:
+        self._gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: dict[int, int] = {}
+        self.count = 0
+
+    def add(self, ms: float) -> None:
+        i = math.ceil(math.log(max(ms, 1e-3)) / self._log_gamma)
+        self._buckets[i] = self._buckets.get(i, 0) + 1
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = q * (self.count - 1)
+        seen = 0
+        for i in sorted(self._buckets):
+            seen += self._buckets[i]
+            if seen > rank:
+                return 2 * self._gamma ** i / (self._gamma + 1)
+        raise AssertionError("unreachable")
+
+
+class AgentStats:
+    __slots__ = (
+        "completed", "failed", "unreachable", "updated_at", "total_completed", "total_failed",
+        "ewma_ms", "rating", "latency", "prior",
+    )
+
+    def __init__(self, now: float, prior: float) -> None:
+        self.prior = prior
+        self.completed = self.failed = self.unreachable = 0.0  # decayed
+        self.updated_at = now
+        self.total_completed = 0
+        self.total_failed = 0
+        self.ewma_ms = 0.0
+        self.rating: float | None = None
+        self.latency = LatencySketch()
+
+
+class TrustEngine:
+    """Per-agent outcome statistics and the trust score derived from them.
+
+    ``record`` returns the new score only when it has moved at least
+    ``min_change`` since it was last returned, so callers re-index trust
+    a bounded number of times however fast reports arrive.
+    """
+
+    def __init__(
+        self, *, half_life: float = 86_400.0, prior: float = 0.5, prior_weight: float = 2.0,
+        alpha: float = 0.1, min_change: float = 0.005, clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.half_life = half_life
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self.alpha = alpha
+        self.min_change = min_change
+        self.clock = clock
+        self._stats: dict[str, AgentStats] = {}
+        self._published: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._stats)
+
+    def record(
+        self, agent_id: str, outcome: str, *, latency_ms: float | None = None, rating: float | None = None,
+    ) -> float | None:
+        if outcome not in OUTCOMES:
+            raise ValueError(f"Unknown outcome: {outcome}")
+        now = self.clock()
+        st = self._stats.get(agent_id)
+        if st is None:
+            st = self._stats[agent_id] = AgentStats(now, self.prior)
+        self._decay(st, now)
+        if outcome == COMPLETED:
+            st.completed += 1
+            st.total_completed += 1
+        elif outcome == FAILED:
+            st.failed += 1
+            st.total_failed += 1
+        else:
+            st.unreachable += 1
+            st.total_failed += 1
+        a = self.alpha
+        if latency_ms is not None:
+            st.ewma_ms = latency_ms if not st.latency.count else a * latency_ms + (1 - a) * st.ewma_ms
+            st.latency.add(latency_ms)
+        if rating is not None:
+            st.rating = rating if st.rating is None else a * rating + (1 - a) * st.rating
+
+        score = self.score(agent_id)
+        if abs(score - self._published.get(agent_id, self.prior)) < self.min_change:
+            return None
+        self._published[agent_id] = score
+        return score
+
+    def score(self, agent_id: str) -> float:
+        st = self._stats.get(agent_id)
+        if st is None:
+            return self.prior
+        self._decay(st, self.clock())
+        total = st.completed + st.failed + st.unreachable
+        return (st.completed + st.prior * self.prior_weight) / (total + self.prior_weight)
+
+    def metrics(self, agent_id: str) -> dict[str, Any]:
+        """The spec's ``metrics`` block (``firstSeen`` comes from the registry)."""
+        st = self._stats.get(agent_id)
+        if st is None:
+            return {"tasksCompleted": 0, "tasksFailed": 0}
+        self._decay(st, self.clock())
+        total = st.completed + st.failed + st.unreachable
+        out: dict[str, Any] = {
+            "tasksCompleted": st.total_completed,
+            "tasksFailed": st.total_failed,
+            "uptime": round(1 - st.unreachable / total, 4) if total else 1.0,
+        }
+        if st.latency.count:
+            out["avgResponseTime"] = _duration(st.ewma_ms)
+            out["p95ResponseTime"] = _duration(st.latency.quantile(0.95))
+        if st.rating is not None:
+            out["avgRating"] = round(st.rating, 2)
+        return out
+
+    def seed(self, agent_id: str, score: float) -> None:
+        """Start ``agent_id`` from a known score, e.g. one restored from storage."""
+        self._stats[agent_id] = AgentStats(self.clock(), score)
+        self._published[agent_id] = score
+
+    def forget(self, agent_id: str) -> None:
+        self._stats.pop(agent_id, None)
+        self._published.pop(agent_id, None)
+
+    def _decay(self, st: AgentStats, now: float) -> None:
+        elapsed = now - st.updated_at
+        if elapsed > 0:
+            f = 0.5 ** (elapsed / self.half_life)
+            st.completed *= f
+            st.failed *= f
+            st.unreachable *= f
+            st.updated_at = now
+
+
+def _duration(ms: float) -> str:
+    return f"{ms / 1000:.3g}s"
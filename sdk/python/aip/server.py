@@ -1,82 +1,556 @@
 """AIP Server — handle incoming tasks using aiohttp"""
-import json
+import asyncio
+import socket
+import time
 from typing import Any, Callable, Awaitable
-from aiohttp import web
+from aiohttp import web, WSMsgType
 from .types import Manifest, Envelope, ErrorCodes
-from .envelope import create_envelope, validate_envelope
+from .envelope import create_envelope
+from .codec import JSON_CONTENT_TYPE, CodecError, decode_envelope, dumps, json_response, loads
+from .transport import open_stdio
+from .tasks import TaskStore, TaskStoreFull, TaskRecord
+from .trust import SignaturePolicy
+from .validation import Validator, compile_schema
+from .metrics import PROMETHEUS_CONTENT_TYPE, Gauge, ServerMetrics
+from .middleware import Middleware, overrides
+from .memo import ResultCache, result_key
+from .dedup import ReplayWindow
+from .execution import Executors, SyncHandler, offload
+from .compression import Compressor
+from .attachments import Attachment, AttachmentError, BodyLimits, BodyTooLarge, collector, multipart_body, read_multipart
 
 TaskHandler = Callable[[str, dict[str, Any], Envelope], Awaitable[dict[str, Any]]]
+ProgressSink = Callable[[Envelope], Awaitable[None]]
+
+MAX_POLL_WAIT = 60.0
 
 
 class AIPServer:
-    def __init__(self, manifest: Manifest) -> None:
+    def __init__(
+        self, manifest: Manifest, *,
+        tasks: TaskStore | None = None, signatures: SignaturePolicy | None = None,
+        metrics: bool | ServerMetrics = False, results: ResultCache | None = None,
+        replays: ReplayWindow | None = None, executors: Executors | None = None,
+        limits: BodyLimits | None = None, compression: Compressor | bool = True,
+    ) -> None:
         self.manifest = manifest
         self.handlers: dict[str, TaskHandler] = {}
-        self.app = web.Application()
+        self.validators: dict[str, Validator] = {}
+        self.cacheable: set[str] = set()
+        self.results = results
+        self.replays = replays
+        self.executors = executors if executors is not None else Executors()
+        self.limits = limits or BodyLimits()
+        self.compression: Compressor | None = None
+        self._codings_header: dict[str, str] = {}
+        if compression:
+            self.compression = compression if isinstance(compression, Compressor) else Compressor()
+            manifest.extensions.setdefault("x-compression", self.compression.manifest_extension())
+            # RFC 7694: tell clients which codings we take for request bodies
+            self._codings_header = {"Accept-Encoding": self.compression.accept_encoding}
+        self.tasks = tasks if tasks is not None else TaskStore()
+        self.signatures = signatures
+        self.metrics: ServerMetrics | None = None
+        if metrics:
+            self.metrics = metrics if isinstance(metrics, ServerMetrics) else ServerMetrics()
+            self.metrics.register(Gauge(
+                "aip_async_tasks_running", "Accepted async tasks not yet finished", fn=lambda: self.tasks.running,
+            ))
+            for name in ("hits", "misses", "coalesced"):
+                self.metrics.register(Gauge(
+                    f"aip_result_cache_{name}", f"Memoized capability lookups: {name}",
+                    fn=lambda name=name: getattr(self.results, name, 0),
+                ))
+        self._in_flight = 0
+        self.app = web.Application(client_max_size=self.limits.envelope)
         self.app.router.add_get("/health", self._health)
         self.app.router.add_get("/.well-known/aip-manifest.json", self._manifest)
         self.app.router.add_post("/aip", self._handle_message)
         self.app.router.add_post("/", self._handle_message)
+        self.app.router.add_get("/aip/stream", self._handle_stream)
+        self.app.router.add_get("/aip/tasks/{task_id}", self._task_status)
+        if self.metrics:
+            self.app.router.add_get("/metrics", self._metrics)
         self._runner: web.AppRunner | None = None
+        self._progress_sinks: dict[str, ProgressSink] = {}
+        self.middleware: list[Middleware] = []
+        self._before_decode: list[Middleware] = []
+        self._before_dispatch: list[Middleware] = []
+        self._after_dispatch: list[Middleware] = []
+        self._on_error: list[Middleware] = []
+
+    def handle(
+        self, capability_id: str, handler: TaskHandler | SyncHandler, *, validate: bool = True,
+        cacheable: bool = False, execution: str = "", max_concurrency: int = 0,
+    ) -> "AIPServer":
+        """Register ``handler``; input is checked against the manifest's inputSchema unless ``validate=False``.
 
-    def handle(self, capability_id: str, handler: TaskHandler) -> "AIPServer":
-        self.handlers[capability_id] = handler
+        ``cacheable=True`` declares the capability a pure function of its
+        input: completed results are memoized in ``self.results`` and
+        identical concurrent requests share one handler call.
+
+        ``handler`` may be a plain function. ``execution`` picks where it
+        runs ("inline", "thread" or "process"; see ``aip.execution.offload``)
+        and ``max_concurrency`` bounds how many calls run at once.
+        """
+        self.handlers[capability_id] = offload(
+            handler, self.executors, mode=execution, max_concurrency=max_concurrency,
+        )
+        self.validators.pop(capability_id, None)
+        self.cacheable.discard(capability_id)
+        if cacheable:
+            self.cacheable.add(capability_id)
+            if self.results is None:
+                self.results = ResultCache()
+        cap = next((c for c in self.manifest.capabilities if c.id == capability_id), None)
+        if validate and cap and cap.input_schema:
+            self.validators[capability_id] = compile_schema(cap.input_schema)
         return self
 
-    async def start(self, port: int, host: str = "0.0.0.0") -> None:
+    def use(self, middleware: Middleware) -> "AIPServer":
+        """Append ``middleware`` to the chain; hooks it doesn't override cost nothing per request."""
+        self.middleware.append(middleware)
+        for stage in ("before_decode", "before_dispatch", "after_dispatch", "on_error"):
+            if overrides(middleware, stage):
+                getattr(self, f"_{stage}").append(middleware)
+        self._after_dispatch.sort(key=self.middleware.index, reverse=True)
+        return self
+
+    async def start(
+        self, port: int, host: str = "0.0.0.0", *, reuse_port: bool = False, sock: socket.socket | None = None,
+    ) -> None:
+        """Listen on ``host:port``, or on an already bound ``sock``."""
         self._runner = web.AppRunner(self.app)
         await self._runner.setup()
-        site = web.TCPSite(self._runner, host, port)
+        site: web.BaseSite
+        if sock is not None:
+            site = web.SockSite(self._runner, sock)
+        else:
+            site = web.TCPSite(self._runner, host, port, reuse_port=reuse_port or None)
         await site.start()
 
+    def serve(self, port: int, host: str = "0.0.0.0", *, workers: int | None = None, **kw: Any) -> None:
+        """Blocking entry point: serve from ``workers`` forked processes (one per CPU by default).
+
+        See ``aip.workers.serve`` for the remaining options.
+        """
+        from .workers import serve
+        serve(self, port, host, workers=workers, **kw)
+
     async def stop(self) -> None:
+        for task_id in list(self._progress_sinks):
+            record = self.tasks.get(task_id)
+            if record and record.runner:
+                record.runner.cancel()
         if self._runner:
             await self._runner.cleanup()
+        self.executors.shutdown()
+
+    async def report_progress(
+        self, env: Envelope, progress: float, *, stage: str = "", message: str = "", **extra: Any,
+    ) -> None:
+        """Push a task.progress update for the task started by ``env``.
+
+        Streamed to WebSocket/stdio requesters and recorded for async tasks;
+        a no-op for plain synchronous HTTP requests.
+        """
+        sink = self._progress_sinks.get(env.id)
+        if not sink:
+            return
+        payload: dict[str, Any] = {"progress": progress, **extra}
+        if stage: payload["stage"] = stage
+        if message: payload["message"] = message
+        update = create_envelope(
+            "task.progress", self.manifest.agent.id, env.from_agent, payload,
+            reply_to=env.id, correlation_id=env.correlation_id or env.id,
+        )
+        await sink(update)
 
     async def _health(self, _: web.Request) -> web.Response:
-        return web.json_response({"status": "ok"})
+        return json_response({"status": "ok", "load": {"inFlight": self._in_flight, "asyncTasks": self.tasks.running}})
+
+    async def _metrics(self, _: web.Request) -> web.Response:
+        assert self.metrics is not None
+        return web.Response(text=self.metrics.render(), headers={"Content-Type": PROMETHEUS_CONTENT_TYPE})
+
+    def _respond(
+        self, obj: Any, *, status: int = 200, headers: dict[str, str] | None = None, req: web.Request | None = None,
+    ) -> web.Response:
+        """Encode ``obj``, streaming any ``Attachment`` in it as multipart.
+
+        Given ``req``, the body is compressed with a coding it accepts.
+        """
+        m = self.metrics
+        t0 = time.perf_counter() if m else 0.0
+        found: list[Attachment] = []
+        body = dumps(obj, collector(found))
+        if m:
+            m.stage_seconds.observe(time.perf_counter() - t0, "encode")
+        headers = {**self._codings_header, **headers} if headers else self._codings_header
+        if found:
+            return web.Response(body=multipart_body(body, found), status=status, headers=headers)
+        c = self.compression
+        if c is not None and req is not None and len(body) >= c.threshold:
+            coding = c.choose(req.headers.get("Accept-Encoding", ""))
+            if coding:
+                t1 = time.perf_counter() if m else 0.0
+                body = c.compress(body, coding)
+                if m:
+                    m.stage_seconds.observe(time.perf_counter() - t1, "compress")
+                headers = {**headers, "Content-Encoding": coding, "Vary": "Accept-Encoding"}
+        if m:
+            m.payload_bytes.observe(len(body), "out")
+        return web.Response(body=body, status=status, headers=headers, content_type=JSON_CONTENT_TYPE)
 
     async def _manifest(self, _: web.Request) -> web.Response:
-        return web.json_response(self.manifest.to_dict())
+        return json_response(self.manifest.to_dict())
 
     async def _handle_message(self, req: web.Request) -> web.Response:
-        data = await req.json()
-        if not validate_envelope(data):
-            return web.json_response({"error": "Invalid envelope"}, status=400)
+        m = self.metrics
+        t0 = time.perf_counter()
+        attachments = None
+        if req.content_type.startswith("multipart/"):
+            try:
+                body, attachments = await read_multipart(await req.multipart(), self.limits)
+            except BodyTooLarge as e:
+                return self._respond({"error": str(e)}, status=413)
+            except AttachmentError as e:
+                return self._respond({"error": str(e)}, status=400)
+        else:
+            body = await req.read()
+        for mw in self._before_decode:
+            await mw.before_decode(body)
+        try:
+            env = decode_envelope(body)
+        except CodecError:
+            return self._respond({"error": "Invalid envelope"}, status=400)
+        env.attachments = attachments
+        if m:
+            m.stage_seconds.observe(time.perf_counter() - t0, "decode")
+            m.payload_bytes.observe(len(body), "in")
+            m.count_request(env.type)
+
+        denied = await self._authenticate(env)
+        if denied:
+            return self._respond(denied.to_dict())
+        if env.type == "task.request" and "respond-async" in req.headers.get("Prefer", ""):
+            resp = self._submit_task(env)
+            if resp.type == "task.accept":
+                return self._respond(
+                    resp.to_dict(), status=202, headers={"Location": resp.payload["statusUrl"]},
+                )
+            return self._respond(resp.to_dict())
+
+        resp = await self._dispatch(env)
+        if resp is None:
+            return self._respond({"error": f"Unsupported type: {env.type}"}, status=400)
+        return self._respond(resp.to_dict(), req=req)
+
+    async def _task_status(self, req: web.Request) -> web.Response:
+        """Long-poll an async task: returns its latest envelope once it differs from ``since``."""
+        record = self.tasks.get(req.match_info["task_id"])
+        if not record:
+            return json_response({"error": "Task not found"}, status=404)
+        try:
+            wait = min(float(req.query.get("wait", 0)), MAX_POLL_WAIT)
+        except ValueError:
+            return json_response({"error": "Invalid wait"}, status=400)
+        if wait > 0:
+            await record.wait_for_change(req.query.get("since", ""), wait)
+        assert record.latest is not None
+        return self._respond(record.latest.to_dict(), headers={"X-AIP-Task-State": record.state}, req=req)
+
+    def _submit_task(self, env: Envelope) -> Envelope:
+        """Start ``env`` in the background and answer with task.accept."""
+        if self.replays is not None:
+            seen = self.replays.recall(env)
+            if seen is not None:
+                return seen
+        existing = self.tasks.get(env.id)
+        if existing is not None and existing.latest is not None:
+            if existing.requester != env.from_agent:
+                return self._error(env, ErrorCodes.INVALID_REQUEST, f"Task id already in use: {env.id}")
+            return existing.latest  # a retried submission; don't run it twice
+        capability = env.payload.get("capability", "")
+        if capability not in self.handlers:
+            return self._error(env, ErrorCodes.CAPABILITY_NOT_FOUND, f"Unknown: {capability}")
+        try:
+            record = self.tasks.create(env)
+        except TaskStoreFull:
+            return self._error(env, ErrorCodes.RATE_LIMITED, "Too many tasks in flight", retryable=True)
+
+        accept = create_envelope(
+            "task.accept", self.manifest.agent.id, env.from_agent,
+            {"taskId": record.id, "state": "ACCEPTED", "statusUrl": f"/aip/tasks/{record.id}"},
+            reply_to=env.id, correlation_id=env.correlation_id or env.id,
+        )
+        self.tasks.transition(record, "ACCEPTED", accept)
+        record.runner = asyncio.create_task(self._run_task(record, env))
+        if self.replays is not None:
+            self.replays.remember(env, accept)
+        return accept
+
+    async def _run_task(self, record: TaskRecord, env: Envelope) -> None:
+        async def sink(update: Envelope) -> None:
+            self.tasks.transition(record, "IN_PROGRESS", update)
+
+        self.tasks.transition(record, "IN_PROGRESS")
+        self._progress_sinks[env.id] = sink
+        try:
+            resp = await self._handle_task(env)
+        except asyncio.CancelledError:
+            if not record.terminal:
+                self.tasks.transition(record, "CANCELLED", self._cancelled(record))
+            raise
+        finally:
+            self._progress_sinks.pop(env.id, None)
+        self.tasks.transition(record, "COMPLETED" if resp.type == "task.result" else "FAILED", resp)
+
+    def _cancel_task(self, env: Envelope) -> Envelope:
+        task_id = env.payload.get("taskId", "")
+        record = self.tasks.get(task_id)
+        if not record:
+            return self._error(env, ErrorCodes.INVALID_REQUEST, f"Unknown task: {task_id}")
+        if record.requester != env.from_agent:
+            return self._error(env, ErrorCodes.FORBIDDEN, f"Task {task_id} belongs to another requester")
+        if not record.terminal:
+            if record.runner:
+                record.runner.cancel()
+            self.tasks.transition(record, "CANCELLED", self._cancelled(record))
+        assert record.latest is not None
+        return record.latest
+
+    def _cancelled(self, record: TaskRecord) -> Envelope:
+        return create_envelope(
+            "task.result", self.manifest.agent.id, record.requester,
+            {"status": "cancelled"}, reply_to=record.id, correlation_id=record.id,
+        )
+
+    def _error(self, env: Envelope, code: str, message: str, **extra: Any) -> Envelope:
+        if self.metrics:
+            self.metrics.errors.inc(code)
+        return create_envelope(
+            "task.error", self.manifest.agent.id, env.from_agent,
+            {"code": code, "message": message, **extra}, reply_to=env.id,
+        )
+
+    async def _handle_stream(self, req: web.Request) -> web.WebSocketResponse:
+        """WebSocket binding: many envelopes multiplexed over one connection."""
+        ws = web.WebSocketResponse(heartbeat=30.0)
+        await ws.prepare(req)
+        send_lock = asyncio.Lock()
+        in_flight: set[asyncio.Task] = set()
 
-        env = Envelope.from_dict(data)
+        async def send(obj: dict[str, Any]) -> None:
+            async with send_lock:
+                if not ws.closed:
+                    await ws.send_str(dumps(obj).decode())
 
+        async def send_env(env: Envelope) -> None:
+            await send(env.to_dict())
+
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                for mw in self._before_decode:
+                    await mw.before_decode(msg.data)
+                try:
+                    env = decode_envelope(msg.data)
+                except CodecError:
+                    await send(self._invalid_frame(msg.data))
+                    continue
+                task = asyncio.create_task(self._dispatch_streaming(env, send_env))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+        finally:
+            for task in in_flight:
+                task.cancel()
+        return ws
+
+    async def serve_stdio(
+        self, reader: asyncio.StreamReader | None = None, writer: asyncio.StreamWriter | None = None,
+        *, max_in_flight: int = 64,
+    ) -> None:
+        """stdio binding: one JSON envelope per line on stdin, replies on stdout.
+
+        Requests are pipelined; once ``max_in_flight`` are running, reading
+        stops until one completes, so a fast producer can't queue unbounded work.
+        """
+        if reader is None or writer is None:
+            reader, writer = await open_stdio()
+        write_lock = asyncio.Lock()
+        slots = asyncio.Semaphore(max_in_flight)
+        in_flight: set[asyncio.Task] = set()
+
+        async def send(obj: dict[str, Any]) -> None:
+            async with write_lock:
+                writer.write(dumps(obj) + b"\n")
+                await writer.drain()
+
+        async def send_env(env: Envelope) -> None:
+            await send(env.to_dict())
+
+        async def serve(env: Envelope) -> None:
+            try:
+                await self._dispatch_streaming(env, send_env)
+            finally:
+                slots.release()
+
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                for mw in self._before_decode:
+                    await mw.before_decode(line)
+                try:
+                    env = decode_envelope(line)
+                except CodecError:
+                    await send(self._invalid_frame(line))
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(serve(env))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.gather(*in_flight, return_exceptions=True)
+        finally:
+            for task in in_flight:
+                task.cancel()
+
+    def run_stdio(self, *, max_in_flight: int = 64) -> None:
+        """Blocking entry point for an agent launched as a subprocess."""
+        asyncio.run(self.serve_stdio(max_in_flight=max_in_flight))
+
+    async def _dispatch_streaming(self, env: Envelope, send: ProgressSink) -> None:
+        """Dispatch on a persistent transport, forwarding progress as it happens.
+
+        Every request gets a reply: an exception escaping authentication or
+        middleware becomes an INTERNAL_ERROR, since no HTTP 500 reaches the peer.
+        """
+        if self.metrics:
+            self.metrics.count_request(env.type)
+        self._progress_sinks[env.id] = send
+        try:
+            resp = await self._authenticate(env) or await self._dispatch(env)
+        except Exception as e:
+            resp = self._error(env, ErrorCodes.INTERNAL_ERROR, str(e))
+        finally:
+            self._progress_sinks.pop(env.id, None)
+        if resp is None:
+            resp = self._error(env, ErrorCodes.INVALID_REQUEST, f"Unsupported type: {env.type}")
+        await send(resp)
+
+    def _invalid_frame(self, raw: bytes | str) -> dict[str, Any]:
+        """The reply to an undecodable frame, addressed by its ``id`` when it has one."""
+        try:
+            obj = loads(raw)
+        except CodecError:
+            obj = None
+        ref = obj if isinstance(obj, dict) else {}
+        if not isinstance(ref.get("id"), str):
+            return {"error": "Invalid envelope"}
+        sender = ref["from"] if isinstance(ref.get("from"), str) else ""
+        if self.metrics:
+            self.metrics.errors.inc(ErrorCodes.INVALID_REQUEST)
+        return create_envelope(
+            "task.error", self.manifest.agent.id, sender,
+            {"code": ErrorCodes.INVALID_REQUEST, "message": "Invalid envelope"}, reply_to=ref["id"],
+        ).to_dict()
+
+    async def _authenticate(self, env: Envelope) -> Envelope | None:
+        if self.signatures is None:
+            return None
+        reason = await self.signatures.check(env)
+        return self._error(env, ErrorCodes.UNAUTHORIZED, reason) if reason else None
+
+    async def _dispatch(self, env: Envelope) -> Envelope | None:
         if env.type == "ping":
-            pong = create_envelope("pong", self.manifest.agent.id, env.from_agent, {}, reply_to=env.id)
-            return web.json_response(pong.to_dict())
+            return create_envelope("pong", self.manifest.agent.id, env.from_agent, {}, reply_to=env.id)
 
         if env.type == "task.request":
+            if self.replays is not None:
+                return await self.replays.run(env, self._handle_task)
             return await self._handle_task(env)
 
-        return web.json_response({"error": f"Unsupported type: {env.type}"}, status=400)
+        if env.type == "task.cancel":
+            return self._cancel_task(env)
+
+        return None
+
+    async def _handle_task(self, env: Envelope) -> Envelope:
+        state: dict[str, Any] = {}
+        for mw in self._before_dispatch:
+            early = await mw.before_dispatch(env, state)
+            if early is not None:
+                return await self._after(env, early, state)
 
-    async def _handle_task(self, env: Envelope) -> web.Response:
         capability = env.payload.get("capability", "")
         handler = self.handlers.get(capability)
-
         if not handler:
-            err = create_envelope(
-                "task.error", self.manifest.agent.id, env.from_agent,
-                {"code": ErrorCodes.CAPABILITY_NOT_FOUND, "message": f"Unknown: {capability}"},
-                reply_to=env.id,
-            )
-            return web.json_response(err.to_dict())
+            resp = self._error(env, ErrorCodes.CAPABILITY_NOT_FOUND, f"Unknown: {capability}")
+            return await self._after(env, resp, state)
+
+        input_data = env.payload.get("input", {})
+        validator = self.validators.get(capability)
+        if validator:
+            problem = validator(input_data)
+            if problem:
+                resp = self._error(env, ErrorCodes.INPUT_VALIDATION_FAILED, problem)
+                return await self._after(env, resp, state)
+
+        m = self.metrics
+        key = ""
+        if capability in self.cacheable:
+            assert self.results is not None
+            key = result_key(capability, input_data)
+            cached = self.results.lookup(key)
+            if cached is not None:
+                resp = create_envelope("task.result", self.manifest.agent.id, env.from_agent, cached, reply_to=env.id)
+                resp = await self._after(env, resp, state)
+                if m:
+                    m.tasks.inc(capability, "cached")
+                return resp
 
+        self._in_flight += 1
+        if m:
+            m.in_flight.inc(capability)
+        t0 = time.perf_counter()
         try:
-            result = await handler(capability, env.payload.get("input", {}), env)
+            if key:
+                result = await self.results.run(key, lambda: handler(capability, input_data, env))
+            else:
+                result = await handler(capability, input_data, env)
             resp = create_envelope(
                 "task.result", self.manifest.agent.id, env.from_agent, result, reply_to=env.id,
             )
-            return web.json_response(resp.to_dict())
+        except asyncio.CancelledError as e:
+            for mw in self._on_error:
+                await mw.on_error(env, e, state)
+            raise
         except Exception as e:
-            err = create_envelope(
-                "task.error", self.manifest.agent.id, env.from_agent,
-                {"code": ErrorCodes.INTERNAL_ERROR, "message": str(e)},
-                reply_to=env.id,
-            )
-            return web.json_response(err.to_dict())
+            resp = await self._handler_failed(env, e, state)
+        finally:
+            self._in_flight -= 1
+            if m:
+                m.in_flight.dec(capability)
+                m.handler_seconds.observe(time.perf_counter() - t0, capability)
+        resp = await self._after(env, resp, state)
+        if m:
+            m.tasks.inc(capability, "completed" if resp.type == "task.result" else "failed")
+        return resp
+
+    async def _handler_failed(self, env: Envelope, exc: Exception, state: dict[str, Any]) -> Envelope:
+        resp: Envelope | None = None
+        for mw in self._on_error:
+            replaced = await mw.on_error(env, exc, state)
+            if replaced is not None and resp is None:
+                resp = replaced
+        return resp or self._error(env, ErrorCodes.INTERNAL_ERROR, str(exc))
+
+    async def _after(self, env: Envelope, resp: Envelope, state: dict[str, Any]) -> Envelope:
+        for mw in self._after_dispatch:
+            replaced = await mw.after_dispatch(env, resp, state)
+            if replaced is not None:
+                resp = replaced
+        return resp
@@ -0,0 +1,60 @@
+"""Shared, long-lived HTTP connection pools"""
+from __future__ import annotations
+import aiohttp
+
+
+class SessionPool:
+    """Owns one aiohttp session (and its connection pool) for many requests.
+
+    The session is created lazily on first use so a pool can be constructed
+    outside a running event loop. Several clients may share one pool; only
+    whoever created it should close it.
+    """
+
+    _shared: SessionPool | None = None
+
+    def __init__(
+        self, *, limit: int = 100, limit_per_host: int = 20,
+        keepalive_timeout: float = 30.0, dns_cache_ttl: int = 300,
+        timeout: float | None = 60.0,
+    ) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = timeout
+        self._session: aiohttp.ClientSession | None = None
+
+    @classmethod
+    def shared(cls) -> SessionPool:
+        """Process-wide default pool, for clients that don't bring their own."""
+        if cls._shared is None or cls._shared.closed:
+            cls._shared = cls()
+        return cls._shared
+
+    @property
+    def closed(self) -> bool:
+        return self._session is not None and self._session.closed
+
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=self.dns_cache_ttl, use_dns_cache=True,
+            )
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session and not self._session.closed:
+            await self._session.close()
+
+    async def __aenter__(self) -> SessionPool:
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
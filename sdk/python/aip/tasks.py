@@ -0,0 +1,122 @@
+"""In-memory task table for asynchronous (202 Accepted) task execution"""
+from __future__ import annotations
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from .types import Envelope, TaskState
+
+TERMINAL_STATES: frozenset[str] = frozenset({"COMPLETED", "FAILED", "CANCELLED", "REJECTED"})
+
+TRANSITIONS: dict[str, frozenset[str]] = {
+    "REQUESTED": frozenset({"ACCEPTED", "REJECTED", "CANCELLED"}),
+    "ACCEPTED": frozenset({"IN_PROGRESS", "FAILED", "CANCELLED"}),
+    "IN_PROGRESS": frozenset({"IN_PROGRESS", "COMPLETED", "FAILED", "CANCELLED"}),
+}
+
+
+class TaskStoreFull(Exception):
+    """Raised when every slot holds a task that is still running."""
+
+
+class InvalidTransition(Exception):
+    pass
+
+
+class DuplicateTask(Exception):
+    """Raised when a task with the envelope's id already exists."""
+
+
+@dataclass
+class TaskRecord:
+    id: str
+    capability: str
+    requester: str
+    state: TaskState = "REQUESTED"
+    latest: Envelope | None = None
+    created: float = field(default_factory=time.monotonic)
+    updated: float = field(default_factory=time.monotonic)
+    runner: asyncio.Task | None = field(default=None, repr=False)
+    _changed: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    @property
+    def terminal(self) -> bool:
+        return self.state in TERMINAL_STATES
+
+    async def wait_for_change(self, since: str, timeout: float) -> None:
+        """Return once ``latest`` is no longer the envelope with id ``since``, or after ``timeout``."""
+        if self.terminal or (self.latest and self.latest.id != since):
+            return
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+class TaskStore:
+    """Bounded task table keyed by the originating ``task.request`` id.
+
+    Finished tasks are kept for ``ttl`` seconds so requesters can collect
+    results, then evicted oldest-first. When the table is full the oldest
+    finished task is evicted early; if none has finished, ``create`` raises
+    ``TaskStoreFull``.
+    """
+
+    def __init__(self, max_tasks: int = 10_000, ttl: float = 300.0) -> None:
+        self.max_tasks = max_tasks
+        self.ttl = ttl
+        self._tasks: dict[str, TaskRecord] = {}
+        self._finished: OrderedDict[str, float] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def get(self, task_id: str) -> TaskRecord | None:
+        return self._tasks.get(task_id)
+
+    @property
+    def running(self) -> int:
+        return len(self._tasks) - len(self._finished)
+
+    def create(self, env: Envelope) -> TaskRecord:
+        self.evict_expired()
+        if env.id in self._tasks:
+            raise DuplicateTask(env.id)
+        if len(self._tasks) >= self.max_tasks:
+            if not self._finished:
+                raise TaskStoreFull(f"{self.max_tasks} tasks in flight")
+            self._evict(next(iter(self._finished)))
+        record = TaskRecord(id=env.id, capability=env.payload.get("capability", ""), requester=env.from_agent)
+        self._tasks[record.id] = record
+        return record
+
+    def transition(self, record: TaskRecord, state: TaskState, envelope: Envelope | None = None) -> None:
+        if state not in TRANSITIONS.get(record.state, ()):
+            raise InvalidTransition(f"{record.state} -> {state}")
+        record.state = state
+        if envelope is not None:
+            record.latest = envelope
+        record.updated = time.monotonic()
+        if record.terminal:
+            record.runner = None
+            self._finished[record.id] = record.updated
+        changed, record._changed = record._changed, asyncio.Event()
+        changed.set()
+
+    def evict_expired(self, now: float | None = None) -> int:
+        cutoff = (time.monotonic() if now is None else now) - self.ttl
+        evicted = 0
+        while self._finished:
+            task_id, finished_at = next(iter(self._finished.items()))
+            if finished_at > cutoff:
+                break
+            self._evict(task_id)
+            evicted += 1
+        return evicted
+
+    def _evict(self, task_id: str) -> None:
+        self._finished.pop(task_id, None)
+        self._tasks.pop(task_id, None)
@@ -0,0 +1,226 @@
+"""Persistent transports — many envelopes multiplexed over one connection"""
+from __future__ import annotations
+import asyncio
+import sys
+from abc import ABC, abstractmethod
+from typing import Any, Callable
+import aiohttp
+from yarl import URL
+from .types import Envelope
+from .envelope import create_envelope
+from .codec import CodecError, decode_envelope, dumps
+from .trust import Ed25519PrivateKey, sign_envelope
+
+ProgressCallback = Callable[[Envelope], None]
+
+STDIO_LINE_LIMIT = 16 * 1024 * 1024
+
+
+def stream_url(endpoint: str) -> str:
+    """Map an agent's HTTP endpoint (``http://host/aip``) to its WebSocket binding."""
+    url = URL(endpoint)
+    scheme = {"http": "ws", "https": "wss"}.get(url.scheme, url.scheme)
+    path = url.path.rstrip("/")
+    if not path.endswith("/aip/stream"):
+        path = f"{path}/stream" if path.endswith("/aip") else f"{path}/aip/stream"
+    return str(url.with_scheme(scheme).with_path(path))
+
+
+async def open_stdio(limit: int = STDIO_LINE_LIMIT) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    """Wrap this process's stdin/stdout as asyncio streams."""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=limit)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    transport, protocol = await loop.connect_write_pipe(asyncio.streams.FlowControlMixin, sys.stdout)
+    writer = asyncio.StreamWriter(transport, protocol, reader, loop)
+    return reader, writer
+
+
+class _Multiplexer(ABC):
+    """Matches replies to in-flight requests by ``replyTo``.
+
+    At most ``max_in_flight`` requests are outstanding; further callers wait.
+    """
+
+    def __init__(
+        self, agent_id: str, to_agent_id: str, *,
+        max_in_flight: int = 256, signing_key: Ed25519PrivateKey | None = None,
+    ) -> None:
+        self.agent_id = agent_id
+        self.to_agent_id = to_agent_id
+        self.signing_key = signing_key
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._pending: dict[str, asyncio.Future[Envelope]] = {}
+        self._progress: dict[str, ProgressCallback] = {}
+        self._reader: asyncio.Task | None = None
+
+    @abstractmethod
+    async def _write(self, data: bytes) -> None:
+        """Send one encoded envelope."""
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._pending)
+
+    async def request(
+        self, env: Envelope, *, on_progress: ProgressCallback | None = None,
+        timeout: float | None = None,
+    ) -> Envelope:
+        async with self._slots:
+            if self._reader is not None and self._reader.done():
+                raise ConnectionError("AIP connection closed")
+            fut: asyncio.Future[Envelope] = asyncio.get_running_loop().create_future()
+            self._pending[env.id] = fut
+            if on_progress: self._progress[env.id] = on_progress
+            if self.signing_key and not env.signature:
+                env.signature = sign_envelope(env, self.signing_key)
+            try:
+                await self._write(dumps(env.to_dict()))
+                return await asyncio.wait_for(fut, timeout)
+            finally:
+                self._pending.pop(env.id, None)
+                self._progress.pop(env.id, None)
+
+    async def send_task(
+        self, capability: str, input_data: dict[str, Any],
+        constraints: dict[str, Any] | None = None, *,
+        on_progress: ProgressCallback | None = None, timeout: float | None = None,
+    ) -> Envelope:
+        payload = {"capability": capability, "input": input_data}
+        if constraints: payload["constraints"] = constraints
+        env = create_envelope("task.request", self.agent_id, self.to_agent_id, payload)
+        return await self.request(env, on_progress=on_progress, timeout=timeout)
+
+    async def ping(self, *, timeout: float | None = None) -> Envelope:
+        env = create_envelope("ping", self.agent_id, self.to_agent_id, {})
+        return await self.request(env, timeout=timeout)
+
+    def _deliver(self, raw: bytes | str) -> None:
+        try:
+            env = decode_envelope(raw)
+        except CodecError:
+            return
+        key = env.reply_to or env.correlation_id
+        if env.type == "task.progress" or env.type == "task.accept":
+            cb = self._progress.get(key)
+            if cb: cb(env)
+            return
+        fut = self._pending.get(key)
+        if fut and not fut.done():
+            fut.set_result(env)
+
+    def _fail_pending(self, exc: BaseException) -> None:
+        for fut in self._pending.values():
+            if not fut.done():
+                fut.set_exception(exc)
+
+    @abstractmethod
+    async def close(self) -> None:
+        """Stop the reader and release the underlying connection."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc: object) -> None:
+        await self.close()
+
+
+class StreamConnection(_Multiplexer):
+    """WebSocket connection to an agent's ``/aip/stream`` endpoint."""
+
+    def __init__(
+        self, ws: aiohttp.ClientWebSocketResponse, agent_id: str, to_agent_id: str,
+        *, max_in_flight: int = 256, signing_key: Ed25519PrivateKey | None = None,
+    ) -> None:
+        super().__init__(agent_id, to_agent_id, max_in_flight=max_in_flight, signing_key=signing_key)
+        self._ws = ws
+        self._send_lock = asyncio.Lock()
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def connect(
+        cls, session: aiohttp.ClientSession, endpoint: str, agent_id: str, to_agent_id: str,
+        *, max_in_flight: int = 256, signing_key: Ed25519PrivateKey | None = None,
+    ) -> StreamConnection:
+        ws = await session.ws_connect(stream_url(endpoint), heartbeat=30.0)
+        return cls(ws, agent_id, to_agent_id, max_in_flight=max_in_flight, signing_key=signing_key)
+
+    @property
+    def closed(self) -> bool:
+        return self._ws.closed
+
+    async def _write(self, data: bytes) -> None:
+        async with self._send_lock:
+            await self._ws.send_str(data.decode())
+
+    async def _read_loop(self) -> None:
+        try:
+            async for msg in self._ws:
+                if msg.type == aiohttp.WSMsgType.TEXT:
+                    self._deliver(msg.data)
+                elif msg.type == aiohttp.WSMsgType.ERROR:
+                    break
+        finally:
+            self._fail_pending(ConnectionError("AIP stream closed"))
+
+    async def close(self) -> None:
+        await self._ws.close()
+        if self._reader:
+            await self._reader
+
+
+class StdioConnection(_Multiplexer):
+    """Drives a local agent subprocess over the NDJSON stdio binding."""
+
+    def __init__(
+        self, proc: asyncio.subprocess.Process, agent_id: str, to_agent_id: str,
+        *, max_in_flight: int = 256, signing_key: Ed25519PrivateKey | None = None,
+    ) -> None:
+        super().__init__(agent_id, to_agent_id, max_in_flight=max_in_flight, signing_key=signing_key)
+        self._proc = proc
+        self._write_lock = asyncio.Lock()
+        self._reader = asyncio.create_task(self._read_loop())
+
+    @classmethod
+    async def spawn(
+        cls, cmd: list[str], agent_id: str, to_agent_id: str, *,
+        max_in_flight: int = 256, signing_key: Ed25519PrivateKey | None = None,
+        env: dict[str, str] | None = None, cwd: str | None = None,
+    ) -> StdioConnection:
+        proc = await asyncio.create_subprocess_exec(
+            *cmd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+            env=env, cwd=cwd, limit=STDIO_LINE_LIMIT,
+        )
+        return cls(proc, agent_id, to_agent_id, max_in_flight=max_in_flight, signing_key=signing_key)
+
+    @property
+    def closed(self) -> bool:
+        return self._proc.returncode is not None or self._reader is None or self._reader.done()
+
+    async def _write(self, data: bytes) -> None:
+        stdin = self._proc.stdin
+        assert stdin is not None
+        async with self._write_lock:
+            stdin.write(data + b"\n")
+            await stdin.drain()
+
+    async def _read_loop(self) -> None:
+        stdout = self._proc.stdout
+        assert stdout is not None
+        try:
+            while line := await stdout.readline():
+                self._deliver(line)
+        finally:
+            self._fail_pending(ConnectionError("AIP stdio agent exited"))
+
+    async def close(self, timeout: float = 5.0) -> None:
+        """Close the agent's stdin and wait for it to exit, killing it after ``timeout``."""
+        if self._proc.stdin and not self._proc.stdin.is_closing():
+            self._proc.stdin.close()
+        try:
+            await asyncio.wait_for(self._proc.wait(), timeout)
+        except asyncio.TimeoutError:
+            self._proc.kill()
+            await self._proc.wait()
+        if self._reader:
+            await self._reader
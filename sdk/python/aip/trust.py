@@ -1,10 +1,26 @@
 """Ed25519 signing and verification"""
+from __future__ import annotations
+import asyncio
+import base64
+import binascii
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from functools import lru_cache
+from typing import Awaitable, Callable, Iterable, TYPE_CHECKING
+from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
 from cryptography.hazmat.primitives.serialization import Encoding, PublicFormat
-import base64
 from .types import Envelope
 from .envelope import canonical_payload
 
+if TYPE_CHECKING:
+    from .registry import RegistryClient
+
+KeyResolver = Callable[[str], Awaitable[str | None]]
+
+PREFIX = "ed25519:"
+
 
 def generate_key_pair() -> tuple[Ed25519PrivateKey, Ed25519PublicKey]:
     private = Ed25519PrivateKey.generate()
@@ -13,23 +29,160 @@ def generate_key_pair() -> tuple[Ed25519PrivateKey, Ed25519PublicKey]:
 
 def export_public_key(key: Ed25519PublicKey) -> str:
     raw = key.public_bytes(Encoding.Raw, PublicFormat.Raw)
-    return f"ed25519:{base64.b64encode(raw).decode()}"
+    return f"{PREFIX}{base64.b64encode(raw).decode()}"
+
+
+@lru_cache(maxsize=4096)
+def load_public_key(encoded: str) -> Ed25519PublicKey:
+    """Parse an ``ed25519:<base64>`` key; parsed keys are memoized."""
+    raw = base64.b64decode(encoded.removeprefix(PREFIX), validate=True)
+    return Ed25519PublicKey.from_public_bytes(raw)
 
 
 def sign_envelope(env: Envelope, private_key: Ed25519PrivateKey) -> str:
     data = canonical_payload(env).encode()
     sig = private_key.sign(data)
-    return f"ed25519:{base64.b64encode(sig).decode()}"
+    return f"{PREFIX}{base64.b64encode(sig).decode()}"
 
 
 def verify_envelope(env: Envelope, public_key: Ed25519PublicKey) -> bool:
     if not env.signature:
         return False
-    sig_b64 = env.signature.replace("ed25519:", "")
-    sig = base64.b64decode(sig_b64)
+    try:
+        sig = base64.b64decode(env.signature.removeprefix(PREFIX), validate=True)
+    except (binascii.Error, ValueError):
+        return False
     data = canonical_payload(env).encode()
     try:
         public_key.verify(sig, data)
         return True
-    except Exception:
+    except InvalidSignature:
         return False
+
+
+async def verify_many(
+    items: Iterable[tuple[Envelope, Ed25519PublicKey]], *, executor: Executor | None = None,
+) -> list[bool]:
+    """Verify a batch off the event loop (default executor unless one is given)."""
+    batch = list(items)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, lambda: [verify_envelope(e, k) for e, k in batch])
+
+
+async def sign_many(
+    envs: Iterable[Envelope], private_key: Ed25519PrivateKey, *, executor: Executor | None = None,
+) -> list[Envelope]:
+    """Sign a batch off the event loop, setting ``signature`` on each envelope."""
+    batch = list(envs)
+    loop = asyncio.get_running_loop()
+    sigs = await loop.run_in_executor(executor, lambda: [sign_envelope(e, private_key) for e in batch])
+    for env, sig in zip(batch, sigs):
+        env.signature = sig
+    return batch
+
+
+def registry_key_resolver(registry: RegistryClient) -> KeyResolver:
+    """Resolve an agent's key from ``trust.publicKey`` in its registered manifest."""
+    async def resolve(agent_id: str) -> str | None:
+        manifest = await registry.get(agent_id)
+        return (manifest.get("trust") or {}).get("publicKey") or None
+    return resolve
+
+
+class KeyCache:
+    """LRU of parsed public keys by agent id, refreshed from ``resolver`` after ``ttl``.
+
+    If a refresh fails the previous key keeps being served. Concurrent
+    lookups for the same agent share one resolver call.
+    """
+
+    def __init__(self, resolver: KeyResolver | None = None, *, max_entries: int = 10_000, ttl: float = 600.0) -> None:
+        self.resolver = resolver
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._keys: OrderedDict[str, tuple[Ed25519PublicKey, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Task] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def put(self, agent_id: str, key: str | Ed25519PublicKey) -> None:
+        parsed = load_public_key(key) if isinstance(key, str) else key
+        self._keys[agent_id] = (parsed, time.monotonic())
+        self._keys.move_to_end(agent_id)
+        while len(self._keys) > self.max_entries:
+            self._keys.popitem(last=False)
+
+    def age(self, agent_id: str) -> float | None:
+        entry = self._keys.get(agent_id)
+        return None if entry is None else time.monotonic() - entry[1]
+
+    def invalidate(self, agent_id: str) -> None:
+        self._keys.pop(agent_id, None)
+
+    async def get(self, agent_id: str) -> Ed25519PublicKey | None:
+        entry = self._keys.get(agent_id)
+        if entry is not None:
+            self._keys.move_to_end(agent_id)
+            if time.monotonic() - entry[1] < self.ttl or not self.resolver:
+                return entry[0]
+        if not self.resolver:
+            return None
+        task = self._inflight.get(agent_id)
+        if task is None:
+            task = asyncio.create_task(self.resolver(agent_id))
+            self._inflight[agent_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(agent_id, None))
+        try:
+            encoded = await asyncio.shield(task)
+        except Exception:
+            return entry[0] if entry else None
+        if not encoded:
+            return entry[0] if entry else None
+        try:
+            self.put(agent_id, encoded)
+        except (binascii.Error, ValueError):
+            return None
+        return self._keys[agent_id][0]
+
+
+class SignaturePolicy:
+    """Server-side signature checking for incoming envelopes.
+
+    Signed envelopes are always verified against the sender's key from
+    ``keys``. With ``require=True`` unsigned envelopes are rejected too. A
+    failed check against a key older than ``refresh_after`` seconds refetches
+    the key once, so rotated keys are picked up without waiting for the TTL.
+    """
+
+    def __init__(
+        self, keys: KeyCache, *, require: bool = False,
+        refresh_after: float = 30.0, executor: Executor | None = None,
+    ) -> None:
+        self.keys = keys
+        self.require = require
+        self.refresh_after = refresh_after
+        self.executor = executor
+
+    async def check(self, env: Envelope) -> str | None:
+        """Return a rejection reason, or ``None`` if ``env`` is acceptable."""
+        if not env.signature:
+            return "Signature required" if self.require else None
+        key = await self.keys.get(env.from_agent)
+        if key is None:
+            return f"No public key for {env.from_agent}"
+        if await self._verify(env, key):
+            return None
+        age = self.keys.age(env.from_agent)
+        if self.keys.resolver and age is not None and age >= self.refresh_after:
+            self.keys.invalidate(env.from_agent)
+            fresh = await self.keys.get(env.from_agent)
+            if fresh is not None and await self._verify(env, fresh):
+                return None
+        return "Invalid signature"
+
+    async def _verify(self, env: Envelope, key: Ed25519PublicKey) -> bool:
+        if self.executor is None:
+            return verify_envelope(env, key)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, verify_envelope, env, key)
@@ -1,7 +1,7 @@
 """AIP Core Types"""
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Any, Literal
+from typing import Any, Literal, get_args
 
 MessageType = Literal[
     "task.request", "task.accept", "task.progress",
@@ -9,6 +9,7 @@ MessageType = Literal[
     "task.quote", "task.offer", "task.negotiate",
     "ping", "pong", "capability.query", "capability.response",
 ]
+MESSAGE_TYPES: frozenset[str] = frozenset(get_args(MessageType))
 
 TaskState = Literal[
     "REQUESTED", "ACCEPTED", "IN_PROGRESS",
@@ -65,6 +66,7 @@ class Manifest:
     endpoints: Endpoints
     auth_schemes: list[str] = field(default_factory=list)
     trust: TrustConfig | None = None
+    extensions: dict[str, Any] = field(default_factory=dict)  # "x-" keys, see SPEC Extension Points
 
     def to_dict(self) -> dict[str, Any]:
         caps = []
@@ -90,10 +92,11 @@ class Manifest:
         if self.endpoints.health: d["endpoints"]["health"] = self.endpoints.health
         if self.auth_schemes: d["auth"] = {"schemes": self.auth_schemes}
         if self.trust: d["trust"] = {"publicKey": self.trust.public_key}
+        d.update(self.extensions)
         return d
 
 
-@dataclass
+@dataclass(slots=True)
 class Envelope:
     aip: str
     id: str
@@ -105,6 +108,8 @@ class Envelope:
     signature: str = ""
     reply_to: str = ""
     correlation_id: str = ""
+    # binary parts received alongside this envelope, by id; never serialized
+    attachments: dict[str, Any] | None = field(default=None, compare=False, repr=False)
 
     def to_dict(self) -> dict[str, Any]:
         d: dict[str, Any] = {
@@ -140,6 +145,13 @@ class SearchResult:
     last_seen: str = ""
 
 
+@dataclass
+class SearchPage:
+    results: list[SearchResult]
+    total: int | None  # None on cursor pages, which the registry doesn't count
+    next_cursor: str = ""  # empty on the last page
+
+
 # Error codes
 class ErrorCodes:
     INVALID_REQUEST = "INVALID_REQUEST"
@@ -0,0 +1,240 @@
+"""Compiled validators for capability input schemas
+
+``compile_schema`` turns a JSON Schema into a closure once, so per-request
+validation is a handful of ``isinstance`` checks rather than a walk over the
+schema document. It covers the keywords capability schemas use in practice:
+``type``, ``enum``, ``const``, ``properties``, ``required``,
+``additionalProperties``, ``items``, ``min/maxItems``, ``uniqueItems``,
+``min/maxLength``, ``pattern``, ``minimum``/``maximum`` (and exclusive
+variants), ``multipleOf``, ``allOf``, ``anyOf``, ``oneOf`` and ``not``.
+Annotations such as ``description``, ``default`` and ``format`` are ignored,
+and ``$ref`` is not resolved.
+"""
+from __future__ import annotations
+import re
+from decimal import Context, Decimal, InvalidOperation
+from typing import Any, Callable
+
+Check = Callable[[Any, str], "str | None"]
+
+# enough digits for any float quotient, so remainder() never overflows
+_DECIMAL = Context(prec=800)
+Validator = Callable[[Any], "str | None"]
+
+
+class SchemaError(ValueError):
+    """Raised at compile time for schemas this module can't interpret."""
+
+
+def _is_integer(v: Any) -> bool:
+    return (isinstance(v, int) and not isinstance(v, bool)) or (isinstance(v, float) and v.is_integer())
+
+
+def _is_number(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+_TYPE_CHECKS: dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "integer": _is_integer,
+    "number": _is_number,
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+}
+
+
+def compile_schema(schema: dict[str, Any]) -> Validator:
+    """Return ``validate(value) -> error message | None`` for ``schema``."""
+    check = _compile(schema)
+
+    def validate(value: Any) -> str | None:
+        return check(value, "$")
+
+    return validate
+
+
+def _ok(_: Any, __: str) -> None:
+    return None
+
+
+def _chain(checks: list[Check]) -> Check:
+    if not checks:
+        return _ok
+    if len(checks) == 1:
+        return checks[0]
+
+    def run(v: Any, path: str) -> str | None:
+        for c in checks:
+            err = c(v, path)
+            if err:
+                return err
+        return None
+
+    return run
+
+
+def _compile(schema: Any) -> Check:
+    if schema is True or schema == {}:
+        return _ok
+    if schema is False:
+        return lambda v, path: f"{path}: not allowed"
+    if not isinstance(schema, dict):
+        raise SchemaError(f"Schema must be an object, got {type(schema).__name__}")
+    checks: list[Check] = []
+
+    if "type" in schema:
+        names = schema["type"] if isinstance(schema["type"], list) else [schema["type"]]
+        try:
+            preds = [_TYPE_CHECKS[n] for n in names]
+        except KeyError as e:
+            raise SchemaError(f"Unknown type {e.args[0]!r}") from None
+        expected = " or ".join(names)
+        if len(preds) == 1:
+            pred = preds[0]
+            checks.append(lambda v, path: None if pred(v) else f"{path}: expected {expected}")
+        else:
+            checks.append(lambda v, path: None if any(p(v) for p in preds) else f"{path}: expected {expected}")
+
+    if "enum" in schema:
+        options = schema["enum"]
+        checks.append(lambda v, path: None if v in options else f"{path}: must be one of {options}")
+    if "const" in schema:
+        const = schema["const"]
+        checks.append(lambda v, path: None if v == const else f"{path}: must equal {const!r}")
+
+    checks.extend(_object_checks(schema))
+    checks.extend(_array_checks(schema))
+    checks.extend(_string_checks(schema))
+    checks.extend(_number_checks(schema))
+    checks.extend(_combinator_checks(schema))
+    return _chain(checks)
+
+
+def _object_checks(schema: dict[str, Any]) -> list[Check]:
+    checks: list[Check] = []
+    props = {k: _compile(s) for k, s in schema.get("properties", {}).items()}
+    required = list(schema.get("required", []))
+    extra = schema.get("additionalProperties", True)
+    extra_check = None if extra is True else _compile(extra)
+
+    if required:
+        def check_required(v: Any, path: str) -> str | None:
+            if isinstance(v, dict):
+                for k in required:
+                    if k not in v:
+                        return f"{path}: missing required property {k!r}"
+            return None
+        checks.append(check_required)
+
+    if props or extra_check:
+        def check_props(v: Any, path: str) -> str | None:
+            if not isinstance(v, dict):
+                return None
+            for k, item in v.items():
+                c = props.get(k, extra_check)
+                if c is not None:
+                    err = c(item, f"{path}.{k}")
+                    if err:
+                        return err
+            return None
+        checks.append(check_props)
+    return checks
+
+
+def _array_checks(schema: dict[str, Any]) -> list[Check]:
+    checks: list[Check] = []
+    if "items" in schema and isinstance(schema["items"], dict):
+        item_check = _compile(schema["items"])
+        if item_check is not _ok:
+            def check_items(v: Any, path: str) -> str | None:
+                if isinstance(v, list):
+                    for i, item in enumerate(v):
+                        err = item_check(item, f"{path}[{i}]")
+                        if err:
+                            return err
+                return None
+            checks.append(check_items)
+    if "minItems" in schema:
+        checks.append(lambda v, path, n=schema["minItems"]: (
+            f"{path}: expected at least {n} items" if isinstance(v, list) and len(v) < n else None
+        ))
+    if "maxItems" in schema:
+        checks.append(lambda v, path, n=schema["maxItems"]: (
+            f"{path}: expected at most {n} items" if isinstance(v, list) and len(v) > n else None
+        ))
+    if schema.get("uniqueItems"):
+        def check_unique(v: Any, path: str) -> str | None:
+            if isinstance(v, list):
+                seen: list[Any] = []
+                for item in v:
+                    if item in seen:
+                        return f"{path}: items must be unique"
+                    seen.append(item)
+            return None
+        checks.append(check_unique)
+    return checks
+
+
+def _string_checks(schema: dict[str, Any]) -> list[Check]:
+    checks: list[Check] = []
+    if "minLength" in schema:
+        checks.append(lambda v, path, n=schema["minLength"]: (
+            f"{path}: shorter than {n}" if isinstance(v, str) and len(v) < n else None
+        ))
+    if "maxLength" in schema:
+        checks.append(lambda v, path, n=schema["maxLength"]: (
+            f"{path}: longer than {n}" if isinstance(v, str) and len(v) > n else None
+        ))
+    if "pattern" in schema:
+        rx = re.compile(schema["pattern"])
+        checks.append(lambda v, path: f"{path}: does not match {rx.pattern!r}" if isinstance(v, str) and not rx.search(v) else None)
+    return checks
+
+
+def _number_checks(schema: dict[str, Any]) -> list[Check]:
+    checks: list[Check] = []
+    bounds = [
+        ("minimum", lambda v, b: v >= b, "<"), ("maximum", lambda v, b: v <= b, ">"),
+        ("exclusiveMinimum", lambda v, b: v > b, "<="), ("exclusiveMaximum", lambda v, b: v < b, ">="),
+    ]
+    for key, ok, op in bounds:
+        if key in schema and _is_number(schema[key]):
+            def check_bound(v: Any, path: str, b=schema[key], ok=ok, op=op) -> str | None:
+                return f"{path}: {v} {op} {b}" if _is_number(v) and not ok(v, b) else None
+            checks.append(check_bound)
+    if "multipleOf" in schema and _is_number(schema["multipleOf"]):
+        m = schema["multipleOf"]
+        # compare decimal literals so 0.3 is a multiple of 0.1
+        dm = Decimal(repr(m))
+
+        def check_multiple(v: Any, path: str) -> str | None:
+            if not _is_number(v):
+                return None
+            if isinstance(v, int) and isinstance(m, int):
+                rem = v % m
+            else:
+                try:
+                    rem = _DECIMAL.remainder(Decimal(repr(v)), dm)
+                except InvalidOperation:  # inf or nan
+                    return f"{path}: not a multiple of {m}"
+            return f"{path}: not a multiple of {m}" if rem else None
+        checks.append(check_multiple)
+    return checks
+
+
+def _combinator_checks(schema: dict[str, Any]) -> list[Check]:
+    checks: list[Check] = []
+    if "allOf" in schema:
+        checks.append(_chain([_compile(s) for s in schema["allOf"]]))
+    if "anyOf" in schema:
+        subs = [_compile(s) for s in schema["anyOf"]]
+        checks.append(lambda v, path: None if any(c(v, path) is None for c in subs) else f"{path}: matches none of anyOf")
+    if "oneOf" in schema:
+        subs = [_compile(s) for s in schema["oneOf"]]
+        checks.append(lambda v, path: None if sum(c(v, path) is None for c in subs) == 1 else f"{path}: must match exactly one of oneOf")
+    if "not" in schema:
+        sub = _compile(schema["not"])
+        checks.append(lambda v, path: f"{path}: must not match schema" if sub(v, path) is None else None)
+    return checks
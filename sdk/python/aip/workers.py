@@ -0,0 +1,136 @@
+"""Pre-fork multi-process serving for AIPServer"""
+from __future__ import annotations
+import asyncio
+import os
+import signal
+import socket
+import sys
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .server import AIPServer
+
+RESTART_BACKOFF_MAX = 5.0
+
+
+def bind_socket(port: int, host: str = "0.0.0.0", *, backlog: int = 1024) -> socket.socket:
+    """A listening socket the workers can inherit across ``fork``."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    sock.set_inheritable(True)
+    return sock
+
+
+def probe_port(port: int, host: str = "0.0.0.0") -> None:
+    """Raise ``OSError`` now if ``SO_REUSEPORT`` listeners can't bind ``host:port``."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        sock.bind((host, port))
+
+
+def serve(
+    server: AIPServer, port: int, host: str = "0.0.0.0", *,
+    workers: int | None = None, reuse_port: bool | None = None, shutdown_timeout: float = 30.0,
+) -> None:
+    """Run ``server`` in ``workers`` forked processes until SIGINT/SIGTERM.
+
+    Handlers are registered on ``server`` before calling this, and each
+    worker inherits them through ``fork``, so they may be closures. Must be
+    called from a process with no running event loop.
+
+    With ``SO_REUSEPORT`` (the default where available) every worker binds
+    its own listener and the kernel spreads connections across them; the
+    parent test-binds the port first so a taken port fails here rather
+    than in every worker. Otherwise the parent binds one socket that all
+    workers accept on. A
+    worker that exits while the server is running is restarted, with a
+    growing delay if it keeps dying at startup. On SIGTERM or SIGINT the
+    workers stop accepting, finish their requests and exit; any still
+    running after ``shutdown_timeout`` seconds are killed.
+    """
+    workers = workers or os.cpu_count() or 1
+    if reuse_port is None:
+        reuse_port = hasattr(socket, "SO_REUSEPORT")
+    if workers == 1:
+        asyncio.run(_worker(server, port, host, None, reuse_port=False))
+        return
+    if reuse_port:
+        probe_port(port, host)
+    sock = None if reuse_port else bind_socket(port, host)
+
+    children: dict[int, float] = {}  # pid -> start time
+    stopping = False
+
+    def spawn() -> None:
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                asyncio.run(_worker(server, port, host, sock, reuse_port=reuse_port))
+            except BaseException as e:
+                print(f"aip worker {os.getpid()} failed: {e!r}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum: int, _frame: object) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    previous = {s: signal.signal(s, stop) for s in (signal.SIGTERM, signal.SIGINT)}
+    backoff = 0.0
+    try:
+        for _ in range(workers):
+            spawn()
+        deadline = None
+        while children:
+            if stopping and deadline is None:
+                deadline = time.monotonic() + shutdown_timeout
+            if deadline is not None and time.monotonic() >= deadline:
+                for pid in list(children):
+                    os.kill(pid, signal.SIGKILL)
+                deadline = float("inf")
+            pid, _status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                time.sleep(0.05)
+                continue
+            started = children.pop(pid, None)
+            if started is None or stopping:
+                continue
+            # died on its own: restart, slowing down if it never got going
+            backoff = min(RESTART_BACKOFF_MAX, backoff * 2 or 0.1) if time.monotonic() - started < 1.0 else 0.0
+            time.sleep(backoff)
+            if not stopping:
+                spawn()
+    finally:
+        for s, handler in previous.items():
+            signal.signal(s, handler)
+        if sock is not None:
+            sock.close()
+
+
+async def _worker(server: AIPServer, port: int, host: str, sock: socket.socket | None, *, reuse_port: bool) -> None:
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for s in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(s, stopped.set)
+    await server.start(port, host, reuse_port=reuse_port, sock=sock)
+    try:
+        await stopped.wait()
+    finally:
+        await server.stop()
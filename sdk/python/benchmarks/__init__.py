@@ -0,0 +1 @@
+"""AIP SDK benchmark suite — run with ``python -m benchmarks`` from sdk/python"""
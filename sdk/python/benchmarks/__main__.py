@@ -0,0 +1,83 @@
+"""Run the benchmark suite, save results, and compare against a baseline
+
+    python -m benchmarks                        # run everything, print a table
+    python -m benchmarks -o results.json        # ...and save machine-readable results
+    python -m benchmarks --compare base.json    # exit 1 if anything regressed past --threshold
+    python -m benchmarks -k codec --quick       # subset, shorter runs
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+import json
+import platform
+import sys
+from datetime import datetime, timezone
+from typing import Any
+from aip import codec
+from . import loopback, micro
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """Names of benchmarks more than ``threshold`` (a fraction) worse than ``baseline``."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base.get("value"):
+            continue
+        ratio = result["value"] / base["value"]
+        change = ratio - 1 if result["lower_is_better"] else 1 / ratio - 1
+        result["baseline"] = base["value"]
+        result["change"] = change
+        if change > threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    p = argparse.ArgumentParser(prog="python -m benchmarks")
+    p.add_argument("-o", "--output", help="write results JSON here")
+    p.add_argument("--compare", metavar="BASELINE", help="results JSON to compare against")
+    p.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before failing (default 0.10)")
+    p.add_argument("-k", "--filter", default="", help="only run benchmarks whose name contains this")
+    p.add_argument("--quick", action="store_true", help="shorter runs, for smoke testing")
+    p.add_argument("--no-loopback", action="store_true", help="skip server round-trip benchmarks")
+    args = p.parse_args(argv)
+
+    results: dict[str, Any] = {}
+    with micro.cases() as table:
+        for name, fn in table.items():
+            if args.filter in name:
+                results[name] = micro.run(fn, min_time=0.05 if args.quick else 0.2, repeat=3 if args.quick else 5)
+    if not args.no_loopback:
+        loop_results = asyncio.run(loopback.run_all(requests=300 if args.quick else 2000))
+        results.update({k: v for k, v in loop_results.items() if args.filter in k})
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(), "platform": platform.platform(),
+            "json_backend": codec.BACKEND,
+        },
+        "results": results,
+    }
+    regressions: list[str] = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+
+    for name, r in results.items():
+        line = f"{name:28} {r['value']:12.2f} {r['unit']:6}"
+        if r["kind"] == "loopback":
+            line += f"  p50 {r['p50_ms']:.2f}ms  p99 {r['p99_ms']:.2f}ms"
+        if "change" in r:
+            line += f"  {r['change']:+.1%} vs baseline" + ("  REGRESSION" if name in regressions else "")
+        print(line)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
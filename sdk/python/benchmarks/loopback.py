@@ -0,0 +1,78 @@
+"""Loopback round-trip benchmarks against a real AIPServer"""
+from __future__ import annotations
+import asyncio
+import socket
+import time
+from typing import Any, Awaitable, Callable
+from aip.client import AIPClient
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.types import Capability, Envelope
+
+AGENT_ID = "bench-provider"
+
+
+async def _echo(cap: str, input_data: dict, env: Envelope) -> dict:
+    return {"status": "completed", "output": input_data}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    i = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[i]
+
+
+async def measure(call: Callable[[], Awaitable[Any]], *, requests: int, concurrency: int) -> dict[str, Any]:
+    for _ in range(min(50, requests)):
+        await call()
+    latencies: list[float] = []
+    remaining = requests
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            t0 = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - t0) * 1e3)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "kind": "loopback", "unit": "req/s", "value": len(latencies) / elapsed, "lower_is_better": False,
+        "rps": len(latencies) / elapsed, "requests": len(latencies), "concurrency": concurrency,
+        "p50_ms": percentile(latencies, 0.50), "p90_ms": percentile(latencies, 0.90),
+        "p99_ms": percentile(latencies, 0.99), "max_ms": latencies[-1],
+    }
+
+
+async def run_all(*, requests: int = 2000, concurrency: int = 16) -> dict[str, dict[str, Any]]:
+    port = free_port()
+    endpoint = f"http://127.0.0.1:{port}/aip"
+    manifest = (
+        ManifestBuilder().agent("Bench").agent_id(AGENT_ID)
+        .capability(Capability(id="echo", name="Echo")).endpoints(endpoint).build()
+    )
+    server = AIPServer(manifest).handle("echo", _echo)
+    await server.start(port, host="127.0.0.1")
+    payload = {"text": "hello " * 32, "n": list(range(16))}
+    results: dict[str, dict[str, Any]] = {}
+    try:
+        async with AIPClient("bench-requester") as client:
+            results["http.ping"] = await measure(
+                lambda: client.ping(AGENT_ID, endpoint), requests=requests, concurrency=concurrency)
+            results["http.echo"] = await measure(
+                lambda: client.send_task(AGENT_ID, endpoint, "echo", payload), requests=requests, concurrency=concurrency)
+            async with await client.connect(AGENT_ID, endpoint) as conn:
+                results["stream.echo"] = await measure(
+                    lambda: conn.send_task("echo", payload), requests=requests, concurrency=concurrency)
+    finally:
+        await server.stop()
+    return results
@@ -0,0 +1,104 @@
+"""Microbenchmarks for per-message hot paths"""
+from __future__ import annotations
+import asyncio
+import timeit
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+from aip.codec import decode_envelope, encode_envelope
+from aip.compression import AVAILABLE, Compressor
+from aip.envelope import canonical_payload, create_envelope
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.trust import generate_key_pair, sign_envelope, verify_envelope
+from aip.types import Capability, CapabilityPricing, Envelope
+from aip.validation import compile_schema
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string", "minLength": 1},
+        "format": {"type": "string", "enum": ["step", "stl", "obj"]},
+        "scale": {"type": "number", "exclusiveMinimum": 0},
+        "tags": {"type": "array", "items": {"type": "string"}, "maxItems": 8},
+    },
+    "required": ["description"],
+}
+INPUT = {"description": "A mounting bracket for a NEMA 17 stepper", "format": "step", "scale": 1.5, "tags": ["cad", "bracket"]}
+
+
+async def _noop(cap: str, input_data: dict, env: Envelope) -> dict:
+    return {"status": "completed"}
+
+
+def _manifest():
+    b = ManifestBuilder().agent("Bench", version="1.0.0", operator="bench").agent_id("bench")
+    for i in range(8):
+        b.capability(Capability(
+            id=f"cap-{i}", name=f"Capability {i}", input_schema=SCHEMA, tags=["bench", f"t{i}"],
+            pricing=CapabilityPricing("per-task", "0.10", "USD"),
+        ))
+    return b.endpoints("http://localhost/aip", "http://localhost/health").build()
+
+
+@contextmanager
+def cases() -> Iterator[dict[str, Callable[[], Any]]]:
+    """name -> zero-argument callable; each call is one operation.
+
+    The dispatch cases share one event loop and build their servers on first
+    use; both are torn down when the block exits.
+    """
+    env = create_envelope("task.request", "requester", "provider", {"capability": "cap-0", "input": INPUT})
+    d = env.to_dict()
+    raw = encode_envelope(env)
+    private, public = generate_key_pair()
+    signed = create_envelope("task.request", "requester", "provider", {"capability": "cap-0", "input": INPUT})
+    signed.signature = sign_envelope(signed, private)
+    manifest = _manifest()
+    validate = compile_schema(SCHEMA)
+
+    loop = asyncio.new_event_loop()
+    servers: dict[bool, AIPServer] = {}
+
+    def dispatch(validate: bool) -> Envelope:
+        srv = servers.get(validate)
+        if srv is None:
+            srv = servers[validate] = AIPServer(manifest).handle("cap-0", _noop, validate=validate)
+        return loop.run_until_complete(srv._handle_task(env))
+
+    compressor = Compressor()
+    large = encode_envelope(create_envelope(
+        "task.result", "provider", "requester", {"status": "completed", "output": [INPUT] * 200}))
+
+    compress = {f"compress.{enc}": (lambda enc=enc: compressor.compress(large, enc)) for enc in AVAILABLE}
+    table = {
+        "envelope.create": lambda: create_envelope("ping", "a", "b", {}),
+        "envelope.to_dict": env.to_dict,
+        "envelope.from_dict": lambda: Envelope.from_dict(d),
+        "codec.encode": lambda: encode_envelope(env),
+        "codec.decode": lambda: decode_envelope(raw),
+        "trust.canonical_payload": lambda: canonical_payload(env),
+        "trust.sign": lambda: sign_envelope(env, private),
+        "trust.verify": lambda: verify_envelope(signed, public),
+        "manifest.to_dict": manifest.to_dict,
+        "validation.validate": lambda: validate(INPUT),
+        "server.dispatch": lambda: dispatch(False),
+        "server.dispatch_validated": lambda: dispatch(True),
+    } | compress
+    try:
+        yield table
+    finally:
+        for srv in servers.values():
+            loop.run_until_complete(srv.stop())
+        loop.close()
+
+
+def run(fn: Callable[[], Any], *, min_time: float = 0.2, repeat: int = 5) -> dict[str, Any]:
+    timer = timeit.Timer(fn)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / max(elapsed, 1e-9)))
+    times = [t / number * 1e6 for t in timer.repeat(repeat=repeat, number=number)]
+    best = min(times)
+    return {
+        "kind": "micro", "unit": "us", "value": best, "lower_is_better": True,
+        "min_us": best, "mean_us": sum(times) / len(times), "ops_per_sec": 1e6 / best, "loops": number,
+    }
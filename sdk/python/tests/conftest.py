@@ -0,0 +1,60 @@
+"""Shared fixtures for in-process server tests"""
+import asyncio
+import pytest_asyncio
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.types import Capability, Envelope
+
+
+class TaskHarness:
+    """Builds AIPServers whose capabilities all run ``record``, without a listening socket.
+
+    ``record`` logs each input in ``calls`` and waits ``delay`` seconds;
+    ``{"fail": True}`` makes it raise ``RuntimeError("boom")`` and
+    ``{"hang": True}`` makes it wait until cancelled. Its output carries the
+    call count and the length of ``input["text"]``.
+    """
+
+    agent_id = "test-agent"
+
+    def __init__(self) -> None:
+        self.calls: list[dict] = []
+        self.delay = 0.0
+        self._servers: list[AIPServer] = []
+
+    async def record(self, cap: str, input_data: dict, env: Envelope) -> dict:
+        self.calls.append(input_data)
+        if input_data.get("hang"):
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.delay)
+        if input_data.get("fail"):
+            raise RuntimeError("boom")
+        return {"status": "completed", "output": {"calls": len(self.calls), "len": len(input_data.get("text", ""))}}
+
+    def server(self, *capabilities: str, cacheable: tuple[str, ...] = (), **kw) -> AIPServer:
+        capabilities = capabilities or ("work",)
+        b = ManifestBuilder().agent("Test Agent").agent_id(self.agent_id)
+        for cap in capabilities:
+            b.capability(Capability(id=cap, name=cap.title()))
+        srv = AIPServer(b.endpoints("http://localhost/aip").build(), **kw)
+        for cap in capabilities:
+            srv.handle(cap, self.record, cacheable=cap in cacheable)
+        self._servers.append(srv)
+        return srv
+
+    def request(self, capability: str = "work", *, sender: str = "client", **input_data) -> Envelope:
+        return create_envelope(
+            "task.request", sender, self.agent_id, {"capability": capability, "input": input_data},
+        )
+
+    async def close(self) -> None:
+        for srv in self._servers:
+            await srv.stop()
+
+
+@pytest_asyncio.fixture
+async def harness():
+    h = TaskHarness()
+    yield h
+    await h.close()
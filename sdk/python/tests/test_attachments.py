@@ -0,0 +1,86 @@
+"""Tests for streamed binary attachments"""
+import hashlib
+import os
+import aiohttp
+import pytest
+import pytest_asyncio
+from aip.attachments import Attachment, BodyLimits, resolve
+from aip.client import AIPClient
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.trust import generate_key_pair, sign_envelope, verify_envelope
+from aip.types import Capability, Envelope
+
+PORT = 14588
+ENDPOINT = f"http://localhost:{PORT}/aip"
+
+BLOB = os.urandom(3 * 1024 * 1024 + 17)
+
+
+@pytest_asyncio.fixture
+async def server():
+    manifest = (
+        ManifestBuilder().agent("Blobs").agent_id("blobs")
+        .capability(Capability(id="reverse", name="Reverse")).endpoints(ENDPOINT).build()
+    )
+
+    async def reverse(cap: str, input_data: dict, env: Envelope) -> dict:
+        att = resolve(env, input_data["file"])
+        h = hashlib.sha256()
+        async for chunk in att.chunks():
+            h.update(chunk)
+        out = Attachment.from_bytes(bytes(att.view()[::-1]), "application/x-reversed")
+        return {"status": "completed", "output": {"sha256": h.hexdigest(), "reversed": out, "spooled": att._file.__class__.__name__}}
+
+    limits = BodyLimits(attachment=4 * 1024 * 1024, spool=64 * 1024)
+    srv = AIPServer(manifest, limits=limits).handle("reverse", reverse)
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_round_trip(server, tmp_path):
+    path = tmp_path / "model.step"
+    path.write_bytes(BLOB)
+    async with AIPClient("client") as client:
+        for att in (Attachment.from_bytes(BLOB), Attachment.from_path(str(path), "model/step")):
+            assert att.id == "sha256:" + hashlib.sha256(BLOB).hexdigest()
+            resp = await client.send_task("blobs", ENDPOINT, "reverse", {"file": att})
+            assert resp.type == "task.result", resp.payload
+            out = resp.payload["output"]
+            assert out["sha256"] == hashlib.sha256(BLOB).hexdigest()
+            assert out["spooled"] != "BytesIO"  # larger than the spool threshold
+            reversed_ = resolve(resp, out["reversed"])
+            assert reversed_.content_type == "application/x-reversed"
+            assert await reversed_.read() == BLOB[::-1]
+
+
+@pytest.mark.asyncio
+async def test_limits_and_tampering(server):
+    async with AIPClient("client") as client:
+        too_big = Attachment.from_bytes(b"x" * (4 * 1024 * 1024 + 1))
+        with pytest.raises(aiohttp.ClientResponseError) as e:
+            await client.send_task("blobs", ENDPOINT, "reverse", {"file": too_big})
+        assert e.value.status == 413
+
+        forged = Attachment.from_bytes(b"hello")
+        forged.id = "sha256:" + "0" * 64
+        with pytest.raises(aiohttp.ClientResponseError) as e:
+            await client.send_task("blobs", ENDPOINT, "reverse", {"file": forged})
+        assert e.value.status == 400
+
+        async with client.pool.session().post(ENDPOINT, data=b"{" + b" " * (2 * 1024 * 1024) + b"}") as r:
+            assert r.status == 413
+
+
+def test_refs_are_signed():
+    private, public = generate_key_pair()
+    att = Attachment.from_bytes(b"payload")
+    env = create_envelope("task.request", "a", "b", {"input": {"file": att}})
+    env.signature = sign_envelope(env, private)
+    received = Envelope.from_dict({**env.to_dict(), "payload": {"input": {"file": att.ref()}}})
+    assert verify_envelope(received, public)
+    received.payload["input"]["file"]["size"] = 8
+    assert not verify_envelope(received, public)
@@ -0,0 +1,88 @@
+"""Tests for client-side load balancing and circuit breaking"""
+import asyncio
+import random
+import pytest
+from aip.balancer import CLOSED, EWMA, OPEN, Balancer, NoProviderAvailable
+from aip.client import AIPClient
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.types import Capability, Envelope, SearchResult
+
+PORTS = (14590, 14591, 14592)
+
+
+def provider(agent_id: str, port: int, trust: float = 0.5) -> SearchResult:
+    return SearchResult(agent_id, agent_id, "work", f"http://127.0.0.1:{port}/aip", trust_score=trust)
+
+
+async def start(agent_id: str, port: int, delay: float = 0.0) -> AIPServer:
+    async def work(cap: str, input_data: dict, env: Envelope) -> dict:
+        await asyncio.sleep(delay)
+        return {"status": "completed", "output": agent_id}
+
+    manifest = (
+        ManifestBuilder().agent(agent_id).agent_id(agent_id)
+        .capability(Capability(id="work", name="Work")).endpoints(f"http://127.0.0.1:{port}/aip").build()
+    )
+    srv = AIPServer(manifest).handle("work", work)
+    await srv.start(port, host="127.0.0.1")
+    return srv
+
+
+@pytest.mark.asyncio
+async def test_spreads_load_and_trips_dead_provider():
+    servers = [await start("p0", PORTS[0], 0.01), await start("p1", PORTS[1], 0.01)]
+    providers = [provider(f"p{i}", port) for i, port in enumerate(PORTS)]  # p2 isn't running
+    try:
+        async with AIPClient("client") as client:
+            lb = Balancer(client, failure_threshold=2, reset_timeout=0.2, rng=random.Random(7))
+            resps = await asyncio.gather(*(lb.send_task("work", {}, providers=providers) for _ in range(60)))
+            counts = {p: sum(r.payload["output"] == p for r in resps) for p in ("p0", "p1")}
+            assert sum(counts.values()) == 60 and min(counts.values()) >= 20
+
+            dead = lb.state(providers[2].endpoint)
+            assert dead.breaker.state == OPEN and dead.failures >= 2  # retried elsewhere, none lost
+            before = dead.requests
+            await asyncio.gather(*(lb.send_task("work", {}, providers=providers) for _ in range(20)))
+            assert dead.requests == before  # no traffic while open
+
+            servers.append(await start("p2", PORTS[2]))
+            await asyncio.sleep(0.25)
+            lb.pick(providers)  # schedules the half-open ping probe
+            await asyncio.sleep(0.1)
+            assert dead.breaker.state == CLOSED and dead.requests == before
+            await lb.close()
+    finally:
+        for srv in servers:
+            await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_ewma_prefers_fast_and_trusted():
+    servers = [await start("slow", PORTS[0], 0.05), await start("fast", PORTS[1])]
+    providers = [provider("slow", PORTS[0]), provider("fast", PORTS[1])]
+    try:
+        async with AIPClient("client") as client:
+            lb = Balancer(client, strategy=EWMA, rng=random.Random(1))
+            outputs = [(await lb.send_task("work", {}, providers=providers)).payload["output"] for _ in range(30)]
+            assert outputs.count("fast") > 20
+
+            trusted = Balancer(client, rng=random.Random(3))
+            weighted = [provider("slow", PORTS[0], trust=0.0), provider("fast", PORTS[1], trust=1.0)]
+            assert all(trusted.pick(weighted).agent_id == "fast" for _ in range(20))
+    finally:
+        for srv in servers:
+            await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_no_provider():
+    async with AIPClient("client") as client:
+        lb = Balancer(client, failure_threshold=1, reset_timeout=60)
+        with pytest.raises(NoProviderAvailable):
+            await lb.send_task("work", {}, providers=[])
+        dead = [provider("gone", PORTS[2])]
+        with pytest.raises(Exception):
+            await lb.send_task("work", {}, providers=dead)
+        with pytest.raises(NoProviderAvailable):
+            await lb.send_task("work", {}, providers=dead)
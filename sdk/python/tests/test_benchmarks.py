@@ -0,0 +1,23 @@
+"""Tests for the benchmark suite's baseline comparison"""
+from benchmarks.__main__ import compare
+from benchmarks.micro import cases, run
+
+
+def test_compare_flags_regressions_in_both_directions():
+    current = {"results": {
+        "codec.encode": {"value": 1.3, "lower_is_better": True},
+        "http.echo": {"value": 800.0, "lower_is_better": False},
+        "new.bench": {"value": 1.0, "lower_is_better": True},
+    }}
+    baseline = {"results": {"codec.encode": {"value": 1.0}, "http.echo": {"value": 1000.0}}}
+    assert compare(current, baseline, threshold=0.2) == ["codec.encode", "http.echo"]
+    assert abs(current["results"]["codec.encode"]["change"] - 0.3) < 1e-9
+    assert "change" not in current["results"]["new.bench"]
+    assert compare(current, baseline, threshold=0.5) == []
+
+
+def test_micro_cases_run():
+    with cases() as table:
+        result = run(table["envelope.create"], min_time=0.001, repeat=1)
+        assert table["server.dispatch_validated"]().type == "task.result"
+    assert result["kind"] == "micro" and result["value"] > 0
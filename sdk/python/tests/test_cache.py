@@ -0,0 +1,90 @@
+"""Tests for the discovery cache"""
+import asyncio
+import pytest
+import pytest_asyncio
+import aiohttp
+from aip.cache import DiscoveryCache
+from aip.client import AIPClient
+from aip.manifest import ManifestBuilder
+from aip.registry_server import RegistryServer
+from aip.types import Capability, SearchResult
+
+PORT = 14584
+
+
+def _result(endpoint: str) -> SearchResult:
+    return SearchResult(agent_id="a", agent_name="A", capability="x", endpoint=endpoint)
+
+
+class FakeRegistry:
+    def __init__(self) -> None:
+        self.calls = 0
+
+    async def search(self) -> list[SearchResult]:
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [_result(f"http://agent-{self.calls}/aip")]
+
+
+@pytest.mark.asyncio
+async def test_hit_miss_and_single_flight():
+    cache, reg = DiscoveryCache(), FakeRegistry()
+    first, second = await asyncio.gather(cache.get("k", reg.search), cache.get("k", reg.search))
+    assert first == second and reg.calls == 1
+    assert await cache.get("k", reg.search) == first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_over():
+    cache, reg = DiscoveryCache(), FakeRegistry()
+    leader = asyncio.create_task(cache.get("k", reg.search))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(cache.get("k", reg.search))
+    await asyncio.sleep(0)
+    leader.cancel()
+    assert await follower == [_result("http://agent-2/aip")]
+
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate():
+    cache, reg = DiscoveryCache(ttl=0.0, stale_ttl=60.0), FakeRegistry()
+    first = await cache.get("k", reg.search)
+    assert await cache.get("k", reg.search) == first
+    await asyncio.sleep(0.05)
+    assert reg.calls == 2 and cache.stale_hits == 1
+    assert (await cache.get("k", reg.search))[0].endpoint == "http://agent-2/aip"
+    await cache.close()
+
+
+@pytest.mark.asyncio
+async def test_lru_bound_and_invalidation():
+    cache, reg = DiscoveryCache(max_entries=2), FakeRegistry()
+    for key in ("a", "b", "c"):
+        await cache.get(key, reg.search)
+    assert len(cache) == 2
+    assert cache.invalidate(endpoint="http://agent-2/aip") == 1
+    assert cache.invalidate("c") == 1 and len(cache) == 0
+
+
+@pytest_asyncio.fixture
+async def registry():
+    srv = RegistryServer()
+    srv.index.register(
+        ManifestBuilder().agent("Dead").agent_id("dead")
+        .capability(Capability(id="echo", name="Echo")).endpoints("http://localhost:1/aip").build().to_dict()
+    )
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_client_discover_caches_and_invalidates_on_failure(registry):
+    async with AIPClient("requester", f"http://localhost:{PORT}") as client:
+        found = await client.discover("echo")
+        assert await client.discover("echo") == found
+        assert client.discovery_cache.hits == 1
+        with pytest.raises(aiohttp.ClientError):
+            await client.send_task(found[0].agent_id, found[0].endpoint, "echo", {})
+        assert len(client.discovery_cache) == 0
@@ -0,0 +1,76 @@
+"""Tests for negotiated body compression"""
+import gzip
+import aiohttp
+import pytest
+import pytest_asyncio
+from aip.client import AIPClient
+from aip.compression import GZIP, Compressor, parse_accept_encoding
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.types import Capability, Envelope
+
+PORT = 14589
+ENDPOINT = f"http://localhost:{PORT}/aip"
+
+
+def test_negotiation():
+    assert parse_accept_encoding("gzip;q=0.5, br , *;q=0") == {"gzip": 0.5, "br": 1.0, "*": 0.0}
+    c = Compressor(encodings=[GZIP])
+    assert c.choose("br, gzip") == GZIP
+    assert c.choose("gzip;q=0, *") == ""
+    assert c.choose("*") == GZIP
+    assert c.choose("identity") == c.choose("") == ""
+    body, coding = c.maybe_compress(b"x" * 10, GZIP)
+    assert (body, coding) == (b"x" * 10, "")
+    body, coding = c.maybe_compress(b"x" * 5000, GZIP)
+    assert coding == GZIP and gzip.decompress(body) == b"x" * 5000
+    assert c.stats()[GZIP]["count"] == 1 and c.stats()[GZIP]["ratio"] < 0.1
+
+
+@pytest_asyncio.fixture
+async def server():
+    manifest = (
+        ManifestBuilder().agent("Squeeze").agent_id("squeeze")
+        .capability(Capability(id="echo", name="Echo")).endpoints(ENDPOINT).build()
+    )
+
+    async def echo(cap: str, input_data: dict, env: Envelope) -> dict:
+        return {"status": "completed", "output": input_data}
+
+    srv = AIPServer(manifest).handle("echo", echo)
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_response_compression(server):
+    big = create_envelope("task.request", "c", "squeeze", {"capability": "echo", "input": {"text": "lorem ipsum " * 500}})
+    small = create_envelope("task.request", "c", "squeeze", {"capability": "echo", "input": {}})
+    async with aiohttp.ClientSession(auto_decompress=False) as s:
+        async with s.get(f"http://localhost:{PORT}/.well-known/aip-manifest.json") as r:
+            assert GZIP in (await r.json())["x-compression"]["encodings"]
+        async with s.post(ENDPOINT, json=big.to_dict(), headers={"Accept-Encoding": "gzip"}) as r:
+            assert r.headers["Content-Encoding"] == "gzip" and GZIP in r.headers["Accept-Encoding"]
+            raw = await r.read()
+            assert len(raw) < 1000 and b"lorem ipsum" in gzip.decompress(raw)
+        async with s.post(ENDPOINT, json=small.to_dict(), headers={"Accept-Encoding": "gzip"}) as r:
+            assert "Content-Encoding" not in r.headers
+        async with s.post(ENDPOINT, json=big.to_dict(), headers={"Accept-Encoding": "identity"}) as r:
+            assert "Content-Encoding" not in r.headers
+
+
+@pytest.mark.asyncio
+async def test_client_learns_request_coding(server):
+    text = "dolor sit amet " * 400
+    async with AIPClient("client") as client:
+        for _ in range(2):
+            resp = await client.send_task("squeeze", ENDPOINT, "echo", {"text": text})
+            assert resp.payload["output"]["text"] == text
+        assert client._request_codings[ENDPOINT] == GZIP
+        assert client.compression.stats()[GZIP]["count"] == 1
+
+    async with AIPClient("plain", compression=False) as client:
+        resp = await client.send_task("squeeze", ENDPOINT, "echo", {"text": text})
+        assert resp.payload["output"]["text"] == text and client.compression is None
@@ -0,0 +1,92 @@
+"""Tests for the envelope-id replay window"""
+import asyncio
+import time
+import pytest
+from aip.dedup import ReplayWindow
+from aip.envelope import create_envelope
+from aip.server import AIPServer
+from aip.types import Envelope
+
+
+def make_server(harness, window: ReplayWindow) -> AIPServer:
+    harness.delay = 0.05
+    return harness.server("charge", replays=window)
+
+
+@pytest.mark.asyncio
+async def test_retries_are_not_re_executed(harness):
+    window = ReplayWindow()
+    srv = make_server(harness, window)
+    env = harness.request("charge", amount=5)
+    first, concurrent = await asyncio.gather(srv._dispatch(env), srv._dispatch(env))
+    retry = await srv._dispatch(env)
+    assert len(harness.calls) == 1
+    assert first is concurrent is retry
+    assert window.stats()["attached"] == 1 and window.stats()["duplicates"] == 1
+
+    other = await srv._dispatch(harness.request("charge", amount=5))
+    assert len(harness.calls) == 2 and other.payload["output"]["calls"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_first_caller_hands_over(harness):
+    srv = make_server(harness, ReplayWindow())
+    env = harness.request("charge", amount=5)
+    first = asyncio.create_task(srv._dispatch(env))
+    await asyncio.sleep(0.01)
+    retry = asyncio.create_task(srv._dispatch(env))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    resp = await retry
+    assert resp.type == "task.result" and len(harness.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_and_senders(harness):
+    srv = make_server(harness, ReplayWindow())
+    env = harness.request("charge", fail=True)
+    assert (await srv._dispatch(env)).type == "task.error"
+    assert (await srv._dispatch(env)).type == "task.error"
+    assert len(harness.calls) == 2
+
+    env = harness.request("charge", amount=1)
+    await srv._dispatch(env)
+    spoofed = Envelope.from_dict({**env.to_dict(), "from": "mallory"})
+    await srv._dispatch(spoofed)
+    assert len(harness.calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_async_submit_replays_accept(harness):
+    srv = make_server(harness, ReplayWindow())
+    env = harness.request("charge", amount=3)
+    accept = srv._submit_task(env)
+    assert srv._submit_task(env) is accept
+    await srv.tasks.get(accept.payload["taskId"]).runner
+    assert len(harness.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_window_expiry_and_bound(harness):
+    window = ReplayWindow(window=0.05, granularity=0.01)
+    resp = create_envelope("pong", "b", "a", {})
+    env = harness.request("charge")
+    window.remember(env, resp)
+    assert window.recall(env) is resp
+    time.sleep(0.08)
+    assert window.recall(env) is None and len(window) == 0
+
+    bounded = ReplayWindow(window=60, max_entries=100, granularity=1e-9)
+    for _ in range(1000):
+        bounded.remember(harness.request("charge"), resp)
+    assert len(bounded) <= 100
+
+    big = create_envelope("task.result", "b", "a", {"output": "x" * 1000})
+    budget = ReplayWindow(window=60, max_bytes=10_000, granularity=1e-9)
+    for _ in range(100):
+        budget.remember(harness.request("charge"), big)
+    assert 0 < budget.bytes <= 10_000 and len(budget) < 10
+    huge = create_envelope("task.result", "b", "a", {"output": "x" * 20_000})
+    env = harness.request("charge")
+    budget.remember(env, huge)
+    assert budget.recall(env) is None
@@ -58,3 +58,28 @@ def test_canonical_payload_fields():
     env = create_envelope("ping", "a", "b", {})
     parsed = json.loads(canonical_payload(env))
     assert set(parsed.keys()) == {"id", "type", "from", "to", "timestamp", "payload"}
+
+
+def test_codec_round_trip():
+    from aip.codec import encode_envelope, decode_envelope
+    env = create_envelope("task.request", "a", "b", {"input": {"text": "héllo", 1: "x"}}, correlation_id="c1")
+    raw = encode_envelope(env)
+    assert isinstance(raw, bytes)
+    back = decode_envelope(raw)
+    assert back.payload == {"input": {"text": "héllo", "1": "x"}}
+    assert back.correlation_id == "c1" and back.id == env.id
+
+
+def test_codec_rejects_non_envelopes():
+    import pytest
+    from aip.codec import CodecError, decode_envelope
+    good = create_envelope("ping", "a", "b", {}).to_dict()
+    bad = [{**good, "payload": "oops"}, {**good, "payload": None}, {**good, "id": 5}, {**good, "from": ["a"]}]
+    for raw in (b"not json", b"[]", b'{"aip": "0.1"}', *(json.dumps(d) for d in bad)):
+        with pytest.raises(CodecError):
+            decode_envelope(raw)
+
+
+def test_envelope_is_slotted():
+    env = create_envelope("ping", "a", "b", {})
+    assert not hasattr(env, "__dict__")
@@ -0,0 +1,90 @@
+"""Tests for sync handlers and execution policies"""
+import asyncio
+import functools
+import os
+import threading
+import time
+import pytest
+from aip.envelope import create_envelope
+from aip.types import Envelope
+
+
+def which_process(cap: str, input_data: dict, env: Envelope) -> dict:
+    return {"status": "completed", "output": {"pid": os.getpid(), "n": sum(input_data["values"])}}
+
+
+@pytest.mark.asyncio
+async def test_sync_handler_keeps_loop_responsive(harness):
+    def block(cap, input_data, env):
+        time.sleep(0.3)
+        return {"status": "completed", "output": threading.current_thread().name}
+
+    srv = harness.server().handle("work", block)
+    task = asyncio.create_task(srv._handle_task(harness.request()))
+    await asyncio.sleep(0.01)
+    t0 = time.perf_counter()
+    pong = await srv._dispatch(create_envelope("ping", "client", harness.agent_id, {}))
+    assert pong.type == "pong" and time.perf_counter() - t0 < 0.1
+    resp = await task
+    assert resp.payload["output"].startswith("aip-handler")
+
+
+@pytest.mark.asyncio
+async def test_max_concurrency(harness):
+    running = peak = 0
+    lock = threading.Lock()
+
+    def work(cap, input_data, env):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        return {"status": "completed"}
+
+    srv = harness.server().handle("work", work, max_concurrency=2)
+    resps = await asyncio.gather(*(srv._handle_task(harness.request()) for _ in range(8)))
+    assert all(r.type == "task.result" for r in resps) and peak == 2
+
+
+@pytest.mark.asyncio
+async def test_process_pool_and_inline(harness):
+    srv = harness.server().handle("work", which_process, execution="process")
+    resp = await srv._handle_task(harness.request(values=[1, 2, 3]))
+    assert resp.payload["output"]["n"] == 6 and resp.payload["output"]["pid"] != os.getpid()
+
+    srv.handle("work", which_process, execution="inline")
+    resp = await srv._handle_task(harness.request(values=[4]))
+    assert resp.payload["output"]["pid"] == os.getpid()
+
+
+@pytest.mark.asyncio
+async def test_invalid_policies(harness):
+    async def handler(cap, input_data, env):
+        return {}
+
+    with pytest.raises(ValueError):
+        harness.server().handle("work", handler, execution="thread")
+    with pytest.raises(ValueError):
+        harness.server().handle("work", which_process, execution="gpu")
+
+
+@pytest.mark.asyncio
+async def test_awaitable_returning_callables(harness):
+    async def echo(cap, input_data, env):
+        return {"status": "completed", "output": threading.current_thread().name}
+
+    class Handler:
+        async def __call__(self, cap, input_data, env):
+            return await echo(cap, input_data, env)
+
+    srv = harness.server()
+    for handler in (lambda c, i, e: echo(c, i, e), functools.partial(echo), Handler()):
+        srv.handle("work", handler)
+        resp = await srv._handle_task(harness.request())
+        assert resp.type == "task.result", resp.payload
+        assert resp.payload["output"] == "MainThread"
+    with pytest.raises(ValueError):
+        srv.handle("work", Handler(), execution="thread")
@@ -0,0 +1,74 @@
+"""Tests for federated discovery"""
+import asyncio
+import pytest
+import pytest_asyncio
+from aip.client import AIPClient
+from aip.federation import Federation, merge
+from aip.manifest import ManifestBuilder
+from aip.registry_server import RegistryIndex, RegistryServer
+from aip.types import Capability, SearchResult
+
+PORTS = (14595, 14596, 14597)
+PEERS = [f"http://localhost:{p}" for p in PORTS]
+
+
+def _register(index: RegistryIndex, agent_id: str, trust: float) -> None:
+    m = (
+        ManifestBuilder().agent(f"Agent {agent_id}").agent_id(agent_id)
+        .capability(Capability(id="summarize", name="Summarize")).endpoints(f"http://{agent_id}.local/aip").build()
+    )
+    index.register(m.to_dict())
+    index.set_trust(agent_id, trust)
+
+
+class SlowRegistry(RegistryServer):
+    delay = 0.0
+
+    async def _search(self, req):
+        await asyncio.sleep(self.delay)
+        return await super()._search(req)
+
+
+@pytest_asyncio.fixture
+async def registries():
+    servers = []
+    for port, agents in zip(PORTS, ([("eu-1", 0.9), ("shared", 0.4)], [("us-1", 0.7), ("shared", 0.6)], [("ap-1", 1.0)])):
+        index = RegistryIndex()
+        for agent_id, trust in agents:
+            _register(index, agent_id, trust)
+        srv = SlowRegistry(index)
+        await srv.start(port)
+        servers.append(srv)
+    yield servers
+    for srv in servers:
+        await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_merge_rank_and_partial_results(registries):
+    registries[2].delay = 0.5
+    async with Federation(PEERS + ["http://localhost:1"], deadline=0.2, cache_ttl=5) as fed:
+        found = await fed.gather("summarize")
+        assert [(r.agent_id, r.trust_score) for r in found.results] == [("eu-1", 0.9), ("us-1", 0.7), ("shared", 0.6)]
+        assert found.answered == PEERS[:2] and found.timed_out == [PEERS[2]]
+        assert list(found.failed) == ["http://localhost:1"] and not found.complete
+
+        await asyncio.sleep(0.4)  # the slow peer's answer lands in the cache
+        registries[0].index.deregister("eu-1")
+        found = await fed.gather("summarize")
+        assert [r.agent_id for r in found.results] == ["ap-1", "eu-1", "us-1", "shared"]
+        assert PEERS[2] in found.answered
+
+
+@pytest.mark.asyncio
+async def test_federation_as_client_registry(registries):
+    async with Federation(PEERS, deadline=1.0) as fed, AIPClient("client") as client:
+        client.registry = fed
+        results = await client.discover("summarize")
+        assert [r.agent_id for r in results] == ["ap-1", "eu-1", "us-1", "shared"]
+
+
+def test_merge_prefers_fresher_on_tie():
+    old = SearchResult("a", "A", "cap", "http://a", 0.5, last_seen="2026-01-01")
+    new = SearchResult("a", "A", "cap", "http://a2", 0.5, last_seen="2026-02-01")
+    assert merge([[old], [new]]) == [new]
@@ -0,0 +1,74 @@
+"""Tests for memoized capabilities"""
+import asyncio
+import pytest
+from aip.memo import ResultCache, result_key
+from aip.server import AIPServer
+
+
+def make_server(harness) -> AIPServer:
+    harness.delay = 0.05
+    return harness.server("embed", "fresh", cacheable=("embed",))
+
+
+def test_result_key_ignores_key_order():
+    assert result_key("c", {"a": 1, "b": [1, {"x": 2, "y": 3}]}) == result_key("c", {"b": [1, {"y": 3, "x": 2}], "a": 1})
+    assert result_key("c", {"a": 1}) != result_key("d", {"a": 1})
+
+
+@pytest.mark.asyncio
+async def test_hits_and_coalescing(harness):
+    srv = make_server(harness)
+    resps = await asyncio.gather(*(srv._handle_task(harness.request("embed", text="hi")) for _ in range(20)))
+    assert len(harness.calls) == 1
+    assert all(r.payload["output"]["len"] == 2 for r in resps)
+    assert len({r.reply_to for r in resps}) == 20
+
+    resp = await srv._handle_task(harness.request("embed", text="hi"))
+    resp.payload["output"] = "mutated"
+    again = await srv._handle_task(harness.request("embed", text="hi"))
+    assert again.payload["output"]["len"] == 2 and len(harness.calls) == 1
+    stats = srv.results.stats()
+    assert (stats["hits"], stats["misses"], stats["coalesced"], stats["entries"]) == (2, 1, 19, 1)
+
+    await srv._handle_task(harness.request("fresh", text="hi"))
+    await srv._handle_task(harness.request("fresh", text="hi"))
+    assert len(harness.calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_failures_not_cached(harness):
+    srv = make_server(harness)
+    resps = await asyncio.gather(*(srv._handle_task(harness.request("embed", fail=True)) for _ in range(3)))
+    assert all(r.payload["code"] == "INTERNAL_ERROR" for r in resps) and len(harness.calls) == 1
+    await srv._handle_task(harness.request("embed", fail=True))
+    assert len(harness.calls) == 2 and len(srv.results) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_leader_hands_over(harness):
+    srv = make_server(harness)
+    leader = asyncio.create_task(srv._handle_task(harness.request("embed", text="x")))
+    await asyncio.sleep(0.01)
+    follower = asyncio.create_task(srv._handle_task(harness.request("embed", text="x")))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    resp = await follower
+    assert resp.type == "task.result" and len(harness.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_bounds():
+    cache = ResultCache(max_entries=3, max_bytes=200, ttl=0.05)
+
+    async def compute(n: int) -> dict:
+        return {"status": "completed", "output": "x" * n}
+
+    for i in range(5):
+        await cache.run(f"k{i}", lambda: compute(10))
+    assert len(cache) == 3 and cache.lookup("k0") is None and cache.lookup("k4") is not None
+    await cache.run("big", lambda: compute(150))
+    assert cache.bytes <= 200 and cache.lookup("big") is not None
+    await cache.run("huge", lambda: compute(500))
+    assert cache.lookup("huge") is None
+    await asyncio.sleep(0.06)
+    assert cache.lookup("big") is None and cache.bytes == cache.stats()["bytes"]
@@ -0,0 +1,96 @@
+"""Tests for metrics primitives and the /metrics endpoint"""
+import pytest
+import pytest_asyncio
+from aip.client import AIPClient
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.metrics import Counter, Histogram, MetricsRegistry
+from aip.server import AIPServer
+from aip.types import Capability, Envelope
+
+PORT = 14586
+ENDPOINT = f"http://localhost:{PORT}/aip"
+
+
+def test_prometheus_rendering():
+    reg = MetricsRegistry()
+    c = reg.register(Counter("reqs_total", "Requests", ["code"]))
+    h = reg.register(Histogram("lat_seconds", "Latency", buckets=(0.1, 1.0)))
+    c.inc('a"b')
+    c.inc('a"b', amount=2)
+    for v in (0.05, 0.1, 0.5, 3.0):
+        h.observe(v)
+    text = reg.render()
+    assert '# TYPE reqs_total counter' in text
+    assert 'reqs_total{code="a\\"b"} 3' in text
+    assert 'lat_seconds_bucket{le="0.1"} 2' in text
+    assert 'lat_seconds_bucket{le="1"} 3' in text
+    assert 'lat_seconds_bucket{le="+Inf"} 4' in text
+    assert 'lat_seconds_count 4' in text and h.count() == 4
+
+
+@pytest_asyncio.fixture
+async def server():
+    manifest = (
+        ManifestBuilder().agent("Metered").agent_id("metered")
+        .capability(Capability(id="echo", name="Echo")).endpoints(ENDPOINT).build()
+    )
+
+    async def echo(cap: str, input_data: dict, env: Envelope) -> dict:
+        if input_data.get("fail"):
+            raise RuntimeError("boom")
+        return {"status": "completed", "output": input_data}
+
+    srv = AIPServer(manifest, metrics=True).handle("echo", echo)
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(server):
+    async with AIPClient("client") as client:
+        await client.send_task("metered", ENDPOINT, "echo", {"x": 1})
+        await client.send_task("metered", ENDPOINT, "echo", {"fail": True})
+        await client.send_task("metered", ENDPOINT, "missing", {})
+        session = client.pool.session()
+        async with session.get(f"http://localhost:{PORT}/metrics") as r:
+            assert r.status == 200 and r.content_type == "text/plain"
+            text = await r.text()
+        async with session.get(f"http://localhost:{PORT}/health") as r:
+            health = await r.json()
+        for kind in ("x.one", "x.two"):
+            await session.post(ENDPOINT, json=create_envelope(kind, "client", "metered", {}).to_dict())
+        async with session.get(f"http://localhost:{PORT}/metrics") as r:
+            unknown = await r.text()
+    assert 'aip_requests_total{type="task.request"} 3' in text
+    assert 'aip_tasks_total{capability="echo",outcome="completed"} 1' in text
+    assert 'aip_tasks_total{capability="echo",outcome="failed"} 1' in text
+    assert 'aip_errors_total{code="CAPABILITY_NOT_FOUND"} 1' in text
+    assert 'aip_handler_duration_seconds_count{capability="echo"} 2' in text
+    assert 'aip_stage_duration_seconds_count{stage="decode"} 3' in text
+    assert 'aip_payload_bytes_count{direction="out"} 3' in text
+    assert 'aip_tasks_in_flight{capability="echo"} 0' in text
+    assert health["load"] == {"inFlight": 0, "asyncTasks": 0}
+    assert 'aip_requests_total{type="other"} 2' in unknown and "x.one" not in unknown
+
+
+@pytest.mark.asyncio
+async def test_stream_requests_share_the_other_label(server):
+    async with AIPClient("client") as client:
+        async with await client.connect("metered", ENDPOINT) as conn:
+            for i in range(3):
+                resp = await conn.request(create_envelope(f"junk-{i}", "client", "metered", {}), timeout=5)
+                assert resp.payload["code"] == "INVALID_REQUEST"
+            await conn.ping(timeout=5)
+        async with client.pool.session().get(f"http://localhost:{PORT}/metrics") as r:
+            text = await r.text()
+    assert 'aip_requests_total{type="other"} 3' in text and "junk" not in text
+    assert 'aip_requests_total{type="ping"} 1' in text
+
+
+@pytest.mark.asyncio
+async def test_metrics_disabled_by_default():
+    srv = AIPServer(ManifestBuilder().agent("X").capability(Capability(id="a", name="A")).endpoints("http://x/aip").build())
+    assert srv.metrics is None
+    assert not any(r.resource and r.resource.canonical == "/metrics" for r in srv.app.router.routes())
@@ -0,0 +1,89 @@
+"""Tests for the server middleware chain and sampling profiler"""
+import asyncio
+import pytest
+from aip.envelope import create_envelope
+from aip.middleware import Middleware, SamplingProfiler
+
+
+class Recorder(Middleware):
+    def __init__(self, name: str, log: list[str]) -> None:
+        self.name, self.log = name, log
+
+    async def before_dispatch(self, env, state):
+        state[self.name] = True
+        self.log.append(f"{self.name}.before")
+
+    async def after_dispatch(self, env, resp, state):
+        assert state[self.name]
+        self.log.append(f"{self.name}.after:{resp.type}")
+
+    async def on_error(self, env, exc, state):
+        self.log.append(f"{self.name}.error:{type(exc).__name__}")
+
+
+@pytest.mark.asyncio
+async def test_chain_order_and_errors(harness):
+    log: list[str] = []
+    srv = harness.server().use(Recorder("a", log)).use(Recorder("b", log))
+    await srv._handle_task(harness.request())
+    assert log == ["a.before", "b.before", "b.after:task.result", "a.after:task.result"]
+
+    log.clear()
+    resp = await srv._handle_task(harness.request(fail=True))
+    assert resp.payload["code"] == "INTERNAL_ERROR"
+    assert log == ["a.before", "b.before", "a.error:RuntimeError", "b.error:RuntimeError",
+                   "b.after:task.error", "a.after:task.error"]
+
+    log.clear()
+    unknown = harness.request("nope")
+    assert (await srv._handle_task(unknown)).payload["code"] == "CAPABILITY_NOT_FOUND"
+    assert log == ["a.before", "b.before", "b.after:task.error", "a.after:task.error"]
+
+
+@pytest.mark.asyncio
+async def test_short_circuit_and_replace(harness):
+    class Gate(Middleware):
+        async def before_dispatch(self, env, state):
+            if env.payload["input"].get("blocked"):
+                return create_envelope("task.error", env.to_agent, env.from_agent,
+                                       {"code": "UNAUTHORIZED", "message": "no"}, reply_to=env.id)
+
+    class Stamp(Middleware):
+        async def after_dispatch(self, env, resp, state):
+            resp.payload["stamped"] = True
+            return resp
+
+    class Soften(Middleware):
+        async def on_error(self, env, exc, state):
+            return create_envelope("task.result", env.to_agent, env.from_agent,
+                                   {"status": "failed", "reason": str(exc)}, reply_to=env.id)
+
+    srv = harness.server().use(Stamp()).use(Gate()).use(Soften())
+    blocked = await srv._handle_task(harness.request(blocked=True))
+    assert blocked.payload["code"] == "UNAUTHORIZED" and blocked.payload["stamped"]
+    softened = await srv._handle_task(harness.request(fail=True))
+    assert softened.type == "task.result" and softened.payload["reason"] == "boom"
+
+
+@pytest.mark.asyncio
+async def test_sampling_profiler(harness):
+    profiler = SamplingProfiler(every=3)
+    srv = harness.server().use(profiler)
+    assert profiler.report() == "no samples yet\n"
+    for _ in range(9):
+        await srv._handle_task(harness.request())
+    assert profiler.seen == 9 and profiler.sampled == 3
+    assert "record" in profiler.report(limit=10)
+
+    # a cancelled sample must release the profiler for the next one
+    for _ in range(2):
+        await srv._handle_task(harness.request())
+    task = asyncio.create_task(srv._handle_task(harness.request(hang=True)))
+    await asyncio.sleep(0)
+    assert profiler._active is not None
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert profiler._active is None
+    profiler.reset()
+    assert profiler.sampled == 0
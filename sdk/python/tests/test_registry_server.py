@@ -0,0 +1,242 @@
+"""Tests for the Python registry server"""
+import aiohttp
+import pytest
+import pytest_asyncio
+from aiohttp import web
+from aip.liveness import HealthProber, Liveness
+from aip.manifest import ManifestBuilder
+from aip.registry import RegistryClient
+from aip.registry_server import RegistryIndex, RegistryServer
+from aip.types import Capability, CapabilityPricing
+
+PORT = 14583
+BASE_URL = f"http://localhost:{PORT}"
+
+
+def _manifest(agent_id: str, *caps: Capability, operator: str = ""):
+    b = ManifestBuilder().agent(f"Agent {agent_id}", operator=operator).agent_id(agent_id)
+    for cap in caps:
+        b.capability(cap)
+    return b.endpoints(f"http://{agent_id}.local/aip").build()
+
+
+def _index() -> RegistryIndex:
+    index = RegistryIndex()
+    index.register(_manifest(
+        "a1", Capability(id="text-summarize", name="Summarize Text", tags=["nlp"],
+                         pricing=CapabilityPricing("per-task", "0.50", "USD")),
+        operator="acme",
+    ).to_dict())
+    index.register(_manifest(
+        "a2", Capability(id="summarize", name="Summarizer", tags=["NLP", "fast"]),
+        Capability(id="generate-cad", name="Generate CAD", tags=["cad"],
+                   pricing=CapabilityPricing("per-task", "2.00", "USD")),
+    ).to_dict())
+    return index
+
+
+def _caps(listings):
+    return [(x.agent_id, x.capability) for x in listings]
+
+
+def test_capability_token_prefix_search():
+    index = _index()
+    assert _caps(index.search("summarize")) == [("a1", "text-summarize"), ("a2", "summarize")]
+    assert _caps(index.search("summ")) == [("a1", "text-summarize"), ("a2", "summarize")]
+    assert _caps(index.search("text summ")) == [("a1", "text-summarize")]
+    assert _caps(index.search("cad")) == [("a2", "generate-cad")]
+    assert index.search("video") == []
+
+
+def test_tag_operator_and_range_filters():
+    index = _index()
+    assert _caps(index.search(tags=["nlp"])) == [("a1", "text-summarize"), ("a2", "summarize")]
+    assert _caps(index.search(tags=["fast", "cad"])) == [("a2", "summarize"), ("a2", "generate-cad")]
+    assert _caps(index.search(operator="acme")) == [("a1", "text-summarize")]
+    assert _caps(index.search(max_price=1.0)) == [("a1", "text-summarize"), ("a2", "summarize")]
+    assert _caps(index.search("summarize", max_price=0.1)) == [("a2", "summarize")]
+    index.set_trust("a1", 0.9)
+    assert _caps(index.search(min_trust=0.8)) == [("a1", "text-summarize")]
+    assert _caps(index.search(min_trust=0.8, max_price=0.1)) == []
+
+
+def test_paged_search_matches_full_search():
+    index = RegistryIndex()
+    for i in range(300):
+        tags = ["nlp"] if i % 3 else ["cad"]
+        cap = Capability(id="summarize" if i % 2 else "generate-cad", name="X", tags=tags,
+                         pricing=CapabilityPricing("per-task", str(i % 5), "USD"))
+        index.register(_manifest(f"a{i}", cap, operator="acme" if i % 7 == 0 else "").to_dict())
+    queries = [
+        {}, {"tags": ["nlp"]}, {"tags": ["cad"]}, {"capability": "summ", "tags": ["cad"]},
+        {"operator": "acme", "max_price": 2.0}, {"min_trust": 0.4, "capability": "generate"},
+        {"tags": ["video"]}, {"agents": {"a1", "a2", "a3", "a250"}},
+    ]
+    for query in queries:
+        everything = index.search(**query)
+        assert index.count(**query) == len(everything), query
+        for limit in (1, 7, 500):  # small pages scan the seq order, big ones sort the candidates
+            paged, after = [], None
+            while page := index.search(**query, after=after, limit=limit):
+                paged += page
+                after = page[-1].seq
+            assert paged == everything, (query, limit)
+
+
+def test_reregister_and_deregister_update_indexes():
+    index = _index()
+    index.register(_manifest("a2", Capability(id="translate", name="Translate")).to_dict())
+    assert index.search("summarize", tags=["fast"]) == []
+    assert _caps(index.search("translate")) == [("a2", "translate")]
+    assert index.deregister("a2")
+    assert not index.deregister("a2")
+    assert index.search("translate") == []
+    assert len(index) == 1
+
+
+@pytest_asyncio.fixture
+async def registry():
+    srv = RegistryServer(_index())
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_registry_client_round_trip(registry):
+    async with RegistryClient(BASE_URL) as client:
+        m = _manifest("a3", Capability(id="summarize-pdf", name="PDF Summary", tags=["nlp"]))
+        assert (await client.register(m))["status"] == "registered"
+        results = await client.search(capability="summarize", tags=["nlp"], max_price=1.0)
+        assert [r.agent_id for r in results] == ["a1", "a2", "a3"]
+        assert results[0].pricing.amount == "0.50"
+        assert results[0].trust_score == 0.5 and results[0].last_seen
+        assert (await client.get("a3"))["agent"]["id"] == "a3"
+        await client.deregister("a3")
+        assert [r.agent_id for r in await client.search("summarize")] == ["a1", "a2"]
+
+
+@pytest.mark.asyncio
+async def test_registry_pagination_fields(registry):
+    async with RegistryClient(BASE_URL) as client:
+        session = client.pool.session()
+        async with session.get(f"{BASE_URL}/v1/agents/search", params={"limit": "2", "page": "2"}) as r:
+            data = await r.json()
+        assert data["total"] == 3 and data["page"] == 2
+        assert [x["capability"] for x in data["results"]] == ["generate-cad"]
+        async with session.post(f"{BASE_URL}/v1/agents", json={"agent": {}}) as r:
+            assert r.status == 400
+
+
+@pytest.mark.asyncio
+async def test_malformed_capabilities_leave_index_intact(registry):
+    agent = {"id": "a1", "name": "Agent a1"}
+    bad = [
+        [{"id": "ok", "name": "Ok"}, {"name": "no id"}],
+        [{"id": "ok"}, "not a dict"],
+        [{"id": 7}],
+        [{"id": "ok", "tags": "nlp"}],
+        [{"id": "ok", "tags": ["nlp", 3]}],
+    ]
+    async with RegistryClient(BASE_URL) as client:
+        session = client.pool.session()
+        for caps in bad:
+            async with session.post(f"{BASE_URL}/v1/agents", json={"agent": agent, "capabilities": caps}) as r:
+                assert r.status == 400, caps
+        assert [r.capability for r in await client.search()] == ["text-summarize", "summarize", "generate-cad"]
+        await client.deregister("a1")
+        assert len(await client.search()) == 2
+
+
+@pytest.mark.asyncio
+async def test_cursor_pages_and_search_iter(registry):
+    for i in range(4, 30):
+        registry.index.register(_manifest(f"a{i}", Capability(id="summarize", name="S", tags=["nlp"])).to_dict())
+    async with RegistryClient(BASE_URL) as client:
+        everything = [r.agent_id for r in await client.search(tags=["nlp"])]
+        assert len(everything) == 28
+
+        first = await client.search_page(tags=["nlp"], limit=10)
+        assert first.total == 28 and len(first.results) == 10 and first.next_cursor
+        # registrations between pages don't shift the cursor
+        registry.index.register(_manifest("a0", Capability(id="x", name="X", tags=["nlp"])).to_dict())
+        second = await client.search_page(tags=["nlp"], limit=10, cursor=first.next_cursor)
+        assert [r.agent_id for r in second.results] == everything[10:20] and second.total is None
+
+        for ndjson in (False, True):
+            ids = [r.agent_id async for r in client.search_iter(tags=["nlp"], page_size=7, ndjson=ndjson)]
+            assert ids == everything + ["a0"]
+        streamed = [r.agent_id async for r in client.search_iter(tags=["nlp"], page_size=0, ndjson=True)]
+        assert streamed == everything + ["a0"]
+
+        async for r in client.search_iter(tags=["nlp"], page_size=5):
+            break  # abandoning the iterator cancels the prefetch
+        session = client.pool.session()
+        async with session.get(f"{BASE_URL}/v1/agents/search", params={"limit": "0"}) as r:
+            assert r.status == 400
+
+
+def test_liveness_expiry():
+    now = [0.0]
+    live = Liveness(ttl=10, clock=lambda: now[0])
+    for agent_id in ("a1", "a2", "a3"):
+        live.beat(agent_id)
+    now[0] = 5
+    live.beat("a2")
+    live.forget("a3")
+    now[0] = 12
+    assert live.expire() == 1 and live.alive == {"a2"}
+    now[0] = 16
+    assert not live.is_alive("a2")
+    for i in range(1000):
+        live.beat("a1")
+    assert len(live._heap) < 200
+
+
+@pytest.mark.asyncio
+async def test_heartbeat_and_available_filter():
+    now = [0.0]
+    srv = RegistryServer(_index(), liveness=Liveness(ttl=30, clock=lambda: now[0]))
+    await srv.start(PORT)
+    try:
+        async with RegistryClient(BASE_URL) as client:
+            assert len(await client.search("summarize", available=True)) == 2
+            now[0] = 20
+            before = srv.index.get("a2").last_seen
+            assert (await client.heartbeat("a2"))["ttl"] == 30
+            assert srv.index.get("a2").last_seen > before
+            now[0] = 40
+            assert [r.agent_id for r in await client.search("summarize", available=True)] == ["a2"]
+            assert [r.agent_id for r in await client.search(available=True)] == ["a2", "a2"]
+            assert len(await client.search("summarize")) == 2
+            with pytest.raises(aiohttp.ClientResponseError):
+                await client.heartbeat("nobody")
+    finally:
+        await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_health_prober():
+    async def ok(_):
+        return web.json_response({"status": "ok"})
+
+    health = web.Application()
+    health.router.add_get("/ok", ok)
+    runner = web.AppRunner(health)
+    await runner.setup()
+    await web.TCPSite(runner, "localhost", PORT + 1).start()
+
+    index = RegistryIndex()
+    for agent_id, path in (("up", "/ok"), ("down", "/missing")):
+        m = _manifest(agent_id, Capability(id="summarize", name="S"))
+        m.endpoints.health = f"http://localhost:{PORT + 1}{path}"
+        index.register(m.to_dict())
+    index.register(_manifest("silent", Capability(id="summarize", name="S")).to_dict())
+    seen: list[str] = []
+    prober = HealthProber(concurrency=2, timeout=1)
+    try:
+        assert await prober.probe(index, seen.append) == 1
+        assert seen == ["up"]
+    finally:
+        await prober.stop()
+        await runner.cleanup()
@@ -0,0 +1,116 @@
+"""Tests for persistent registry storage"""
+import asyncio
+import pytest
+from aip.manifest import ManifestBuilder
+from aip.registry import RegistryClient
+from aip.registry_server import RegistryIndex, RegistryServer
+from aip.registry_store import LOG, SNAPSHOT, RegistryStore
+from aip.types import Capability
+
+PORT = 14594
+BASE_URL = f"http://localhost:{PORT}"
+
+
+def _manifest(agent_id: str, cap: str = "summarize"):
+    return (
+        ManifestBuilder().agent(f"Agent {agent_id}").agent_id(agent_id)
+        .capability(Capability(id=cap, name=cap.title())).endpoints(f"http://{agent_id}.local/aip").build()
+    )
+
+
+@pytest.mark.asyncio
+async def test_registrations_survive_restart(tmp_path):
+    srv = RegistryServer(store=RegistryStore(str(tmp_path)))
+    await srv.start(PORT)
+    async with RegistryClient(BASE_URL) as client:
+        for agent_id in ("a1", "a2", "a3"):
+            await client.register(_manifest(agent_id))
+        await client.deregister("a2")
+    registered_at = srv.index.get("a1").registered_at
+    await srv.stop()
+
+    srv = RegistryServer(store=RegistryStore(str(tmp_path)))
+    await srv.start(PORT)
+    try:
+        async with RegistryClient(BASE_URL) as client:
+            assert [r.agent_id for r in await client.search("summarize")] == ["a1", "a3"]
+        assert srv.index.get("a1").registered_at == registered_at
+    finally:
+        await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_group_commit(tmp_path):
+    store = RegistryStore(str(tmp_path))
+    index = RegistryIndex()
+    store.load(index)
+    manifests = [_manifest(f"a{i}").to_dict() for i in range(200)]
+    for m in manifests:
+        index.register(m)
+    await asyncio.gather(*(store.put(m, "2026-01-01T00:00:00+00:00") for m in manifests))
+    assert store.fsyncs < 20
+    await store.close()
+
+    reloaded = RegistryIndex()
+    assert RegistryStore(str(tmp_path)).load(reloaded) == 200
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_trust_and_timestamps(tmp_path):
+    store = RegistryStore(str(tmp_path), compact_after=4)
+    index = RegistryIndex()
+    store.load(index)
+    for agent_id in ("a1", "a2", "a3"):
+        entry = index.register(_manifest(agent_id).to_dict())
+        await store.put(entry.manifest, entry.last_seen)
+    index.set_trust("a1", 0.9)
+    await store.set_trust("a1", 0.9)
+    await store.close()  # compaction runs after the batch is acknowledged
+    assert store.records_since_snapshot == 0
+    assert (tmp_path / LOG).stat().st_size == 0
+
+    reloaded = RegistryIndex()
+    RegistryStore(str(tmp_path)).load(reloaded)
+    assert reloaded.trust("a1") == 0.9 and reloaded.trust("a2") == 0.5
+    for agent_id, entry in index.agents.items():
+        assert reloaded.get(agent_id).registered_at == entry.registered_at
+        assert reloaded.get(agent_id).last_seen == entry.last_seen
+
+
+@pytest.mark.asyncio
+async def test_torn_log_tail_is_dropped(tmp_path):
+    store = RegistryStore(str(tmp_path))
+    store.load(RegistryIndex())
+    await store.put(_manifest("a1").to_dict(), "2026-01-01T00:00:00+00:00")
+    await store.close()
+    with open(tmp_path / LOG, "ab") as f:
+        f.write(b'{"op":"put","manifest":{"agent"')
+    assert not (tmp_path / SNAPSHOT).exists()
+
+    store = RegistryStore(str(tmp_path))
+    index = RegistryIndex()
+    assert store.load(index) == 1
+    await store.delete("a1")
+    await store.close()
+
+    index = RegistryIndex()
+    assert RegistryStore(str(tmp_path)).load(index) == 0
+
+    # a record that parses but lost its newline is torn too
+    store = RegistryStore(str(tmp_path))
+    store.load(RegistryIndex())
+    await store.put(_manifest("a").to_dict(), "2026-01-01T00:00:00+00:00")
+    await store.put(_manifest("b").to_dict(), "2026-01-01T00:00:00+00:00")
+    await store.close()
+    log = tmp_path / LOG
+    log.write_bytes(log.read_bytes()[:-1])
+
+    store = RegistryStore(str(tmp_path))
+    index = RegistryIndex()
+    assert store.load(index) == 1 and "a" in index.agents
+    await store.put(_manifest("c").to_dict(), "2026-01-01T00:00:00+00:00")
+    await store.close()
+
+    index = RegistryIndex()
+    RegistryStore(str(tmp_path)).load(index)
+    assert set(index.agents) == {"a", "c"}
@@ -0,0 +1,116 @@
+"""Tests for the outcome-driven trust engine"""
+import aiohttp
+import pytest
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.registry import RegistryClient
+from aip.registry_server import RegistryIndex, RegistryServer
+from aip.registry_store import RegistryStore
+from aip.reputation import LatencySketch, TrustEngine
+from aip.trust import export_public_key, generate_key_pair, sign_envelope
+from aip.types import Capability, TrustConfig
+
+PORT = 14598
+BASE_URL = f"http://localhost:{PORT}"
+
+
+def test_score_decays_toward_recent_behaviour():
+    now = [0.0]
+    engine = TrustEngine(half_life=100, clock=lambda: now[0])
+    for _ in range(50):
+        engine.record("a", "completed", latency_ms=100)
+    good = engine.score("a")
+    assert good > 0.95
+    for _ in range(10):
+        engine.record("a", "unreachable")
+    now[0] = 1000  # the old successes have mostly decayed away
+    for _ in range(5):
+        engine.record("a", "failed")
+    assert engine.score("a") < 0.3
+    m = engine.metrics("a")
+    assert m["tasksCompleted"] == 50 and m["tasksFailed"] == 15
+    assert m["avgResponseTime"] == "0.1s" and m["uptime"] > 0.95
+    with pytest.raises(ValueError):
+        engine.record("a", "maybe")
+
+
+def test_record_publishes_only_meaningful_changes():
+    engine = TrustEngine(min_change=0.01)
+    published = [s for _ in range(2000) if (s := engine.record("a", "completed")) is not None]
+    assert 0 < len(published) < 60
+    assert published[-1] == pytest.approx(engine.score("a"), abs=0.01)
+
+
+def test_latency_sketch_quantiles():
+    sketch = LatencySketch(accuracy=0.02)
+    for ms in range(1, 10_001):
+        sketch.add(ms)
+    assert sketch.quantile(0.5) == pytest.approx(5000, rel=0.02)
+    assert sketch.quantile(0.95) == pytest.approx(9500, rel=0.02)
+
+
+@pytest.mark.asyncio
+async def test_outcome_reports_update_search(tmp_path):
+    def manifest(agent_id, public_key=None):
+        b = (
+            ManifestBuilder().agent(agent_id).agent_id(agent_id)
+            .capability(Capability(id="summarize", name="S")).endpoints(f"http://{agent_id}.local/aip")
+        )
+        if public_key is not None:
+            b.trust(TrustConfig(public_key=export_public_key(public_key)))
+        return b.build()
+
+    def signed(agent_id, payload, sender="client", key=None, timestamp=None):
+        env = create_envelope("task.result", sender, agent_id, payload)
+        env.timestamp = timestamp or env.timestamp
+        env.signature = sign_envelope(env, key or private)
+        return env.to_dict()
+
+    private, public = generate_key_pair()
+
+    srv = RegistryServer(store=RegistryStore(str(tmp_path)))
+    await srv.start(PORT)
+    try:
+        async with RegistryClient(BASE_URL) as client:
+            await client.register(manifest("good"))
+            await client.register(manifest("flaky"))
+            await client.register(manifest("client", public))
+            for _ in range(20):
+                await client.report_outcome(
+                    "good", "completed", reporter="client", private_key=private, latency_ms=80, rating=5,
+                )
+            batch = signed("flaky", {"reports": [{"outcome": "failed"}] * 20})
+            outcomes = f"{BASE_URL}/v1/agents/flaky/outcomes"
+            async with client.pool.session().post(outcomes, json=batch) as r:
+                assert (await r.json())["recorded"] == 20
+            async with client.pool.session().post(outcomes, json=batch) as r:
+                assert (await r.json())["recorded"] == 0  # a replay is not counted again
+            results = await client.search("summarize", min_trust=0.8)
+            assert [r.agent_id for r in results] == ["good"]
+            info = await client.trust("good")
+            assert info["trustScore"] > 0.9
+            assert info["metrics"]["tasksCompleted"] == 20 and info["metrics"]["avgRating"] == 5
+            assert info["metrics"]["firstSeen"]
+            with pytest.raises(aiohttp.ClientResponseError) as e:
+                await client.report_outcome("good", "great", reporter="client", private_key=private)
+            assert e.value.status == 400
+
+            forged, _ = generate_key_pair()
+            stale = signed("flaky", {"outcome": "completed"}, timestamp="2020-01-01T00:00:00+00:00")
+            rejected = [
+                ({"outcome": "completed"}, 400),  # not an envelope
+                (signed("flaky", {"outcome": "completed"}, key=forged), 401),
+                (signed("flaky", {"outcome": "completed"}, sender="good"), 401),  # no registered key
+                (signed("flaky", {"outcome": "completed"}, sender="flaky"), 403),
+                (signed("good", {"outcome": "completed"}), 400),  # addressed to another agent
+                (stale, 401),
+            ]
+            for body, status in rejected:
+                async with client.pool.session().post(outcomes, json=body) as r:
+                    assert r.status == status, body
+    finally:
+        await srv.stop()
+
+    restored = RegistryIndex()
+    RegistryStore(str(tmp_path)).load(restored)
+    assert restored.trust("good") > 0.9 and restored.trust("flaky") < 0.1
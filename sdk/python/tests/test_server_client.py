@@ -1,10 +1,12 @@
 """Integration tests for AIP Python server and client"""
+import asyncio
 import pytest
 import pytest_asyncio
 import aiohttp
 from aip.server import AIPServer
-from aip.client import AIPClient
+from aip.client import AIPClient, BatchItem
 from aip.manifest import ManifestBuilder
+from aip.session import SessionPool
 from aip.types import Capability, Envelope
 
 PORT = 14580
@@ -18,6 +20,7 @@ def _make_manifest():
         .agent("Test Provider")
         .agent_id(AGENT_ID)
         .capability(Capability(id="echo", name="Echo", tags=["test"]))
+        .capability(Capability(id="sleep", name="Sleep", tags=["test"]))
         .endpoints(f"http://localhost:{PORT}/aip")
         .build()
     )
@@ -31,11 +34,17 @@ async def echo_handler(cap: str, input_data: dict, env: Envelope) -> dict:
     }
 
 
+async def sleep_handler(cap: str, input_data: dict, env: Envelope) -> dict:
+    await asyncio.sleep(input_data["seconds"])
+    return {"status": "completed", "output": input_data}
+
+
 @pytest_asyncio.fixture
 async def server():
     manifest = _make_manifest()
     srv = AIPServer(manifest)
     srv.handle("echo", echo_handler)
+    srv.handle("sleep", sleep_handler)
     await srv.start(PORT)
     yield srv
     await srv.stop()
@@ -61,19 +70,19 @@ async def test_manifest_endpoint(server):
 
 @pytest.mark.asyncio
 async def test_ping_pong(server):
-    client = AIPClient(CLIENT_ID)
-    pong = await client.ping(AGENT_ID, f"http://localhost:{PORT}/aip")
+    async with AIPClient(CLIENT_ID) as client:
+        pong = await client.ping(AGENT_ID, f"http://localhost:{PORT}/aip")
     assert pong.type == "pong"
     assert pong.from_agent == AGENT_ID
 
 
 @pytest.mark.asyncio
 async def test_send_task(server):
-    client = AIPClient(CLIENT_ID)
-    response = await client.send_task(
-        AGENT_ID, f"http://localhost:{PORT}/aip",
-        "echo", {"message": "hello AIP"}
-    )
+    async with AIPClient(CLIENT_ID) as client:
+        response = await client.send_task(
+            AGENT_ID, f"http://localhost:{PORT}/aip",
+            "echo", {"message": "hello AIP"}
+        )
     assert response.type == "task.result"
     assert response.payload["status"] == "completed"
     assert response.payload["output"]["echo"] == {"message": "hello AIP"}
@@ -81,10 +90,58 @@ async def test_send_task(server):
 
 @pytest.mark.asyncio
 async def test_unknown_capability(server):
-    client = AIPClient(CLIENT_ID)
-    response = await client.send_task(
-        AGENT_ID, f"http://localhost:{PORT}/aip",
-        "nonexistent", {}
-    )
+    async with AIPClient(CLIENT_ID) as client:
+        response = await client.send_task(
+            AGENT_ID, f"http://localhost:{PORT}/aip",
+            "nonexistent", {}
+        )
     assert response.type == "task.error"
     assert response.payload["code"] == "CAPABILITY_NOT_FOUND"
+
+
+@pytest.mark.asyncio
+async def test_client_reuses_pooled_session(server):
+    async with AIPClient(CLIENT_ID) as client:
+        await client.ping(AGENT_ID, f"http://localhost:{PORT}/aip")
+        session = client.pool.session()
+        await client.ping(AGENT_ID, f"http://localhost:{PORT}/aip")
+        assert client.pool.session() is session
+    assert session.closed
+
+
+@pytest.mark.asyncio
+async def test_shared_pool_outlives_clients(server):
+    async with SessionPool(limit_per_host=4) as pool:
+        for _ in range(3):
+            async with AIPClient(CLIENT_ID, pool=pool) as client:
+                pong = await client.ping(AGENT_ID, f"http://localhost:{PORT}/aip")
+                assert pong.type == "pong"
+        assert not pool.closed
+        assert pool.session().connector.limit_per_host == 4
+    assert pool.closed
+
+
+@pytest.mark.asyncio
+async def test_send_many_streams_results_and_captures_errors(server):
+    endpoint = f"http://localhost:{PORT}/aip"
+    items = [BatchItem(AGENT_ID, endpoint, "sleep", {"seconds": 0.1, "n": 0})]
+    items += [(AGENT_ID, endpoint, "echo", {"n": i}) for i in range(1, 5)]
+    items.append(BatchItem(AGENT_ID, "http://localhost:1/aip", "echo", {"n": 5}))
+    async with AIPClient(CLIENT_ID) as client:
+        outcomes = [o async for o in client.send_many(items, concurrency=3, per_endpoint=2)]
+    assert sorted(o.index for o in outcomes) == list(range(6))
+    assert outcomes[-1].index == 0
+    failed = [o for o in outcomes if not o.ok]
+    assert len(failed) == 1 and failed[0].index == 5 and failed[0].error is not None
+
+
+@pytest.mark.asyncio
+async def test_send_many_deadline_returns_partial_results(server):
+    endpoint = f"http://localhost:{PORT}/aip"
+    async with AIPClient(CLIENT_ID) as client:
+        outcomes = [o async for o in client.map(
+            AGENT_ID, endpoint, "sleep", [{"seconds": 0}, {"seconds": 1}], deadline=0.3,
+        )]
+    by_index = {o.index: o for o in outcomes}
+    assert by_index[0].ok
+    assert isinstance(by_index[1].error, asyncio.TimeoutError)
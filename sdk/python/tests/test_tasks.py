@@ -0,0 +1,132 @@
+"""Tests for asynchronous task mode"""
+import asyncio
+import pytest
+import pytest_asyncio
+from aip.server import AIPServer
+from aip.client import AIPClient
+from aip.manifest import ManifestBuilder
+from aip.envelope import create_envelope
+from aip.tasks import DuplicateTask, TaskStore, TaskStoreFull, InvalidTransition
+from aip.types import Capability, Envelope
+
+PORT = 14582
+AGENT_ID = "async-provider-py"
+CLIENT_ID = "async-requester-py"
+ENDPOINT = f"http://localhost:{PORT}/aip"
+
+
+@pytest_asyncio.fixture
+async def server():
+    manifest = (
+        ManifestBuilder()
+        .agent("Async Provider")
+        .agent_id(AGENT_ID)
+        .capability(Capability(id="work", name="Work"))
+        .endpoints(ENDPOINT)
+        .build()
+    )
+    srv = AIPServer(manifest, tasks=TaskStore(max_tasks=8))
+
+    async def work(cap: str, input_data: dict, env: Envelope) -> dict:
+        for step in range(input_data["steps"]):
+            await asyncio.sleep(0.05)
+            await srv.report_progress(env, (step + 1) / input_data["steps"], stage=f"step-{step}")
+        if input_data.get("fail"):
+            raise RuntimeError("boom")
+        return {"status": "completed", "output": {"steps": input_data["steps"]}}
+
+    srv.handle("work", work)
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+def test_store_state_machine():
+    store = TaskStore()
+    record = store.create(create_envelope("task.request", "a", "b", {"capability": "x"}))
+    assert record.state == "REQUESTED"
+    store.transition(record, "ACCEPTED")
+    with pytest.raises(InvalidTransition):
+        store.transition(record, "COMPLETED")
+    store.transition(record, "IN_PROGRESS")
+    store.transition(record, "COMPLETED")
+    assert record.terminal
+    with pytest.raises(InvalidTransition):
+        store.transition(record, "CANCELLED")
+
+
+def test_store_bounded_and_ttl():
+    store = TaskStore(max_tasks=2, ttl=10.0)
+    first = store.create(create_envelope("task.request", "a", "b", {}))
+    store.create(create_envelope("task.request", "a", "b", {}))
+    with pytest.raises(TaskStoreFull):
+        store.create(create_envelope("task.request", "a", "b", {}))
+    store.transition(first, "CANCELLED")
+    third = store.create(create_envelope("task.request", "a", "b", {}))
+    assert first.id not in store and third.id in store
+    store.transition(third, "REJECTED")
+    assert store.evict_expired(now=third.updated + 11) == 1
+    assert len(store) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_task_with_progress(server):
+    async with AIPClient(CLIENT_ID) as client:
+        accepted = await client.submit_task(AGENT_ID, ENDPOINT, "work", {"steps": 3})
+        assert accepted.type == "task.accept"
+        assert server.tasks.get(accepted.payload["taskId"]).state in ("ACCEPTED", "IN_PROGRESS")
+        progress: list[Envelope] = []
+        result = await client.await_result(ENDPOINT, accepted, timeout=5, poll_wait=1, on_progress=progress.append)
+        assert result.type == "task.result"
+        assert result.payload["output"] == {"steps": 3}
+        assert progress and all(p.type == "task.progress" for p in progress)
+        assert server.tasks.get(accepted.payload["taskId"]).state == "COMPLETED"
+
+
+@pytest.mark.asyncio
+async def test_async_task_failure(server):
+    async with AIPClient(CLIENT_ID) as client:
+        accepted = await client.submit_task(AGENT_ID, ENDPOINT, "work", {"steps": 1, "fail": True})
+        result = await client.await_result(ENDPOINT, accepted, timeout=5)
+        assert result.type == "task.error"
+        assert server.tasks.get(accepted.payload["taskId"]).state == "FAILED"
+
+
+@pytest.mark.asyncio
+async def test_async_task_cancel(server):
+    async with AIPClient(CLIENT_ID) as client:
+        accepted = await client.submit_task(AGENT_ID, ENDPOINT, "work", {"steps": 100})
+        async with AIPClient("mallory") as other:
+            denied = await other.cancel_task(AGENT_ID, ENDPOINT, accepted.payload["taskId"])
+        assert denied.payload["code"] == "FORBIDDEN"
+        assert server.tasks.get(accepted.payload["taskId"]).state == "IN_PROGRESS"
+        cancelled = await client.cancel_task(AGENT_ID, ENDPOINT, accepted.payload["taskId"])
+        assert cancelled.payload["status"] == "cancelled"
+        result = await client.await_result(ENDPOINT, accepted, timeout=5)
+        assert result.payload["status"] == "cancelled"
+        assert server.tasks.get(accepted.payload["taskId"]).state == "CANCELLED"
+
+
+@pytest.mark.asyncio
+async def test_async_unknown_capability_rejected_inline(server):
+    async with AIPClient(CLIENT_ID) as client:
+        resp = await client.submit_task(AGENT_ID, ENDPOINT, "nope", {})
+        assert resp.type == "task.error"
+        assert await client.await_result(ENDPOINT, resp) is resp
+
+
+@pytest.mark.asyncio
+async def test_retried_submission_runs_once(server):
+    env = create_envelope("task.request", CLIENT_ID, AGENT_ID, {"capability": "work", "input": {"steps": 2}})
+    accept = server._submit_task(env)
+    assert accept.type == "task.accept" and server.tasks.running == 1
+    assert server._submit_task(env) is accept
+    assert server.tasks.running == 1
+    record = server.tasks.get(env.id)
+    await record.runner
+    assert server._submit_task(env).type == "task.result"
+
+    other = Envelope.from_dict({**env.to_dict(), "from": "someone-else"})
+    assert server._submit_task(other).payload["code"] == "INVALID_REQUEST"
+    with pytest.raises(DuplicateTask):
+        server.tasks.create(env)
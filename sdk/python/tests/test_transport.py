@@ -0,0 +1,161 @@
+"""Tests for persistent AIP transports"""
+import asyncio
+import json
+import os
+import sys
+import pytest
+import pytest_asyncio
+from aip.server import AIPServer
+from aip.client import AIPClient
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.middleware import Middleware
+from aip.transport import stream_url
+from aip.types import Capability, Envelope
+
+PORT = 14581
+AGENT_ID = "stream-provider-py"
+CLIENT_ID = "stream-requester-py"
+ENDPOINT = f"http://localhost:{PORT}/aip"
+
+
+@pytest_asyncio.fixture
+async def server():
+    manifest = (
+        ManifestBuilder()
+        .agent("Stream Provider")
+        .agent_id(AGENT_ID)
+        .capability(Capability(id="slow-echo", name="Slow Echo"))
+        .endpoints(ENDPOINT)
+        .build()
+    )
+    srv = AIPServer(manifest)
+
+    async def slow_echo(cap: str, input_data: dict, env: Envelope) -> dict:
+        await srv.report_progress(env, 0.5, stage="sleeping")
+        await asyncio.sleep(input_data["delay"])
+        return {"status": "completed", "output": input_data}
+
+    srv.handle("slow-echo", slow_echo)
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+def test_stream_url():
+    assert stream_url("http://h:1/aip") == "ws://h:1/aip/stream"
+    assert stream_url("https://h/") == "wss://h/aip/stream"
+    assert stream_url("ws://h/aip/stream") == "ws://h/aip/stream"
+
+
+@pytest.mark.asyncio
+async def test_stream_ping(server):
+    async with AIPClient(CLIENT_ID) as client:
+        async with await client.connect(AGENT_ID, ENDPOINT) as conn:
+            pong = await conn.ping()
+            assert pong.type == "pong"
+
+
+@pytest.mark.asyncio
+async def test_stream_multiplexes_out_of_order(server):
+    async with AIPClient(CLIENT_ID) as client:
+        async with await client.connect(AGENT_ID, ENDPOINT) as conn:
+            progress: list[Envelope] = []
+            slow = conn.send_task("slow-echo", {"delay": 0.2, "n": 1}, on_progress=progress.append)
+            fast = conn.send_task("slow-echo", {"delay": 0.0, "n": 2})
+            r1, r2 = await asyncio.gather(slow, fast)
+            assert r1.payload["output"]["n"] == 1
+            assert r2.payload["output"]["n"] == 2
+            assert progress and progress[0].type == "task.progress"
+            assert progress[0].payload["stage"] == "sleeping"
+            assert conn.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_unknown_capability(server):
+    async with AIPClient(CLIENT_ID) as client:
+        async with await client.connect(AGENT_ID, ENDPOINT) as conn:
+            resp = await conn.send_task("nope", {})
+            assert resp.type == "task.error"
+            assert resp.payload["code"] == "CAPABILITY_NOT_FOUND"
+
+
+class Broken(Middleware):
+    async def before_dispatch(self, env, state):
+        if env.payload["input"].get("break"):
+            raise RuntimeError("middleware bug")
+
+
+@pytest.mark.asyncio
+async def test_stream_failures_still_get_replies(server):
+    server.use(Broken())
+    async with AIPClient(CLIENT_ID) as client:
+        async with await client.connect(AGENT_ID, ENDPOINT) as conn:
+            resp = await conn.send_task("slow-echo", {"break": True}, timeout=5)
+            assert resp.payload == {"code": "INTERNAL_ERROR", "message": "middleware bug"}
+            bad = create_envelope("task.request", CLIENT_ID, AGENT_ID, {})
+            bad.payload = ["not", "an", "object"]
+            resp = await conn.request(bad, timeout=5)
+            assert resp.payload["code"] == "INVALID_REQUEST" and resp.reply_to == bad.id
+            assert (await conn.ping(timeout=5)).type == "pong"
+
+
+@pytest.mark.asyncio
+async def test_stdio_failures_still_get_replies(harness):
+    class Sink:
+        def __init__(self):
+            self.lines: list[bytes] = []
+
+        def write(self, data: bytes) -> None:
+            self.lines.append(data)
+
+        async def drain(self) -> None:
+            pass
+
+    srv = harness.server().use(Broken())
+    reader, writer = asyncio.StreamReader(), Sink()
+    broken = harness.request(**{"break": True})
+    reader.feed_data(json.dumps(broken.to_dict()).encode() + b"\n")
+    reader.feed_data(b'{"id": "x-1", "from": "client"}\n[]\n')
+    reader.feed_eof()
+    await srv.serve_stdio(reader, writer)
+    replies = {r.get("replyTo"): r for r in map(json.loads, writer.lines)}
+    assert replies[broken.id]["payload"]["code"] == "INTERNAL_ERROR"
+    assert replies["x-1"]["to"] == "client" and replies["x-1"]["payload"]["code"] == "INVALID_REQUEST"
+    assert replies[None] == {"error": "Invalid envelope"}
+
+
+STDIO_AGENT = """
+import asyncio
+from aip.server import AIPServer
+from aip.manifest import ManifestBuilder
+from aip.types import Capability
+
+m = ManifestBuilder().agent("Stdio").agent_id("stdio-agent").capability(
+    Capability(id="slow-echo", name="Slow Echo")).endpoints("stdio:").build()
+srv = AIPServer(m)
+
+async def slow_echo(cap, input_data, env):
+    await srv.report_progress(env, 0.5)
+    await asyncio.sleep(input_data["delay"])
+    return {"status": "completed", "output": input_data}
+
+srv.handle("slow-echo", slow_echo)
+srv.run_stdio(max_in_flight=4)
+"""
+
+
+@pytest.mark.asyncio
+async def test_stdio_pipelined_requests():
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+    async with AIPClient(CLIENT_ID) as client:
+        async with await client.spawn("stdio-agent", [sys.executable, "-c", STDIO_AGENT], env=env) as conn:
+            assert (await conn.ping()).type == "pong"
+            progress: list[Envelope] = []
+            results = await asyncio.gather(*[
+                conn.send_task("slow-echo", {"delay": 0.05 * (8 - i), "n": i}, on_progress=progress.append)
+                for i in range(8)
+            ])
+            assert [r.payload["output"]["n"] for r in results] == list(range(8))
+            assert len(progress) == 8
+        assert conn.closed
@@ -0,0 +1,123 @@
+"""Tests for signing, key caching and server-side verification"""
+import asyncio
+import pytest
+import pytest_asyncio
+from aip.client import AIPClient
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.trust import (
+    KeyCache, SignaturePolicy, export_public_key, generate_key_pair, load_public_key,
+    sign_envelope, sign_many, verify_envelope, verify_many,
+)
+from aip.types import Capability, Envelope
+
+PORT = 14585
+ENDPOINT = f"http://localhost:{PORT}/aip"
+
+
+def test_sign_and_verify():
+    private, public = generate_key_pair()
+    env = create_envelope("ping", "a", "b", {"x": 1})
+    env.signature = sign_envelope(env, private)
+    assert verify_envelope(env, public)
+    env.payload["x"] = 2
+    assert not verify_envelope(env, public)
+    env.signature = "ed25519:not base64!"
+    assert not verify_envelope(env, public)
+
+
+def test_load_public_key_is_memoized():
+    _, public = generate_key_pair()
+    encoded = export_public_key(public)
+    assert load_public_key(encoded) is load_public_key(encoded)
+
+
+@pytest.mark.asyncio
+async def test_batch_sign_and_verify():
+    private, public = generate_key_pair()
+    envs = await sign_many([create_envelope("ping", "a", "b", {"n": i}) for i in range(20)], private)
+    envs[3].payload["n"] = -1
+    results = await verify_many((e, public) for e in envs)
+    assert results.count(False) == 1 and not results[3]
+
+
+@pytest.mark.asyncio
+async def test_key_cache_single_flight_and_ttl():
+    _, public = generate_key_pair()
+    calls = 0
+
+    async def resolve(agent_id: str):
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return export_public_key(public)
+
+    keys = KeyCache(resolve, ttl=60)
+    k1, k2 = await asyncio.gather(keys.get("a"), keys.get("a"))
+    assert k1 is k2 and calls == 1
+    await keys.get("a")
+    assert calls == 1
+    keys.ttl = 0
+    await keys.get("a")
+    assert calls == 2
+
+
+@pytest_asyncio.fixture
+async def keys():
+    return KeyCache()
+
+
+@pytest_asyncio.fixture
+async def server(keys):
+    manifest = (
+        ManifestBuilder().agent("Verifier").agent_id("verifier")
+        .capability(Capability(id="echo", name="Echo")).endpoints(ENDPOINT).build()
+    )
+
+    async def echo(cap: str, input_data: dict, env: Envelope) -> dict:
+        return {"status": "completed", "output": input_data}
+
+    srv = AIPServer(manifest, signatures=SignaturePolicy(keys, require=True))
+    srv.handle("echo", echo)
+    await srv.start(PORT)
+    yield srv
+    await srv.stop()
+
+
+@pytest.mark.asyncio
+async def test_server_verifies_signatures(server, keys):
+    private, public = generate_key_pair()
+    keys.put("signed-client", public)
+    async with AIPClient("signed-client", signing_key=private) as client:
+        ok = await client.send_task("verifier", ENDPOINT, "echo", {"a": 1})
+        assert ok.type == "task.result"
+        async with await client.connect("verifier", ENDPOINT) as conn:
+            assert (await conn.ping()).type == "pong"
+
+    async with AIPClient("signed-client") as client:
+        unsigned = await client.send_task("verifier", ENDPOINT, "echo", {})
+        assert unsigned.payload["code"] == "UNAUTHORIZED"
+
+    other, _ = generate_key_pair()
+    async with AIPClient("signed-client", signing_key=other) as client:
+        forged = await client.send_task("verifier", ENDPOINT, "echo", {})
+        assert forged.payload == {"code": "UNAUTHORIZED", "message": "Invalid signature"}
+
+
+@pytest.mark.asyncio
+async def test_policy_refreshes_rotated_key():
+    old, old_pub = generate_key_pair()
+    new, new_pub = generate_key_pair()
+    current = {"key": export_public_key(old_pub)}
+
+    async def resolve(agent_id: str):
+        return current["key"]
+
+    policy = SignaturePolicy(KeyCache(resolve), refresh_after=0)
+    env = create_envelope("ping", "a", "b", {})
+    env.signature = sign_envelope(env, old)
+    assert await policy.check(env) is None
+    current["key"] = export_public_key(new_pub)
+    env.signature = sign_envelope(env, new)
+    assert await policy.check(env) is None
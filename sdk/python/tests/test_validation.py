@@ -0,0 +1,82 @@
+"""Tests for compiled input validation"""
+import pytest
+from aip.envelope import create_envelope
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.types import Capability, Envelope
+from aip.validation import SchemaError, compile_schema
+
+CAD_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "description": {"type": "string", "minLength": 1, "maxLength": 40},
+        "format": {"type": "string", "enum": ["step", "stl", "obj"], "default": "step"},
+        "scale": {"type": "number", "exclusiveMinimum": 0},
+        "tags": {"type": "array", "items": {"type": "string"}, "minItems": 1, "maxItems": 3, "uniqueItems": True},
+    },
+    "required": ["description"],
+    "additionalProperties": False,
+}
+
+
+def test_valid_input():
+    validate = compile_schema(CAD_SCHEMA)
+    assert validate({"description": "bracket"}) is None
+    assert validate({"description": "bracket", "format": "stl", "scale": 2, "tags": ["a", "b"]}) is None
+
+
+@pytest.mark.parametrize("value, fragment", [
+    ([], "$: expected object"),
+    ({}, "missing required property 'description'"),
+    ({"description": ""}, "$.description: shorter than 1"),
+    ({"description": "x" * 41}, "$.description: longer than 40"),
+    ({"description": "x", "tags": []}, "$.tags: expected at least 1 items"),
+    ({"description": "x", "tags": ["a", "b", "c", "d"]}, "$.tags: expected at most 3 items"),
+    ({"description": "x", "format": "dwg"}, "$.format: must be one of"),
+    ({"description": "x", "scale": 0}, "$.scale: 0 <= 0"),
+    ({"description": "x", "scale": True}, "$.scale: expected number"),
+    ({"description": "x", "tags": ["a", 1]}, "$.tags[1]: expected string"),
+    ({"description": "x", "tags": ["a", "a"]}, "$.tags: items must be unique"),
+    ({"description": "x", "color": "red"}, "$.color: not allowed"),
+])
+def test_invalid_input(value, fragment):
+    assert fragment in compile_schema(CAD_SCHEMA)(value)
+
+
+def test_combinators_and_integer():
+    validate = compile_schema({"anyOf": [{"type": "integer"}, {"type": "string", "pattern": "^[0-9]+$"}]})
+    assert validate(3) is None and validate(3.0) is None and validate("42") is None
+    assert validate("4x") and validate(3.5)
+    assert compile_schema({"not": {"type": "null"}})(None)
+    with pytest.raises(SchemaError):
+        compile_schema({"type": "decimal"})
+
+
+def test_multiple_of():
+    tenths = compile_schema({"type": "number", "multipleOf": 0.1})
+    assert tenths(0.3) is None and tenths(1e30) is None and tenths(7) is None
+    assert tenths(0.35) and tenths(float("inf"))
+    threes = compile_schema({"type": "integer", "multipleOf": 3})
+    assert threes(9) is None and threes(10)
+
+
+@pytest.mark.asyncio
+async def test_server_rejects_before_dispatch():
+    calls = []
+
+    async def handler(cap: str, input_data: dict, env: Envelope) -> dict:
+        calls.append(input_data)
+        return {"status": "completed"}
+
+    manifest = (
+        ManifestBuilder().agent("CAD").capability(Capability(id="cad", name="CAD", input_schema=CAD_SCHEMA))
+        .endpoints("http://localhost/aip").build()
+    )
+    srv = AIPServer(manifest).handle("cad", handler)
+    bad = await srv._handle_task(create_envelope("task.request", "a", "b", {"capability": "cad", "input": {}}))
+    assert bad.type == "task.error" and bad.payload["code"] == "INPUT_VALIDATION_FAILED"
+    assert not calls
+    good = await srv._handle_task(create_envelope("task.request", "a", "b", {"capability": "cad", "input": {"description": "x"}}))
+    assert good.type == "task.result" and len(calls) == 1
+    srv.handle("cad", handler, validate=False)
+    assert (await srv._handle_task(create_envelope("task.request", "a", "b", {"capability": "cad", "input": {}}))).type == "task.result"
@@ -0,0 +1,91 @@
+"""Tests for multi-process serving"""
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import textwrap
+import aiohttp
+import pytest
+from aip.client import AIPClient
+from aip.manifest import ManifestBuilder
+from aip.server import AIPServer
+from aip.types import Capability
+from aip.workers import serve
+
+PORT = 14587
+ENDPOINT = f"http://127.0.0.1:{PORT}/aip"
+
+SCRIPT = textwrap.dedent(f"""
+    import os, sys
+    from aip.manifest import ManifestBuilder
+    from aip.server import AIPServer
+    from aip.types import Capability
+
+    async def whoami(cap, input_data, env):
+        return {{"status": "completed", "output": {{"pid": os.getpid()}}}}
+
+    manifest = (
+        ManifestBuilder().agent("Forked").agent_id("forked")
+        .capability(Capability(id="whoami", name="Who am I")).endpoints("{ENDPOINT}").build()
+    )
+    AIPServer(manifest).handle("whoami", whoami).serve(
+        {PORT}, "127.0.0.1", workers=2, reuse_port=sys.argv[1] == "reuse", shutdown_timeout=5)
+""")
+
+pytestmark = pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+
+
+async def worker_pids(*, want: int = 2, attempts: int = 200) -> set[int]:
+    seen: set[int] = set()
+    for _ in range(attempts):
+        # a fresh connection each time so the kernel can pick another worker
+        async with AIPClient("probe") as c:
+            try:
+                r = await c.send_task("forked", ENDPOINT, "whoami", {})
+            except aiohttp.ClientError:
+                await asyncio.sleep(0.05)
+                continue
+        seen.add(r.payload["output"]["pid"])
+        if len(seen) >= want:
+            break
+    return seen
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("mode", ["reuse", "shared"])
+async def test_workers_restart_and_shutdown(mode):
+    env = {**os.environ, "PYTHONPATH": os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+    proc = subprocess.Popen([sys.executable, "-c", SCRIPT, mode], env=env)
+    try:
+        pids = await worker_pids()
+        assert len(pids) == 2 and proc.pid not in pids
+
+        victim = next(iter(pids))
+        os.kill(victim, signal.SIGKILL)
+        await asyncio.sleep(0.3)
+        replaced = await worker_pids()
+        assert victim not in replaced and len(replaced) == 2
+
+        proc.send_signal(signal.SIGTERM)
+        assert await asyncio.to_thread(proc.wait, 10) == 0
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+
+
+@pytest.mark.skipif(not hasattr(socket, "SO_REUSEPORT"), reason="needs SO_REUSEPORT")
+def test_taken_port_fails_before_forking():
+    taken = socket.socket()
+    taken.bind(("127.0.0.1", 0))
+    taken.listen()
+    try:
+        with pytest.raises(OSError):
+            manifest = (
+                ManifestBuilder().agent("Forked").agent_id("forked")
+                .capability(Capability(id="whoami", name="Who am I")).endpoints(ENDPOINT).build()
+            )
+            serve(AIPServer(manifest), taken.getsockname()[1], "127.0.0.1", workers=2, reuse_port=True)
+    finally:
+        taken.close()